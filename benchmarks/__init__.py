@@ -0,0 +1,9 @@
+""" Benchmarks of the throughput of pyCraft's packet handling.
+
+    Run them from the root of the source tree with:
+
+        python -m benchmarks --output results.json
+
+    The results are written as JSON, so that they may be compared between
+    releases: see 'benchmarks.__main__' for the format and the options.
+"""
@@ -0,0 +1,82 @@
+""" Runs the benchmarks, and writes their results as JSON.
+
+    The output is an object with the keys:
+     - 'pycraft_version', 'python_implementation' and 'python_version',
+       describing the environment;
+     - 'results': a list of objects, each having at least the keys
+       'benchmark', 'calls', 'seconds', 'items_per_sec' and 'bytes_per_sec',
+       and the other keys identifying the case measured; and
+     - 'skipped': a list of the packets which could not be measured, with the
+       reason for each.
+"""
+import argparse
+import json
+import platform
+import sys
+
+from minecraft import __version__, SUPPORTED_PROTOCOL_VERSIONS
+
+from . import datatypes, packets, read_path
+
+# Protocol versions of widely used releases, from 1.12.2 to 1.18.2.
+DEFAULT_PROTOCOL_VERSIONS = [340, 404, 498, 578, 754, 758]
+
+SUITES = 'types', 'packets', 'read_path'
+
+
+def run(suites=SUITES, protocol_versions=None, min_time=0.2):
+    """ Runs the given benchmark suites, and returns their results as a dict,
+        in the form described above.
+    """
+    if protocol_versions is None:
+        protocol_versions = [v for v in DEFAULT_PROTOCOL_VERSIONS
+                             if v in SUPPORTED_PROTOCOL_VERSIONS]
+    output = {
+        'pycraft_version': __version__,
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'results': [],
+        'skipped': [],
+    }
+    if 'types' in suites:
+        output['results'].extend(datatypes.run(min_time))
+    if 'packets' in suites:
+        results, skipped = packets.run(protocol_versions, min_time)
+        output['results'].extend(results)
+        output['skipped'].extend(skipped)
+    if 'read_path' in suites:
+        output['results'].extend(read_path.run(min_time))
+    return output
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '-o', '--output', type=argparse.FileType('w'), default=sys.stdout,
+        help='the file to which the results are written (default: stdout)')
+    parser.add_argument(
+        '-s', '--suite', action='append', choices=SUITES, dest='suites',
+        help='a suite of benchmarks to run; may be given more than once '
+             '(default: all)')
+    parser.add_argument(
+        '-p', '--protocol-version', action='append', type=int,
+        dest='protocol_versions',
+        help='a protocol version in which to measure each packet; may be '
+             'given more than once (default: %s)'
+             % ', '.join(map(str, DEFAULT_PROTOCOL_VERSIONS)))
+    parser.add_argument(
+        '-t', '--min-time', type=float, default=0.2,
+        help='the minimum time in seconds for which each case is measured '
+             '(default: %(default)s)')
+    options = parser.parse_args(args)
+
+    output = run(options.suites or SUITES, options.protocol_versions,
+                 options.min_time)
+    json.dump(output, options.output, indent=2, sort_keys=True)
+    options.output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+""" Microbenchmarks of reading and writing individual data types.
+"""
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import PacketBuffer, PacketView
+from minecraft.networking.types import (
+    VarInt, String, Position, NBT, PrefixedArray,
+)
+
+from .harness import measure
+from .samples import SAMPLE_NBT
+
+# Tuples '(name, type, value, count)' giving the values written and read by
+# each benchmark, where 'count' is the number of items in the value.
+CASES = [
+    ('VarInt (1 byte)', VarInt, 100, 1),
+    ('VarInt (5 bytes)', VarInt, 2**31 - 1, 1),
+    ('String', String, 'Hello, world! ' * 4, 1),
+    ('Position', Position, Position(100, 64, -100), 1),
+    ('NBT', NBT, SAMPLE_NBT, 1),
+    ('PrefixedArray(VarInt, VarInt)', PrefixedArray(VarInt, VarInt),
+     list(range(0, 256000, 1000)), 256),
+    ('PrefixedArray(VarInt, String)', PrefixedArray(VarInt, String),
+     ['minecraft:overworld'] * 16, 16),
+]
+
+
+def run(min_time):
+    """ Measures writing each value in 'CASES' to a 'PacketBuffer', and
+        reading it from a 'PacketView', returning a list of dicts.
+    """
+    context = ConnectionContext(
+        protocol_version=SUPPORTED_PROTOCOL_VERSIONS[-1])
+    results = []
+    for name, data_type, value, count in CASES:
+        packet_buffer = PacketBuffer()
+        data_type.send_with_context(value, packet_buffer, context)
+        data = packet_buffer.get_writable()
+
+        def write():
+            data_type.send_with_context(value, PacketBuffer(), context)
+
+        def read():
+            data_type.read_with_context(PacketView(data), context)
+
+        for benchmark, function in ('type_write', write), ('type_read', read):
+            results.append(dict(
+                benchmark=benchmark, type=name, size=len(data),
+                **measure(function, size=len(data), count=count,
+                          min_time=min_time)))
+    return results
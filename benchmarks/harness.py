@@ -0,0 +1,29 @@
+""" Timing of individual benchmarks.
+"""
+import time
+
+
+def measure(function, size=0, count=1, min_time=0.2):
+    """ Calls 'function' repeatedly, doubling the number of calls in each
+        round, until a round takes at least 'min_time' seconds, and returns
+        a dict describing the last round. 'count' is the number of items
+        (such as packets) and 'size' the number of bytes processed by each
+        call of 'function', from which the rates in the result are computed.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+
+    calls_per_sec = number / elapsed
+    return {
+        'calls': number,
+        'seconds': elapsed,
+        'items_per_sec': calls_per_sec * count,
+        'bytes_per_sec': calls_per_sec * size,
+    }
@@ -0,0 +1,449 @@
+""" An end-to-end load test, in which many clients connect to a local
+    'FakeServer', which streams a mix of packets to each of them at a target
+    rate. Run it from the root of the repository, for example:
+
+        python -m benchmarks.load --clients 1000 --rate 200 --mix movement
+
+    The server runs in this process, handling each client in its own thread,
+    and the clients are divided among worker processes, each of which runs
+    its share using a single 'Multiplexer'. The result, written as JSON,
+    describes:
+     - 'server': the packets and bytes written (including probes and
+       keep-alive packets), the rate achieved, the round-trip times of
+       keep-alive packets, and the number of those which were not answered
+       within '--keep-alive-timeout' seconds ('dropped');
+     - 'clients': the number of sessions which joined the game, the packets
+       received, the time taken to join the game, and the latency of
+       'TimeUpdatePacket's sent as probes, whose 'world_age' field holds the
+       time at which they were written.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import sys
+import threading
+import time
+
+from minecraft import __version__, SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection
+from minecraft.networking.framing import send_frames
+from minecraft.networking.multiplexer import Multiplexer
+from minecraft.networking.packets import Packet, clientbound, serverbound
+
+from . import fake_server
+from .samples import sample_packet
+
+
+def _chat_message(context):
+    packet = sample_packet(clientbound.play.ChatMessagePacket, context)
+    packet.json_data = json.dumps({
+        'translate': 'chat.type.text',
+        'with': ['LoadTestUser', 'The quick brown fox jumps over the lazy '
+                                 'dog, and then does so again.'],
+    })
+    return packet
+
+
+def _multi_block_change(context):
+    # A change to every block in the lower quarter of a chunk section.
+    packet = sample_packet(clientbound.play.MultiBlockChangePacket, context)
+    packet.records = [
+        clientbound.play.MultiBlockChangePacket.Record(
+            x=i & 0xF, y=i >> 8, z=(i >> 4) & 0xF, block_state_id=i)
+        for i in range(1024)]
+    return packet
+
+
+def _sample(packet_class):
+    return lambda context: sample_packet(packet_class, context)
+
+
+# For each mix, the functions creating its packets, given a context, with
+# the relative frequency with which each is sent.
+MIXES = {
+    'movement': [
+        (_sample(clientbound.play.EntityPositionDeltaPacket), 6),
+        (_sample(clientbound.play.EntityVelocityPacket), 3),
+        (_sample(clientbound.play.EntityLookPacket), 3),
+    ],
+    'chat': [
+        (_chat_message, 1),
+    ],
+    'bulk': [
+        (_multi_block_change, 3),
+        (_sample(clientbound.play.MapPacket), 1),
+    ],
+}
+MIXES['mixed'] = [(f, w * 4) for f, w in MIXES['movement']] \
+    + [(f, w) for f, w in MIXES['chat'] + MIXES['bulk']]
+
+
+class LoadClientHandler(fake_server.FakeClientHandler):
+    """ Handles a client of a 'LoadServer': after joining the game, streams
+        packets to the client from another thread, while this thread reads
+        the client's responses to keep-alive packets.
+    """
+
+    def handle_connection(self):
+        self.stats = self.server.add_session()
+        self.client_disconnected = False
+
+    def handle_play_start(self):
+        super(LoadClientHandler, self).handle_play_start()
+        self.write_lock = threading.Lock()
+        self.pending_keep_alives = {}
+        self.stream_thread = threading.Thread(
+            name='LoadStream', target=self._stream, daemon=True)
+        self.stream_thread.start()
+
+    def handle_play_packet(self, packet):
+        if isinstance(packet, serverbound.play.KeepAlivePacket):
+            received = time.monotonic()
+            with self.write_lock:
+                sent = self.pending_keep_alives.pop(
+                    packet.keep_alive_id, None)
+            if sent is None:
+                return
+            rtt = received - sent
+            if rtt > self.server.keep_alive_timeout:
+                self.stats['keep_alives_dropped'] += 1
+            else:
+                self.stats['keep_alive_rtt'].append(rtt)
+
+    def handle_play_client_disconnect(self):
+        self.client_disconnected = True
+        self.stream_thread.join()
+
+    def handle_abnormal_disconnect(self, exc):
+        self.stats['errors'].append(repr(exc))
+        return True
+
+    def _write_frames(self, frames):
+        with self.write_lock:
+            send_frames(self.socket, frames)
+        self.stats['packets_sent'] += len(frames)
+        self.stats['bytes_sent'] += sum(map(len, frames))
+
+    def _stream(self):
+        # Write the server's packets at its target rate, with probes and
+        # keep-alive packets at their own intervals, until its duration has
+        # elapsed; then wait for any outstanding keep-alive packets to be
+        # answered, and disconnect the client.
+        server, stats = self.server, self.stats
+        frames, rate = server.frames, server.rate
+        start = time.monotonic()
+        end = start + server.duration
+        next_keep_alive = next_probe = start
+        sent = 0
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= end or self.client_disconnected:
+                    break
+                due = int((now - start) * rate) - sent
+                batch = [frames[(sent + i) % len(frames)]
+                         for i in range(due)]
+                sent += due
+                if now >= next_probe:
+                    batch.append(server.serialize(
+                        clientbound.play.TimeUpdatePacket(
+                            world_age=int(time.time() * 1e6),
+                            time_of_day=0)))
+                    next_probe += server.probe_interval
+                if now >= next_keep_alive:
+                    keep_alive_id = stats['keep_alives_sent']
+                    batch.append(server.serialize(
+                        clientbound.play.KeepAlivePacket(
+                            keep_alive_id=keep_alive_id)))
+                    with self.write_lock:
+                        self.pending_keep_alives[keep_alive_id] = now
+                    stats['keep_alives_sent'] += 1
+                    next_keep_alive += server.keep_alive_interval
+                if batch:
+                    self._write_frames(batch)
+                time.sleep(max(0, min(
+                    start + (sent + 1) / rate, next_probe, next_keep_alive,
+                    end) - time.monotonic()))
+
+            while self.pending_keep_alives and not self.client_disconnected \
+                    and time.monotonic() < end + server.keep_alive_timeout:
+                time.sleep(0.01)
+            with self.write_lock:
+                stats['keep_alives_dropped'] += len(self.pending_keep_alives)
+                self.pending_keep_alives.clear()
+            stats['seconds'] = time.monotonic() - start
+            if self.client_disconnected:
+                return
+            self._write_frames([server.serialize(
+                clientbound.play.DisconnectPacket(
+                    json_data=json.dumps({'text': 'Load test finished.'})))])
+        except OSError as e:
+            stats['errors'].append(repr(e))
+
+
+class LoadServer(fake_server.FakeServer):
+    """ A 'FakeServer' which handles its clients concurrently, streaming
+        the packets of the given mix (a key of 'MIXES') to each client at
+        'rate' packets per second, for 'duration' seconds.
+    """
+
+    def __init__(self, mix='movement', rate=100, duration=10,
+                 keep_alive_interval=1, keep_alive_timeout=5,
+                 probe_interval=0.1, **kwds):
+        super(LoadServer, self).__init__(
+            client_handler_type=LoadClientHandler, concurrent=True, **kwds)
+        self.rate = rate
+        self.duration = duration
+        self.keep_alive_interval = keep_alive_interval
+        self.keep_alive_timeout = keep_alive_timeout
+        self.probe_interval = probe_interval
+        self.sessions = []
+
+        self.frames = []
+        for factory, weight in MIXES[mix]:
+            self.frames.extend([self.serialize(factory(self.context))]
+                               * weight)
+        random.Random(0).shuffle(self.frames)
+
+    def serialize(self, packet):
+        packet.context = self.context
+        return packet.serialize(self.compression_threshold)
+
+    def add_session(self):
+        # Return a new dict in which a client handler records its statistics.
+        stats = {'packets_sent': 0, 'bytes_sent': 0, 'seconds': 0,
+                 'keep_alives_sent': 0, 'keep_alives_dropped': 0,
+                 'keep_alive_rtt': [], 'errors': []}
+        with self.lock:
+            self.sessions.append(stats)
+        return stats
+
+
+def _run_clients(address, port, usernames, connection_kwds, results):
+    # The main function of a worker process running a share of the clients.
+    stats = {'joined': 0, 'failed': 0, 'packets_received': 0,
+             'join_time': [], 'latency': [], 'errors': []}
+
+    def make_connection(username):
+        def handle_exception(exc, exc_info):
+            stats['errors'].append(repr(exc))
+
+        connection = Connection(
+            address, port, username=username,
+            handle_exception=handle_exception, **connection_kwds)
+        started = time.monotonic()
+
+        def handle_join_game(packet):
+            stats['joined'] += 1
+            stats['join_time'].append(time.monotonic() - started)
+        connection.register_packet_listener(
+            handle_join_game, clientbound.play.JoinGamePacket)
+
+        def handle_packet(packet):
+            stats['packets_received'] += 1
+        connection.register_packet_listener(handle_packet, Packet)
+
+        def handle_time_update(packet):
+            stats['latency'].append(time.time() - packet.world_age / 1e6)
+        connection.register_packet_listener(
+            handle_time_update, clientbound.play.TimeUpdatePacket)
+        return connection
+
+    multiplexer = Multiplexer()
+    for username in usernames:
+        connection = make_connection(username)
+        multiplexer.add(connection)
+        try:
+            connection.connect()
+        except Exception as e:
+            stats['failed'] += 1
+            stats['errors'].append(repr(e))
+    multiplexer.run()
+    results.put(stats)
+
+
+def _summary(samples):
+    # Return a dict summarising the distribution of the given numbers.
+    samples = sorted(samples)
+    if not samples:
+        return None
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+    return {
+        'count': len(samples), 'mean': sum(samples) / len(samples),
+        'p50': percentile(0.5), 'p90': percentile(0.9),
+        'p99': percentile(0.99), 'max': samples[-1],
+    }
+
+
+def run(clients=10, mix='movement', rate=100, duration=10, processes=None,
+        compression_threshold=None, protocol_version=None,
+        keep_alive_interval=1, keep_alive_timeout=5, probe_interval=0.1,
+        mp_context=None):
+    """ Runs a load test with the given parameters, as described above, and
+        returns its result as a dict.
+    """
+    if protocol_version is None:
+        protocol_version = SUPPORTED_PROTOCOL_VERSIONS[-1]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, clients))
+    if mp_context is None:
+        mp_context = multiprocessing.get_context()
+
+    server = LoadServer(
+        mix=mix, rate=rate, duration=duration,
+        keep_alive_interval=keep_alive_interval,
+        keep_alive_timeout=keep_alive_timeout, probe_interval=probe_interval,
+        minecraft_version=protocol_version,
+        compression_threshold=compression_threshold)
+    port = server.listen_socket.getsockname()[1]
+    server_exc_info = []
+
+    def run_server():
+        try:
+            server.run()
+        except Exception:
+            server_exc_info.append(sys.exc_info())
+    server_thread = threading.Thread(
+        name='LoadServer', target=run_server, daemon=True)
+    server_thread.start()
+
+    usernames = ['LoadTest%d' % i for i in range(clients)]
+    results = mp_context.Queue()
+    workers = [
+        mp_context.Process(
+            target=_run_clients, name='LoadClients-%d' % i, daemon=True,
+            args=('localhost', port, usernames[i::processes],
+                  {'allowed_versions': {protocol_version}}, results))
+        for i in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    # Allow time for the clients to connect, and to answer the last
+    # keep-alive packets, in addition to the duration of the stream.
+    timeout = duration + keep_alive_timeout + 10 + clients / 100
+    deadline = time.monotonic() + timeout
+    client_stats = []
+    try:
+        for worker in workers:
+            client_stats.append(results.get(
+                timeout=max(0, deadline - time.monotonic())))
+    except queue.Empty:
+        pass
+    finally:
+        for worker in workers:
+            worker.join(fake_server.THREAD_TIMEOUT_S)
+            if worker.is_alive():
+                worker.terminate()
+        server.stop()
+        server_thread.join()
+    if server_exc_info:
+        exc_value, exc_tb = server_exc_info[0][1:]
+        raise exc_value.with_traceback(exc_tb)
+
+    sessions = server.sessions
+    seconds = max([s['seconds'] for s in sessions] or [0]) or duration
+    packets_sent = sum(s['packets_sent'] for s in sessions)
+    bytes_sent = sum(s['bytes_sent'] for s in sessions)
+    packets_received = sum(s['packets_received'] for s in client_stats)
+    return {
+        'pycraft_version': __version__,
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'config': {
+            'clients': clients, 'mix': mix, 'rate': rate,
+            'duration': duration, 'processes': processes,
+            'compression_threshold': compression_threshold,
+            'protocol_version': protocol_version,
+            'keep_alive_interval': keep_alive_interval,
+            'keep_alive_timeout': keep_alive_timeout,
+            'probe_interval': probe_interval,
+        },
+        'server': {
+            'sessions': len(sessions),
+            'packets_sent': packets_sent,
+            'bytes_sent': bytes_sent,
+            'target_packets_per_sec': len(sessions) * (
+                rate + 1 / probe_interval + 1 / keep_alive_interval),
+            'packets_per_sec': packets_sent / seconds,
+            'bytes_per_sec': bytes_sent / seconds,
+            'keep_alives_sent': sum(s['keep_alives_sent'] for s in sessions),
+            'keep_alives_dropped':
+                sum(s['keep_alives_dropped'] for s in sessions),
+            'keep_alive_rtt': _summary(
+                [t for s in sessions for t in s['keep_alive_rtt']]),
+            'errors': [e for s in sessions for e in s['errors']],
+        },
+        'clients': {
+            'workers_reported': len(client_stats),
+            'joined': sum(s['joined'] for s in client_stats),
+            'failed': sum(s['failed'] for s in client_stats),
+            'packets_received': packets_received,
+            'packets_per_sec': packets_received / seconds,
+            'join_time': _summary(
+                [t for s in client_stats for t in s['join_time']]),
+            'latency': _summary(
+                [t for s in client_stats for t in s['latency']]),
+            'errors': [e for s in client_stats for e in s['errors']],
+        },
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.load', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '-o', '--output', type=argparse.FileType('w'), default=sys.stdout,
+        help='the file to which the result is written (default: stdout)')
+    parser.add_argument(
+        '-c', '--clients', type=int, default=10,
+        help='the number of clients (default: %(default)s)')
+    parser.add_argument(
+        '-m', '--mix', choices=sorted(MIXES), default='movement',
+        help='the mix of packets streamed (default: %(default)s)')
+    parser.add_argument(
+        '-r', '--rate', type=float, default=100,
+        help='the packets per second streamed to each client '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '-d', '--duration', type=float, default=10,
+        help='the number of seconds for which packets are streamed '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '-j', '--processes', type=int,
+        help='the number of client processes (default: one for each CPU)')
+    parser.add_argument(
+        '-z', '--compression-threshold', type=int,
+        help='the compression threshold (default: no compression)')
+    parser.add_argument(
+        '-p', '--protocol-version', type=int,
+        help='the protocol version (default: the latest supported)')
+    parser.add_argument(
+        '--keep-alive-interval', type=float, default=1,
+        help='the seconds between keep-alive packets (default: %(default)s)')
+    parser.add_argument(
+        '--keep-alive-timeout', type=float, default=5,
+        help='the seconds after which an unanswered keep-alive packet is '
+             'considered dropped (default: %(default)s)')
+    options = parser.parse_args(args)
+
+    result = run(
+        clients=options.clients, mix=options.mix, rate=options.rate,
+        duration=options.duration, processes=options.processes,
+        compression_threshold=options.compression_threshold,
+        protocol_version=options.protocol_version,
+        keep_alive_interval=options.keep_alive_interval,
+        keep_alive_timeout=options.keep_alive_timeout)
+    json.dump(result, options.output, indent=2, sort_keys=True)
+    options.output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
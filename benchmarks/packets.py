@@ -0,0 +1,63 @@
+""" Benchmarks of encoding and decoding each packet class.
+"""
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import (
+    PacketBuffer, PacketView, clientbound, serverbound,
+)
+from minecraft.networking.types import VarInt
+
+from .harness import measure
+from .samples import sample_packet
+
+STATES = 'handshake', 'status', 'login', 'play'
+
+
+def packet_classes(context):
+    """ Yields a tuple '(direction, state, packet_class)' for each packet
+        class known in the given context.
+    """
+    for direction, module in ('clientbound', clientbound), \
+                             ('serverbound', serverbound):
+        for state in STATES:
+            classes = getattr(module, state).get_packets(context)
+            for packet_class in sorted(classes, key=lambda c: c.__name__):
+                yield direction, state, packet_class
+
+
+def run(protocol_versions, min_time):
+    """ Measures the encoding and decoding of a sample packet of each class,
+        in each of the given protocol versions. Returns a tuple '(results,
+        skipped)' of lists of dicts, where 'skipped' describes the packets
+        which could not be measured.
+    """
+    results, skipped = [], []
+    for protocol_version in protocol_versions:
+        context = ConnectionContext(protocol_version=protocol_version)
+        for direction, state, packet_class in packet_classes(context):
+            description = {
+                'packet': packet_class.__name__,
+                'direction': direction,
+                'state': state,
+                'protocol_version': protocol_version,
+            }
+            try:
+                packet = sample_packet(packet_class, context)
+                body = PacketBuffer()
+                packet.write_fields(body)
+                body = body.get_writable()
+                packet_class(context).read(PacketView(body))
+            except Exception as e:
+                skipped.append(dict(description, reason=repr(e)))
+                continue
+
+            size = VarInt.size(packet.id) + len(body)
+            results.append(dict(
+                description, benchmark='packet_encode', size=size,
+                **measure(packet.serialize, size=size, min_time=min_time)))
+
+            def decode():
+                packet_class(context).read(PacketView(body))
+            results.append(dict(
+                description, benchmark='packet_decode', size=size,
+                **measure(decode, size=size, min_time=min_time)))
+    return results, skipped
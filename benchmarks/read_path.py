@@ -0,0 +1,84 @@
+""" Benchmarks of the whole path by which received packets are read.
+"""
+import io
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking import encryption
+from minecraft.networking.connection import Connection
+from minecraft.networking.framing import FrameReader
+from minecraft.networking.packets import clientbound
+from minecraft.networking.reactors import PlayingReactor
+
+from .harness import measure
+from .samples import sample_packet
+
+# The classes of the packets in the stream read by each benchmark, with the
+# number of packets of each class in the stream.
+PACKET_MIX = [
+    (clientbound.play.EntityPositionDeltaPacket, 200),
+    (clientbound.play.EntityVelocityPacket, 100),
+    (clientbound.play.EntityLookPacket, 100),
+    (clientbound.play.TimeUpdatePacket, 20),
+    (clientbound.play.ChatMessagePacket, 20),
+    (clientbound.play.KeepAlivePacket, 10),
+    (clientbound.play.MultiBlockChangePacket, 10),
+    (clientbound.play.DestroyEntitiesPacket, 10),
+    (clientbound.play.MapPacket, 2),
+]
+
+COMPRESSION_THRESHOLD = 256
+
+
+def run(min_time, protocol_version=None):
+    """ Measures reading a stream of packets, as given by 'PACKET_MIX', using
+        a 'FrameReader' and 'PlayingReactor.parse_packet' as a connection's
+        networking thread does, with each combination of compression and
+        encryption enabled or disabled. Returns a list of dicts.
+    """
+    if protocol_version is None:
+        protocol_version = SUPPORTED_PROTOCOL_VERSIONS[-1]
+    connection = Connection('localhost', username='Benchmark',
+                            allowed_versions={protocol_version})
+    context = connection.context
+    context.protocol_version = protocol_version
+    packets = []
+    for packet_class, count in PACKET_MIX:
+        packets.extend([sample_packet(packet_class, context)] * count)
+
+    results = []
+    for compression in False, True:
+        threshold = COMPRESSION_THRESHOLD if compression else None
+        data = b''.join(p.serialize(threshold) for p in packets)
+        for encrypted in False, True:
+            secret = encryption.generate_shared_secret()
+            stream_data = data
+            if encrypted:
+                cipher = encryption.create_aes_cipher(secret)
+                stream_data = cipher.encryptor().update(data)
+
+            def read_all():
+                connection.options.compression_enabled = compression
+                reactor = PlayingReactor(connection)
+                frame_reader = connection.frame_reader = FrameReader()
+                stream = io.BytesIO(stream_data)
+                if encrypted:
+                    stream = encryption.EncryptedFileObjectWrapper(
+                        stream, encryption.create_aes_cipher(secret)
+                        .decryptor())
+                while True:
+                    frame = frame_reader.next_frame()
+                    if frame is not None:
+                        reactor.parse_packet(frame)
+                        continue
+                    try:
+                        frame_reader.receive(stream)
+                    except EOFError:
+                        break
+
+            results.append(dict(
+                benchmark='read_path', compression=compression,
+                encryption=encrypted, protocol_version=protocol_version,
+                size=len(stream_data),
+                **measure(read_all, size=len(stream_data),
+                          count=len(packets), min_time=min_time)))
+    return results
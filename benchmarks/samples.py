@@ -0,0 +1,175 @@
+""" Sample values of data types and packets, for use in benchmarks.
+"""
+import pynbt
+
+from minecraft.networking.packets import (
+    PacketBuffer, clientbound, serverbound,
+)
+from minecraft.networking.types import (
+    Type, Boolean, UnsignedByte, Byte, Short, UnsignedShort, Integer, Long,
+    UnsignedLong, Float, Double, Angle, VarInt, VarLong, String, UUID,
+    Position, NBT, VarIntPrefixedByteArray, ShortPrefixedByteArray,
+    TrailingByteArray, FixedPoint, PrefixedArray, Vector, MutableRecord,
+)
+
+
+SAMPLE_NBT = pynbt.TAG_Compound({
+    'natural': pynbt.TAG_Byte(1),
+    'effects': pynbt.TAG_String('minecraft:overworld'),
+    'height': pynbt.TAG_Int(256),
+    'coordinate_scale': pynbt.TAG_Double(1.0),
+}, '')
+
+SAMPLE_VALUES = {
+    Boolean: True,
+    UnsignedByte: 200,
+    Byte: -100,
+    Short: -1000,
+    UnsignedShort: 50000,
+    Integer: -100000,
+    Long: -2**40,
+    UnsignedLong: 2**40,
+    Float: 0.5,
+    Double: 1234.5,
+    Angle: 90.0,
+    VarInt: 1000,
+    VarLong: 2**40,
+    String: 'minecraft:overworld',
+    UUID: '12345678-1234-5678-1234-567812345678',
+    Position: Position(100, 64, -100),
+    NBT: SAMPLE_NBT,
+    VarIntPrefixedByteArray: bytes(range(64)),
+    ShortPrefixedByteArray: bytes(range(64)),
+    TrailingByteArray: bytes(range(64)),
+}
+
+# Values tried, in order, for types not otherwise known.
+_CANDIDATE_VALUES = (1, Vector(1, 2, 3), 'minecraft:stone', b'data')
+
+
+def sample_value(data_type, context):
+    """ Returns a value which may be written as the given type. If no such
+        value is known, TypeError is raised.
+    """
+    if isinstance(data_type, type) and data_type in SAMPLE_VALUES:
+        return SAMPLE_VALUES[data_type]
+    elif isinstance(data_type, FixedPoint):
+        return 2.5
+    elif isinstance(data_type, PrefixedArray):
+        return [sample_value(data_type.element_type, context)] * 4
+    elif isinstance(data_type, type) and issubclass(data_type, Vector):
+        return data_type(1, 2, 3)
+    elif isinstance(data_type, type) and \
+            issubclass(data_type, MutableRecord):
+        return data_type(**{slot: 1 for slot in data_type._all_slots()})
+    elif isinstance(data_type, (type, Type)):
+        for value in _CANDIDATE_VALUES:
+            try:
+                data_type.send_with_context(value, PacketBuffer(), context)
+            except Exception:
+                continue
+            return value
+    raise TypeError('No sample value is known for %r.' % data_type)
+
+
+def _map_packet(context):
+    packet = clientbound.play.MapPacket(context)
+    packet.map_id, packet.scale = 1, 0
+    packet.is_tracking_position, packet.is_locked = True, False
+    packet.icons = [clientbound.play.MapPacket.MapIcon(
+        type=2, direction=2, location=(1, 1))]
+    packet.width = packet.height = 128
+    packet.offset = (0, 0)
+    packet.pixels = bytes(range(256)) * 64
+    return packet
+
+
+def _destroy_entities_packet(context):
+    return clientbound.play.DestroyEntitiesPacket(
+        context, entity_ids=list(range(1000, 1064)))
+
+
+def _player_list_item_packet(context):
+    packet_class = clientbound.play.PlayerListItemPacket
+    properties = [packet_class.PlayerProperty(
+        name='textures', value='a' * 200, signature='b' * 100)]
+    return packet_class(
+        context, action_type=packet_class.AddPlayerAction,
+        actions=[packet_class.AddPlayerAction(
+            uuid=SAMPLE_VALUES[UUID], name='Player%d' % i,
+            properties=properties, gamemode=0, ping=50,
+            display_name='{"text": "Player%d"}' % i) for i in range(8)])
+
+
+def _spawn_mob_packet(context):
+    return clientbound.play.SpawnMobPacket(
+        context, entity_id=1000, entity_uuid=SAMPLE_VALUES[UUID], type_id=1,
+        x=100, y=64, z=-100, pitch=0.0, yaw=90.0, head_pitch=45.0,
+        velocity_x=100, velocity_y=0, velocity_z=-100)
+
+
+def _spawn_object_packet(context):
+    return clientbound.play.SpawnObjectPacket(
+        context, entity_id=1000, object_uuid=SAMPLE_VALUES[UUID], type_id=1,
+        x=100, y=64, z=-100, pitch=0.0, yaw=90.0, data=1,
+        velocity_x=100, velocity_y=0, velocity_z=-100)
+
+
+def _combat_event_packet(context):
+    return clientbound.play.CombatEventPacket(
+        context, event=clientbound.play.CombatEventPacket.EntityDeadEvent(
+            player_id=1000, entity_id=1001,
+            message='{"text": "Player was slain"}'))
+
+
+def _face_player_packet(context):
+    return clientbound.play.FacePlayerPacket(
+        context, origin=0, x=100.5, y=64.0, z=-100.5, entity_id=1000,
+        entity_origin=1)
+
+
+def _use_entity_packet(context):
+    packet_class = serverbound.play.UseEntityPacket
+    return packet_class(
+        context, entity_id=1000,
+        click_type=packet_class.ClickType.INTERACT_AT,
+        target_x=0.5, target_y=1.0, target_z=0.5,
+        hand=packet_class.Hand.MAIN)
+
+
+def _plugin_response_packet(context):
+    return serverbound.login.PluginResponsePacket(
+        context, message_id=1, successful=True, data=bytes(range(64)))
+
+
+# Functions creating sample packets of the classes which do not have a
+# 'definition', given a context.
+SAMPLE_PACKET_FACTORIES = {
+    clientbound.play.MapPacket: _map_packet,
+    clientbound.play.DestroyEntitiesPacket: _destroy_entities_packet,
+    clientbound.play.PlayerListItemPacket: _player_list_item_packet,
+    clientbound.play.SpawnMobPacket: _spawn_mob_packet,
+    clientbound.play.SpawnObjectPacket: _spawn_object_packet,
+    clientbound.play.CombatEventPacket: _combat_event_packet,
+    clientbound.play.FacePlayerPacket: _face_player_packet,
+    serverbound.play.UseEntityPacket: _use_entity_packet,
+    serverbound.login.PluginResponsePacket: _plugin_response_packet,
+}
+
+
+def sample_packet(packet_class, context):
+    """ Returns a packet of the given class, with sample values for its
+        fields. If this is not possible, TypeError is raised.
+    """
+    factory = SAMPLE_PACKET_FACTORIES.get(packet_class)
+    if factory is not None:
+        return factory(context)
+
+    packet = packet_class(context)
+    definition = getattr(packet, 'definition', None)
+    if definition is None:
+        raise TypeError('%s has no definition.' % packet_class.__name__)
+    for field in definition:
+        for name, data_type in field.items():
+            setattr(packet, name, sample_value(data_type, context))
+    return packet
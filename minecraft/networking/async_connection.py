@@ -0,0 +1,490 @@
+""" A variant of 'Connection' driven by an asyncio event loop, so that a single
+    thread may run many connections concurrently.
+"""
+import asyncio
+import inspect
+import socket
+import sys
+from collections import deque
+
+from .connection import Connection, STATE_STATUS
+from .framing import send_frames
+from .tracing import listener_name
+from minecraft import PROTOCOL_VERSION_INDICES
+from minecraft.exceptions import IgnorePacket
+
+
+class AsyncConnection(Connection):
+    """ A connection to a Minecraft server whose network I/O is performed by
+        an asyncio task, rather than by a 'NetworkingThread'. It accepts the
+        same constructor arguments as 'Connection', and uses the same packet
+        reactors, packet classes, and listener and exception handler API.
+
+        Its methods must be called from the thread running the event loop. The
+        methods 'connect', 'status' and 'write_packet' return awaitables, but
+        may also be called without awaiting their results (as the packet
+        reactors do):
+
+            conn = AsyncConnection('localhost', username='Player')
+            await conn.connect()
+            await conn.write_packet(serverbound.play.ChatPacket(message='Hi'))
+            await conn.wait_closed()
+
+        A packet listener may be a coroutine function, in which case the
+        coroutine it returns is awaited before the next listener is called,
+        and any 'IgnorePacket' it raises has the usual effect. Listeners of
+        packets written with 'force=True' are called without waiting for any
+        such coroutine, which is instead scheduled as a separate task.
+        Exception handlers, and the 'handle_exit' function, must be ordinary
+        functions.
+
+        Note that the default reactors perform some blocking operations, such
+        as the HTTP request made by 'AuthenticationToken.join' when logging in
+        to a server in online mode, which will block the event loop.
+    """
+
+    def __init__(self, *args, **kwds):
+        super(AsyncConnection, self).__init__(*args, **kwds)
+        self._outgoing_packet_queue = deque()
+        self._priority_packet_queue = deque()
+        # The entry in the outgoing queue of the packet of each class in the
+        # 'coalesce_packets' option which is waiting to be written, if any.
+        self._coalesced_entries = {}
+        self._write_event = None
+        # The event loop running the networking task, which is woken from
+        # other threads by '_offloaded_exception'.
+        self._loop = None
+        self._stream_reader = None
+        self._stream_writer = None
+
+    def connect(self):
+        """ Attempt to begin connecting to the server, as 'Connection.connect'
+            does. Returns an awaitable that completes when the connection has
+            been made, or raises the exception that prevented it.
+        """
+        self._check_connection()
+        self.context.protocol_version \
+            = max(self.allowed_proto_versions,
+                  key=PROTOCOL_VERSION_INDICES.get)
+        self.spawned = False
+        return self._start_network_task(self._start_login)
+
+    def status(self, handle_status=None, handle_ping=False):
+        """ Issue a status request to the server and then disconnect, as
+            'Connection.status' does. Returns an awaitable as 'connect' does.
+        """
+        self._check_connection()
+
+        def start():
+            self._handshake(next_state=STATE_STATUS)
+            self._start_status(handle_status, handle_ping)
+        return self._start_network_task(start)
+
+    def _start_network_task(self, start):
+        # Start a task which connects to the server, calls 'start' to begin
+        # the session, then runs the connection. Return the future which
+        # completes once the connection has been made.
+        task = NetworkingTask(self, start, previous=self.networking_thread)
+        if self.networking_thread is None:
+            self.networking_thread = task
+        else:
+            self.new_networking_thread = task
+        return task.connected
+
+    async def _connect_async(self):
+        # As 'Connection._connect', but without blocking the event loop.
+        self._outgoing_packet_queue = deque()
+        self._priority_packet_queue = deque()
+        self._coalesced_entries = {}
+        self._write_event = asyncio.Event()
+
+        loop = self._loop = asyncio.get_event_loop()
+        info = await loop.getaddrinfo(self.options.address, self.options.port,
+                                      type=socket.SOCK_STREAM)
+        ai_faml, ai_type, ai_prot, _ai_cnam, ai_addr = \
+            self._choose_address(info)
+
+        sock = socket.socket(ai_faml, ai_type, ai_prot)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, ai_addr)
+            self._stream_reader, self._stream_writer = \
+                await asyncio.open_connection(sock=sock)
+        except BaseException:
+            sock.close()
+            raise
+
+        self.socket = _StreamWriterSocket(self._stream_writer)
+        self.file_object = _ReceivedData()
+        self._reset_stream_state()
+
+    def write_packet(self, packet, force=False, priority=False):
+        """ Writes a packet to the server, as 'Connection.write_packet' does.
+            Returns an awaitable that completes when the packet has been
+            written (or discarded by an outgoing packet listener) and the
+            connection's write buffer has been flushed. If 'force' is True,
+            the packet is written immediately; otherwise, if 'priority' is
+            True, it is written before any other queued packets.
+
+            The outgoing queue is not limited by 'max_queue_size', as awaiting
+            the result of this method already limits it. A packet which
+            replaces a waiting packet of the same class (see the
+            'coalesce_packets' argument of 'Connection') shares the awaitable
+            returned for that packet.
+        """
+        packet.context = self.context
+        packet_class = type(packet)
+        if not force and not priority and \
+                packet_class in self.options.coalesce_packets:
+            entry = self._coalesced_entries.get(packet_class)
+            if entry is not None:
+                entry[0] = packet
+                if self.metrics is not None:
+                    self.metrics.record_coalesced()
+                return entry[1]
+
+        future = asyncio.get_event_loop().create_future()
+        if force:
+            self._write_packet(packet)
+            future.set_result(None)
+        else:
+            if priority:
+                self._priority_packet_queue.append((packet, future))
+            elif packet_class in self.options.coalesce_packets:
+                entry = self._coalesced_entries[packet_class] = \
+                    [packet, future]
+                self._outgoing_packet_queue.append(entry)
+            else:
+                self._outgoing_packet_queue.append((packet, future))
+            if self._write_event is not None:
+                self._write_event.set()
+        return future
+
+    def disconnect(self, immediate=False):
+        """ Terminate the existing server connection, if there is one, as
+            'Connection.disconnect' does.
+        """
+        self.connected = False
+
+        queues = self._priority_packet_queue, self._outgoing_packet_queue
+        if not immediate and self.socket is not None:
+            # Flush any packets remaining in the queues.
+            for queue in queues:
+                while queue:
+                    packet, future = queue.popleft()
+                    self._write_packet(packet)
+                    if not future.done():
+                        future.set_result(None)
+        # Any packets remaining in the queues will never be written.
+        for queue in queues:
+            while queue:
+                queue.popleft()[1].cancel()
+        self._coalesced_entries.clear()
+
+        if self.new_networking_thread is not None:
+            self.new_networking_thread.interrupt = True
+        elif self.networking_thread is not None:
+            self.networking_thread.interrupt = True
+        if self._write_event is not None:
+            self._write_event.set()
+
+        if self._stream_writer is not None:
+            self._stream_writer.close()
+            self._stream_writer = None
+            self.socket = None
+
+    async def wait_closed(self):
+        """ Waits until the networking task, and any task started to replace
+            it (for example, by reconnecting), has terminated. If the task
+            terminated due to an exception that was re-raised after being
+            handled (see the 'handle_exception' constructor argument), this
+            exception is raised.
+        """
+        task = self.new_networking_thread or self.networking_thread
+        while task is not None:
+            await task.task
+            task = self.new_networking_thread or self.networking_thread
+
+    def _offloaded_exception(self, exc_info):
+        # As 'Connection._offloaded_exception', but waking the write loop,
+        # which re-raises the exception, since there is no '_wakeup'.
+        super(AsyncConnection, self)._offloaded_exception(exc_info)
+        loop, write_event = self._loop, self._write_event
+        if loop is not None and write_event is not None:
+            try:
+                loop.call_soon_threadsafe(write_event.set)
+            except RuntimeError:
+                # The event loop is closed.
+                pass
+
+    def _call_listener(self, callback, packet):
+        # Call a listener of a packet written with 'force=True'.
+        tracer = self._tracer
+        if tracer is not None:
+            token = tracer.begin(
+                'listener', packet=type(packet).__name__,
+                listener=listener_name(callback), outgoing=True)
+        try:
+            result = callback(packet)
+        finally:
+            if tracer is not None:
+                tracer.end(token)
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+    def _write_packet(self, packet):
+        # As 'Connection._write_packet', but allowing asynchronous listeners.
+        packet_class = type(packet)
+        try:
+            for callback in self._get_callbacks(
+                    'early_outgoing_packet_listeners', packet_class):
+                self._call_listener(callback, packet)
+
+            self._send_packet(packet)
+
+            for callback in self._get_callbacks(
+                    'outgoing_packet_listeners', packet_class):
+                self._call_listener(callback, packet)
+        except IgnorePacket:
+            pass
+
+    async def _write_queued_packets(self):
+        # Write all packets in the outgoing queue to the network as a single
+        # batch, and wait until they have been flushed.
+        if self.options.compression_enabled:
+            compression_threshold = self.options.compression_threshold
+        else:
+            compression_threshold = None
+
+        batch = list(self._priority_packet_queue)
+        batch.extend(self._outgoing_packet_queue)
+        self._priority_packet_queue.clear()
+        self._outgoing_packet_queue.clear()
+        self._coalesced_entries.clear()
+        if self.metrics is not None:
+            self.metrics.record_queue_depth(len(batch))
+        tracer = self._tracer
+        try:
+            frames, written_packets = [], []
+            for packet, _future in batch:
+                try:
+                    await self._call_listeners(
+                        'early_outgoing_packet_listeners', packet)
+                except IgnorePacket:
+                    continue
+                frames.append(self._serialize_packet(
+                    packet, compression_threshold))
+                written_packets.append(packet)
+
+            if frames:
+                if tracer is not None:
+                    token = tracer.begin('write', packets=len(frames))
+                try:
+                    send_frames(self.socket, frames)
+                finally:
+                    if tracer is not None:
+                        tracer.end(token, size=sum(map(len, frames)))
+                if self.metrics is not None:
+                    for packet, frame in zip(written_packets, frames):
+                        self.metrics.record_outgoing(
+                            packet, frame, compression_threshold is not None)
+                await self._stream_writer.drain()
+
+            for packet in written_packets:
+                try:
+                    await self._call_listeners(
+                        'outgoing_packet_listeners', packet)
+                except IgnorePacket:
+                    pass
+        finally:
+            for _packet, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _call_listeners(self, listeners_name, packet):
+        # Call the listeners in the named list which listen to 'packet',
+        # awaiting the result of any asynchronous listener. Each traced call
+        # includes the time spent awaiting its result.
+        tracer = self._tracer
+        for callback in self._get_callbacks(listeners_name, type(packet)):
+            if tracer is not None:
+                token = tracer.begin(
+                    'listener', packet=type(packet).__name__,
+                    listener=listener_name(callback),
+                    outgoing='outgoing' in listeners_name)
+            try:
+                result = callback(packet)
+                if inspect.isawaitable(result):
+                    await result
+            finally:
+                if tracer is not None:
+                    tracer.end(token)
+
+    async def _react_async(self, packet):
+        # As 'Connection._react', but allowing asynchronous listeners. The
+        # time spent in listeners includes that of any awaited coroutines.
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.start_lap()
+        try:
+            await self._call_listeners('early_packet_listeners', packet)
+            if metrics is not None:
+                metrics.lap('listeners')
+            tracer = self._tracer
+            if tracer is None:
+                self.reactor.react(packet)
+            else:
+                token = tracer.begin('react', packet=type(packet).__name__)
+                try:
+                    self.reactor.react(packet)
+                finally:
+                    tracer.end(token)
+            if metrics is not None:
+                metrics.lap('reactor')
+            await self._call_listeners('packet_listeners', packet)
+        except IgnorePacket:
+            pass
+        if metrics is not None:
+            metrics.lap('listeners')
+
+
+class NetworkingTask(object):
+    """ The counterpart of 'NetworkingThread' for 'AsyncConnection': an
+        asyncio task which connects to the server, then reads and reacts to
+        incoming packets and writes outgoing packets until it is interrupted.
+        The attribute 'connected' is a future which completes when the
+        connection has been made.
+    """
+    def __init__(self, connection, start, previous=None):
+        self.interrupt = False
+        self.connection = connection
+        self.start = start
+        self.previous_task = previous
+        self.connected = asyncio.get_event_loop().create_future()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        connection = self.connection
+        try:
+            if self.previous_task is not None:
+                # Wait for the previous task to exit, ignoring any exception
+                # it raises, which is reported through its own 'task'.
+                await asyncio.wait([self.previous_task.task])
+                connection.networking_thread = self
+                connection.new_networking_thread = None
+            await self._connect()
+        except Exception as e:
+            self.interrupt = True
+            connection.networking_thread = None
+            if not self.connected.done():
+                self.connected.set_exception(e)
+            return
+
+        try:
+            await self._run()
+            connection._handle_exit()
+        except Exception as e:
+            self.interrupt = True
+            connection._handle_exception(e, sys.exc_info())
+        finally:
+            connection.networking_thread = None
+
+    async def _connect(self):
+        await self.connection._connect_async()
+        self.start()
+        self.connected.set_result(None)
+
+    async def _run(self):
+        read_task = asyncio.ensure_future(self._read_loop())
+        write_task = asyncio.ensure_future(self._write_loop())
+        try:
+            # The loops only return when the task is interrupted, after which
+            # the other loop is cancelled.
+            done, _pending = await asyncio.wait(
+                [read_task, write_task], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in read_task, write_task:
+                task.cancel()
+
+    async def _read_loop(self):
+        connection = self.connection
+        stream_reader = connection._stream_reader
+        received = connection.file_object
+        while not self.interrupt:
+            data = await stream_reader.read(0x10000)
+            if self.interrupt:
+                break
+            if not data:
+                raise EOFError('Unexpected end of message.')
+
+            # Pass the data through 'connection.file_object', which may be
+            # replaced by a wrapper that decrypts it.
+            received.feed(data)
+            while received and not self.interrupt:
+                connection.frame_reader.receive(connection.file_object)
+                while not self.interrupt:
+                    frame = connection.frame_reader.next_frame()
+                    if frame is None:
+                        break
+                    packet = connection.reactor.parse_packet(frame)
+                    await connection._react_async(packet)
+                    connection._raise_offloaded_exception()
+
+    async def _write_loop(self):
+        connection = self.connection
+        write_event = connection._write_event
+        while not self.interrupt:
+            connection._raise_offloaded_exception()
+            if not connection._outgoing_packet_queue and \
+                    not connection._priority_packet_queue:
+                await write_event.wait()
+                write_event.clear()
+                continue
+            await connection._write_queued_packets()
+
+
+class _StreamWriterSocket(object):
+    # Provides the methods of a socket used to write packets, so that packets
+    # can be written to an 'asyncio.StreamWriter' (possibly through an
+    # 'EncryptedSocketWrapper'). Writing only buffers the data; the writer
+    # must be drained separately.
+    __slots__ = 'writer',
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def sendall(self, data):
+        self.writer.write(data)
+
+    send = sendall
+
+
+class _ReceivedData(object):
+    # A file-like object from which 'readinto' reads the data most recently
+    # passed to 'feed', so that data received from an 'asyncio.StreamReader'
+    # can be passed to 'FrameReader.receive' (possibly through an
+    # 'EncryptedFileObjectWrapper').
+    __slots__ = '_data', '_offset'
+
+    def __init__(self):
+        self._data = b''
+        self._offset = 0
+
+    def feed(self, data):
+        self._data = self._data[self._offset:] + data
+        self._offset = 0
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self._data) - self._offset)
+        buffer[:count] = memoryview(self._data)[
+            self._offset:self._offset + count]
+        self._offset += count
+        return count
+
+    def __len__(self):
+        return len(self._data) - self._offset
+
+    def close(self):
+        pass
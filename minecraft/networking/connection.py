@@ -1,11 +1,18 @@
 import socket
 import sys
 import threading
-from collections import deque
-from threading import RLock
+import zlib
+from threading import RLock, get_ident
 
 from . import packets, reactors
+from .framing import FrameReader, send_frames
+from .encryption import EncryptedFileObjectWrapper
+from .metrics import ConnectionMetrics, MetricsRegistry
+from .offload import ListenerExecutor, OffloadedListener, in_worker_thread
+from .outgoing import OutgoingQueue, BLOCK, POLICIES
 from .packets import serverbound
+from .tracing import listener_name
+from .types import VarInt
 from .. import (
     utility, KNOWN_MINECRAFT_VERSIONS, SUPPORTED_MINECRAFT_VERSIONS,
     SUPPORTED_PROTOCOL_VERSIONS, PROTOCOL_VERSION_INDICES
@@ -27,6 +34,7 @@ class ConnectionContext(object):
         self.protocol_version = kwargs.get('protocol_version')
         self.enable_fml = kwargs.get('enable_fml', False)
         self.fml_mods = kwargs.get('fml_mods', [])
+        self.numpy_arrays = kwargs.get('numpy_arrays', False)
 
     def protocol_earlier(self, other_pv):
         """Returns True if the protocol version of this context was published
@@ -58,11 +66,99 @@ class ConnectionContext(object):
 
 class _ConnectionOptions(object):
     def __init__(self, address=None, port=None, compression_threshold=-1,
-                 compression_enabled=False):
+                 compression_enabled=False, batch_writes=False,
+                 lazy_decoding=False,
+                 compression_level=zlib.Z_DEFAULT_COMPRESSION,
+                 max_queue_size=None, queue_policy=BLOCK,
+                 coalesce_packets=()):
         self.address = address
         self.port = port
         self.compression_threshold = compression_threshold
         self.compression_enabled = compression_enabled
+        self.batch_writes = batch_writes
+        self.lazy_decoding = lazy_decoding
+        self.compression_level = compression_level
+        self.max_queue_size = max_queue_size
+        self.queue_policy = queue_policy
+        self.coalesce_packets = coalesce_packets
+
+
+class _Wakeup(object):
+    """ A pair of connected sockets, one of which becomes readable when 'set'
+        is called, so that a thread waiting for it using 'select' (together
+        with other sockets) can be woken from any other thread.
+    """
+    def __init__(self):
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+        # Whether 'set' has been called since 'clear', so that only the first
+        # call writes to the socket. This is only changed with '_lock' held,
+        # so that it is True exactly when the reading socket is readable.
+        self._set = False
+        self._lock = threading.Lock()
+
+    def fileno(self):
+        return self._reader.fileno()
+
+    def set(self):
+        with self._lock:
+            if self._set:
+                return
+            self._set = True
+            try:
+                self._writer.send(b'\0')
+            except OSError:
+                # The socket's buffer is full, so it is already readable, or
+                # the socket is closed.
+                pass
+
+    def clear(self):
+        with self._lock:
+            try:
+                while self._reader.recv(4096):
+                    pass
+            except OSError:
+                pass
+            self._set = False
+
+    def close(self):
+        with self._lock:
+            self._reader.close()
+            self._writer.close()
+
+
+class _WriteLock(object):
+    """ A re-entrant lock which records the thread holding it, so that code
+        which must not wait while it is held can tell whether it is.
+    """
+    def __init__(self):
+        self._lock = RLock()
+        self._owner = None
+        self._count = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._owner = get_ident()
+        self._count += 1
+        return True
+
+    def release(self):
+        self._count -= 1
+        if not self._count:
+            self._owner = None
+        self._lock.release()
+
+    def held(self):
+        """ Returns True if the lock is held by the calling thread. """
+        return self._owner == get_ident()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
 
 
 class Connection(object):
@@ -81,6 +177,16 @@ class Connection(object):
         handle_exception=None,
         handle_exit=None,
         enable_fml=False,
+        batch_writes=False,
+        lazy_decoding=False,
+        compression_level=zlib.Z_DEFAULT_COMPRESSION,
+        numpy_arrays=False,
+        metrics=None,
+        tracer=None,
+        listener_executor=None,
+        max_queue_size=None,
+        queue_policy=BLOCK,
+        coalesce_packets=(),
     ):
         """Sets up an instance of this object to be able to connect to a
         minecraft server.
@@ -123,6 +229,61 @@ class Connection(object):
                             and not with the intention to automatically
                             reconnect. Exceptions raised from this function
                             will be handled by any matching exception handlers.
+        :param batch_writes: If True, the networking thread writes all packets
+                             waiting in the outgoing queue as a single batch,
+                             which is compressed packet-by-packet, but
+                             encrypted and sent to the network at once. In
+                             this mode, outgoing packet listeners with
+                             'early=False' are called after the whole batch
+                             is sent.
+        :param lazy_decoding: If True, incoming packets are only decoded if
+                              there is an incoming packet listener for them,
+                              or if they are needed by the connection itself.
+                              The data of other packets is stored, and is only
+                              decoded if one of their fields is accessed. See
+                              'Packet.read_lazily'.
+        :param compression_level: The zlib compression level, from 0 to 9 or
+                                  -1 for zlib's default, used for outgoing
+                                  packets if the server enables compression.
+                                  Lower levels use less CPU time, at the cost
+                                  of larger packets.
+        :param numpy_arrays: If True and NumPy is installed, some array-heavy
+                             packet fields are decoded into NumPy arrays
+                             rather than lists of Python objects. Currently,
+                             this applies to the 'records' field of
+                             'MultiBlockChangePacket'.
+        :param metrics: If True, the connection counts the packets and bytes
+                        it reads and writes, and measures the time spent
+                        handling them, in the 'metrics' attribute, a
+                        'metrics.ConnectionMetrics'. If this is a
+                        'metrics.MetricsRegistry', these metrics are also
+                        added to it, named by the username. If None, the
+                        'metrics' attribute is None.
+        :param tracer: A 'tracing.Tracer' which is called at the start and end
+                       of each stage in the handling of packets, or None. See
+                       the 'tracer' attribute.
+        :param listener_executor: The 'offload.ListenerExecutor' which runs
+                                  the listeners registered with
+                                  'offload=True', which may be shared with
+                                  other connections. If None, one is created
+                                  when the first such listener is registered.
+        :param max_queue_size: The greatest number of packets which may wait
+                               in the outgoing queue, excluding those written
+                               with 'priority=True', or None for no limit.
+        :param queue_policy: What happens when a packet is written while the
+                             outgoing queue is full: 'outgoing.BLOCK' to wait
+                             for room, 'outgoing.DROP_OLDEST' to discard the
+                             oldest packet, or 'outgoing.COALESCE' to replace
+                             the latest packet of the same class, if any, or
+                             otherwise to wait. See 'outgoing.OutgoingQueue'.
+        :param coalesce_packets: The classes of outgoing packets of which only
+                                 the latest need be written, such as
+                                 'outgoing.MOVEMENT_PACKETS'. A packet of one
+                                 of these classes written while another of the
+                                 same class is waiting in the outgoing queue
+                                 replaces it, taking its place in the queue.
+                                 Outgoing packet listeners are not called for
+                                 the replaced packets.
         """  # NOQA
 
         if username is not None and auth_token is not None:
@@ -134,9 +295,12 @@ class Connection(object):
         if username is None:
             username = auth_token.get_profile().name
 
+        if queue_policy not in POLICIES:
+            raise ValueError('Unknown queue_policy: %r.' % queue_policy)
+
         # This lock is re-entrant because it may be acquired in a re-entrant
         # manner from within an outgoing packet
-        self._write_lock = RLock()
+        self._write_lock = _WriteLock()
 
         self.networking_thread = None
         self.new_networking_thread = None
@@ -145,6 +309,11 @@ class Connection(object):
         self.outgoing_packet_listeners = []
         self.early_outgoing_packet_listeners = []
         self._exception_handlers = []
+        # A cache of the callbacks of the listeners in each of the above lists
+        # that are called for each packet class. See '_get_callbacks'. The
+        # lists and the cache are only changed with '_dispatch_lock' held.
+        self._dispatch_table = {}
+        self._dispatch_lock = threading.Lock()
 
         def proto_version(version):
             if isinstance(version, str):
@@ -167,11 +336,18 @@ class Connection(object):
         else:
             self.default_proto_version = proto_version(initial_version)
 
-        self.context = ConnectionContext(protocol_version=latest_allowed_proto, enable_fml=enable_fml)
+        self.context = ConnectionContext(protocol_version=latest_allowed_proto, enable_fml=enable_fml,
+                                         numpy_arrays=numpy_arrays)
 
         self.options = _ConnectionOptions()
         self.options.address = address
         self.options.port = port
+        self.options.batch_writes = batch_writes
+        self.options.lazy_decoding = lazy_decoding
+        self.options.compression_level = compression_level
+        self.options.max_queue_size = max_queue_size
+        self.options.queue_policy = queue_policy
+        self.options.coalesce_packets = frozenset(coalesce_packets)
         self.auth_token = auth_token
         self.username = username
         self.connected = False
@@ -180,8 +356,41 @@ class Connection(object):
         self.exception, self.exc_info = None, None
         self.handle_exit = handle_exit
 
+        # The identity of the thread which last ran the networking loop, which
+        # must never wait for room in the outgoing queue.
+        self._loop_thread_ident = None
+
+        # If not None, the '_Wakeup' which wakes the networking thread (or
+        # multiplexer) when there are packets to be written.
+        self._wakeup = None
+
         self.spawned = False
         self.socket = None
+        self.frame_reader = None
+
+        # If not None, the 'multiplexer.Multiplexer' which runs this
+        # connection, instead of a 'NetworkingThread'.
+        self.multiplexer = None
+
+        # If not None, the 'recording.PacketRecorder' to which the data of
+        # each received packet is passed.
+        self.packet_recorder = None
+
+        # If not None, the 'metrics.ConnectionMetrics' in which the activity
+        # of the connection is recorded.
+        self.metrics = None
+        if isinstance(metrics, MetricsRegistry):
+            self.metrics = metrics.add(ConnectionMetrics(), username)
+        elif metrics:
+            self.metrics = ConnectionMetrics()
+
+        self.tracer = tracer
+
+        # The 'offload.ListenerExecutor' running offloaded listeners, and the
+        # 'exc_info' of the first exception raised by one of them which has
+        # not yet been handled by the networking thread.
+        self.listener_executor = listener_executor
+        self._offloaded_exc_info = None
 
         # The reactor handles all the default responses to packets,
         # it should be changed per networking state
@@ -193,7 +402,12 @@ class Connection(object):
                not self.networking_thread.interrupt or \
                self.new_networking_thread is not None:
                 raise InvalidState('A networking thread is already running.')
-            elif self.networking_thread is None:
+            elif self.multiplexer is not None:
+                self.multiplexer._start_session(self)
+                return
+            if self._wakeup is None:
+                self._wakeup = _Wakeup()
+            if self.networking_thread is None:
                 self.networking_thread = NetworkingThread(self)
                 self.networking_thread.start()
             else:
@@ -204,24 +418,59 @@ class Connection(object):
                     = NetworkingThread(self, previous=self.networking_thread)
                 self.new_networking_thread.start()
 
-    def write_packet(self, packet, force=False):
+    @property
+    def tracer(self):
+        """ The 'tracing.Tracer' called at the start and end of each stage in
+            the handling of this connection's packets, or None. This may be
+            changed at any time.
+        """
+        return self._tracer
+
+    @tracer.setter
+    def tracer(self, tracer):
+        self._tracer = tracer
+        if self.frame_reader is not None:
+            self.frame_reader.tracer = tracer
+        file_object = getattr(self, 'file_object', None)
+        if isinstance(file_object, EncryptedFileObjectWrapper):
+            file_object.tracer = tracer
+
+    def write_packet(self, packet, force=False, priority=False):
         """Writes a packet to the server.
 
         If force is set to true, the method attempts to acquire the write lock
         and write the packet out immediately, and as such may block.
 
         If force is false then the packet will be added to the end of the
-        packet writing queue to be sent 'as soon as possible'
+        packet writing queue to be sent 'as soon as possible'. If the queue is
+        full (see the 'max_queue_size' argument of the constructor), this may
+        wait for room, unless it is called from the networking thread, from
+        an offloaded packet listener, or with the write lock held, since each
+        of these may be what the networking thread is waiting for.
 
         :param packet: The :class:`network.packets.Packet` to write
         :param force: Specifies if the packet write should be immediate
+        :param priority: If True, the packet is added to the high-priority
+                         lane of the queue, and is written before any packets
+                         in the normal lane, regardless of the queue's size.
+                         This is used for responses which the server expects
+                         promptly, such as keep-alive packets.
         """
         packet.context = self.context
         if force:
+            tracer = self._tracer
+            if tracer is not None:
+                token = tracer.begin('write_lock')
             with self._write_lock:
+                if tracer is not None:
+                    tracer.end(token)
                 self._write_packet(packet)
         else:
-            self._outgoing_packet_queue.append(packet)
+            may_wait = get_ident() != self._loop_thread_ident and \
+                not self._write_lock.held() and not in_worker_thread()
+            self._outgoing_packet_queue.put(packet, priority, may_wait)
+            if self._wakeup is not None:
+                self._wakeup.set()
 
     def listener(self, *packet_types, **kwargs):
         """
@@ -260,6 +509,16 @@ class Connection(object):
         'outgoing=True', this will prevent the packet from being written to the
         network.
 
+        If 'offload=True', the listener is called in a worker thread of the
+        connection's 'listener_executor', so that a slow listener does not
+        delay the reading of packets or the built-in responses to them, such
+        as those to keep-alive and position packets. The offloaded listeners
+        of a connection are called in the order in which the packets were
+        read or written, one at a time, but possibly after later packets have
+        been handled by other listeners. Raising 'IgnorePacket' from them has
+        no effect, and any other exception is handled in the networking
+        thread, as if it had been raised there.
+
         :param method: The method which will be called back with the packet
         :param packet_types: The packets to listen for
         :param outgoing: If 'True', this listener will be called on outgoing
@@ -270,14 +529,66 @@ class Connection(object):
                       listeners with 'early=False' are called. If
                       'outgoing=True', the listener will be called before the
                       packet is written to the network, rather than afterwards.
+        :param offload: If 'True', this listener will be called in a worker
+                        thread, as described above. This cannot be combined
+                        with 'early=True'.
         """
         outgoing = kwargs.pop('outgoing', False)
         early = kwargs.pop('early', False)
+        if kwargs.pop('offload', False):
+            if early:
+                raise ValueError('Early listeners cannot be offloaded.')
+            if self.listener_executor is None:
+                self.listener_executor = ListenerExecutor()
+            method = OffloadedListener(self, method, outgoing)
         target = self.packet_listeners if not early and not outgoing \
             else self.early_packet_listeners if early and not outgoing \
             else self.outgoing_packet_listeners if not early \
             else self.early_outgoing_packet_listeners
-        target.append(packets.PacketListener(method, *packet_types))
+        with self._dispatch_lock:
+            target.append(packets.PacketListener(method, *packet_types))
+            self._dispatch_table.clear()
+
+    def _get_callbacks(self, listeners_name, packet_class):
+        # Return a tuple of the callbacks, in order of registration, of the
+        # listeners in the list named 'listeners_name' (such as
+        # 'packet_listeners') which listen to packets of the given class.
+        # This is computed once for each class, so that dispatching a packet
+        # does not require testing it against every listener.
+        key = listeners_name, packet_class
+        callbacks = self._dispatch_table.get(key)
+        if callbacks is None:
+            # The lock ensures that a listener registered while this is being
+            # computed is not left out of the cached tuple.
+            with self._dispatch_lock:
+                callbacks = self._dispatch_table[key] = tuple(
+                    listener.callback
+                    for listener in getattr(self, listeners_name)
+                    if listener.listens_to(packet_class))
+        return callbacks
+
+    def _offloaded_exception(self, exc_info):
+        # Called from a worker thread when an offloaded listener raises an
+        # exception, which is re-raised by '_raise_offloaded_exception'.
+        if self._offloaded_exc_info is None:
+            self._offloaded_exc_info = exc_info
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _raise_offloaded_exception(self):
+        # Re-raise, in the networking thread, the first exception raised by an
+        # offloaded listener since this was last called, if any.
+        exc_info, self._offloaded_exc_info = self._offloaded_exc_info, None
+        if exc_info is not None:
+            exc_value, exc_tb = exc_info[1:]
+            raise exc_value.with_traceback(exc_tb)
+
+    def _wants_packet(self, packet_class):
+        # Return True if incoming packets of the given class must be decoded,
+        # because the reactor or a listener may make use of them.
+        return self.reactor.reacts_to(packet_class) or \
+            bool(self._get_callbacks('early_packet_listeners', packet_class)) \
+            or bool(self._get_callbacks('packet_listeners', packet_class))
 
     def register_exception_handler(self, handler_func, *exc_types, **kwargs):
         """
@@ -332,23 +643,142 @@ class Connection(object):
             self._write_packet(self._outgoing_packet_queue.popleft())
             return True
 
+    def _pop_packets(self, max_packets):
+        # As '_pop_packet', but pops up to 'max_packets' packets off the
+        # outgoing queue and writes them out as a single batch, returning the
+        # number of packets popped.
+        batch = self._outgoing_packet_queue.pop_batch(max_packets)
+        if batch:
+            self._write_packets(batch)
+        return len(batch)
+
+    def _write_packets(self, packets):
+        # As '_write_packet', but writes several packets to the network at
+        # once. Packets written with 'force=True' by early outgoing listeners
+        # may reach the network before those in the batch.
+        if self.options.compression_enabled:
+            compression_threshold = self.options.compression_threshold
+        else:
+            compression_threshold = None
+
+        tracer = self._tracer
+        if tracer is not None:
+            token = tracer.begin('write', packets=len(packets))
+        frames, written_packets = [], []
+        try:
+            for packet in packets:
+                try:
+                    self._call_callbacks(self._get_callbacks(
+                        'early_outgoing_packet_listeners', type(packet)),
+                        packet, outgoing=True)
+                except IgnorePacket:
+                    continue
+                frames.append(self._serialize_packet(
+                    packet, compression_threshold))
+                written_packets.append(packet)
+
+            send_frames(self.socket, frames)
+        finally:
+            if tracer is not None:
+                tracer.end(token, size=sum(map(len, frames)))
+        if self.metrics is not None:
+            for packet, frame in zip(written_packets, frames):
+                self.metrics.record_outgoing(
+                    packet, frame, compression_threshold is not None)
+
+        for packet in written_packets:
+            try:
+                self._call_callbacks(self._get_callbacks(
+                    'outgoing_packet_listeners', type(packet)),
+                    packet, outgoing=True)
+            except IgnorePacket:
+                pass
+
     def _write_packet(self, packet):
         # Immediately writes the given packet to the network. The caller must
         # have the write lock acquired before calling this method.
+        packet_class = type(packet)
         try:
-            for listener in self.early_outgoing_packet_listeners:
-                listener.call_packet(packet)
+            self._call_callbacks(self._get_callbacks(
+                'early_outgoing_packet_listeners', packet_class),
+                packet, outgoing=True)
 
-            if self.options.compression_enabled:
-                packet.write(self.socket, self.options.compression_threshold)
-            else:
-                packet.write(self.socket)
+            self._send_packet(packet)
 
-            for listener in self.outgoing_packet_listeners:
-                listener.call_packet(packet)
+            self._call_callbacks(self._get_callbacks(
+                'outgoing_packet_listeners', packet_class),
+                packet, outgoing=True)
         except IgnorePacket:
             pass
 
+    def _send_packet(self, packet):
+        # Write the given packet to the socket, and record it in the metrics.
+        compression_enabled = self.options.compression_enabled
+        tracer = self._tracer
+        if self.metrics is None and tracer is None and \
+                self.packet_recorder is None:
+            if compression_enabled:
+                packet.write(self.socket, self.options.compression_threshold,
+                             self.options.compression_level)
+            else:
+                packet.write(self.socket)
+            return
+
+        if tracer is not None:
+            token = tracer.begin('write', packet=type(packet).__name__)
+        frame = b''
+        try:
+            frame = self._serialize_packet(
+                packet, self.options.compression_threshold
+                if compression_enabled else None)
+            self.socket.sendall(frame)
+        finally:
+            if tracer is not None:
+                tracer.end(token, size=len(frame))
+        if self.metrics is not None:
+            self.metrics.record_outgoing(packet, frame, compression_enabled)
+
+    def _serialize_packet(self, packet, compression_threshold):
+        # Return the frame of the given packet, as 'Packet.serialize' would,
+        # and pass its data, before compression, to the packet recorder, if
+        # there is one.
+        recorder = self.packet_recorder
+        if recorder is None:
+            return packet.serialize(
+                compression_threshold, self.options.compression_level)
+        packet_buffer = packets.PacketBuffer()
+        packet.write(packet_buffer)
+        packet_buffer.reset_cursor()
+        VarInt.read(packet_buffer)
+        data = packet_buffer.read()
+        recorder.record_outgoing(self, packet, data)
+        if compression_threshold is None:
+            return packet_buffer.get_writable()
+        packet_buffer.reset()
+        packet_buffer.send(data)
+        frame_buffer = packets.PacketBuffer()
+        packet._write_buffer(frame_buffer, packet_buffer,
+                             compression_threshold,
+                             self.options.compression_level)
+        return frame_buffer.get_writable()
+
+    def _call_callbacks(self, callbacks, packet, outgoing=False):
+        # Call each of the given listener callbacks with 'packet', tracing
+        # each call if there is a tracer.
+        tracer = self._tracer
+        if tracer is None:
+            for callback in callbacks:
+                callback(packet)
+            return
+        for callback in callbacks:
+            token = tracer.begin(
+                'listener', packet=type(packet).__name__,
+                listener=listener_name(callback), outgoing=outgoing)
+            try:
+                callback(packet)
+            finally:
+                tracer.end(token)
+
     def status(self, handle_status=None, handle_ping=False):
         """Issue a status request to the server and then disconnect.
 
@@ -367,22 +797,26 @@ class Connection(object):
             self._connect()
             self._handshake(next_state=STATE_STATUS)
             self._start_network_thread()
+            self._start_status(handle_status, handle_ping)
 
-            do_ping = handle_ping is not False
-            self.reactor = reactors.StatusReactor(self, do_ping=do_ping)
+    def _start_status(self, handle_status, handle_ping):
+        # Having sent the handshake, begin a status query, with the arguments
+        # of 'status'.
+        do_ping = handle_ping is not False
+        self.reactor = reactors.StatusReactor(self, do_ping=do_ping)
 
-            if handle_status is False:
-                self.reactor.handle_status = lambda *args, **kwds: None
-            elif handle_status is not None:
-                self.reactor.handle_status = handle_status
+        if handle_status is False:
+            self.reactor.handle_status = lambda *args, **kwds: None
+        elif handle_status is not None:
+            self.reactor.handle_status = handle_status
 
-            if handle_ping is False:
-                self.reactor.handle_ping = lambda *args, **kwds: None
-            elif handle_ping is not None:
-                self.reactor.handle_ping = handle_ping
+        if handle_ping is False:
+            self.reactor.handle_ping = lambda *args, **kwds: None
+        elif handle_ping is not None:
+            self.reactor.handle_ping = handle_ping
 
-            request_packet = serverbound.status.RequestPacket()
-            self.write_packet(request_packet)
+        request_packet = serverbound.status.RequestPacket()
+        self.write_packet(request_packet)
 
     def connect(self):
         """
@@ -403,23 +837,28 @@ class Connection(object):
 
             self.spawned = False
             self._connect()
-            if len(self.allowed_proto_versions) == 1:
-                # There is exactly one allowed protocol version, so skip the
-                # process of determining the server's version, and immediately
-                # connect.
-                self._handshake(next_state=STATE_PLAYING)
-                login_start_packet = serverbound.login.LoginStartPacket()
-                login_start_packet.name = self.username
-                self.write_packet(login_start_packet)
-                self.reactor = reactors.LoginReactor(self)
-            else:
-                # Determine the server's protocol version by first performing a
-                # status query.
-                self._handshake(next_state=STATE_STATUS)
-                self.write_packet(serverbound.status.RequestPacket())
-                self.reactor = reactors.PlayingStatusReactor(self)
+            self._start_login()
             self._start_network_thread()
 
+    def _start_login(self):
+        # Having connected to the server, begin logging in, or, if the
+        # protocol version is not yet known, begin a status query to find it.
+        if len(self.allowed_proto_versions) == 1:
+            # There is exactly one allowed protocol version, so skip the
+            # process of determining the server's version, and immediately
+            # connect.
+            self._handshake(next_state=STATE_PLAYING)
+            login_start_packet = serverbound.login.LoginStartPacket()
+            login_start_packet.name = self.username
+            self.write_packet(login_start_packet)
+            self.reactor = reactors.LoginReactor(self)
+        else:
+            # Determine the server's protocol version by first performing a
+            # status query.
+            self._handshake(next_state=STATE_STATUS)
+            self.write_packet(serverbound.status.RequestPacket())
+            self.reactor = reactors.PlayingStatusReactor(self)
+
     def _check_connection(self):
         if self.networking_thread is not None and \
            not self.networking_thread.interrupt or \
@@ -429,26 +868,39 @@ class Connection(object):
     def _connect(self):
         # Connect a socket to the server and create a file object from the
         # socket.
-        # The file object is used to read any and all data from the socket
-        # since it's "guaranteed" to read the number of bytes specified,
-        # the socket itself will mostly be used to write data upstream to
-        # the server.
-        self._outgoing_packet_queue = deque()
+        # The file object is used, through the frame reader, to read any and
+        # all data from the socket, while the socket itself will mostly be
+        # used to write data upstream to the server.
+        self._outgoing_packet_queue = OutgoingQueue(
+            self.options.max_queue_size, self.options.queue_policy,
+            self.metrics, self.options.coalesce_packets)
 
         info = socket.getaddrinfo(self.options.address, self.options.port,
                                   0, socket.SOCK_STREAM)
+        ai_faml, ai_type, ai_prot, _ai_cnam, ai_addr = \
+            self._choose_address(info)
 
-        # Prefer to use IPv4 (for backward compatibility with previous
-        # versions that always resolved hostnames to IPv4 addresses),
+        self.socket = socket.socket(ai_faml, ai_type, ai_prot)
+        self.socket.connect(ai_addr)
+        self.file_object = self.socket.makefile("rb", 0)
+        self._reset_stream_state()
+
+    @staticmethod
+    def _choose_address(info):
+        # Given the result of 'socket.getaddrinfo', return the entry to which
+        # to connect. Prefer to use IPv4 (for backward compatibility with
+        # previous versions that always resolved hostnames to IPv4 addresses),
         # then IPv6, then other address families.
         def key(ai):
             return 0 if ai[0] == socket.AF_INET else \
                    1 if ai[0] == socket.AF_INET6 else 2
-        ai_faml, ai_type, ai_prot, _ai_cnam, ai_addr = min(info, key=key)
+        return min(info, key=key)
 
-        self.socket = socket.socket(ai_faml, ai_type, ai_prot)
-        self.socket.connect(ai_addr)
-        self.file_object = self.socket.makefile("rb", 0)
+    def _reset_stream_state(self):
+        # Reset the state associated with the stream when a new socket has
+        # been connected.
+        self.frame_reader = FrameReader()
+        self.frame_reader.tracer = self._tracer
         self.options.compression_enabled = False
         self.options.compression_threshold = -1
         self.connected = True
@@ -469,8 +921,19 @@ class Connection(object):
                 self.new_networking_thread.interrupt = True
             elif self.networking_thread is not None:
                 self.networking_thread.interrupt = True
+            if self._wakeup is not None:
+                self._wakeup.set()
+                if self.multiplexer is None:
+                    # The wakeup is closed by the networking thread when it
+                    # exits, if it is running; a new one is created for the
+                    # next connection.
+                    wakeup, self._wakeup = self._wakeup, None
+                    if self.networking_thread is None and \
+                            self.new_networking_thread is None:
+                        wakeup.close()
 
             if self.socket is not None:
+                self._outgoing_packet_queue.close()
                 try:
                     self.socket.shutdown(socket.SHUT_RDWR)
                 except socket.error:
@@ -565,25 +1028,114 @@ class Connection(object):
             self.handle_exit()
 
     def _react(self, packet):
+        packet_class = type(packet)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.start_lap()
+        early_callbacks = self._get_callbacks(
+            'early_packet_listeners', packet_class)
+        callbacks = self._get_callbacks('packet_listeners', packet_class)
+        tracer = self._tracer
         try:
-            for listener in self.early_packet_listeners:
-                listener.call_packet(packet)
-            self.reactor.react(packet)
-            for listener in self.packet_listeners:
-                listener.call_packet(packet)
+            self._call_callbacks(early_callbacks, packet)
+            if metrics is not None and early_callbacks:
+                metrics.lap('listeners')
+            if tracer is None:
+                self.reactor.react(packet)
+            else:
+                token = tracer.begin('react', packet=packet_class.__name__)
+                try:
+                    self.reactor.react(packet)
+                finally:
+                    tracer.end(token)
+            if metrics is not None:
+                metrics.lap('reactor')
+            self._call_callbacks(callbacks, packet)
         except IgnorePacket:
             pass
+        # To reduce the overhead of the metrics, the listeners are only timed
+        # if there are any.
+        if metrics is not None and callbacks:
+            metrics.lap('listeners')
 
 
-class NetworkingThread(threading.Thread):
-    def __init__(self, connection, previous=None):
-        threading.Thread.__init__(self)
+class _NetworkingLoop(object):
+    """ The logic of the loop which writes and reads a connection's packets,
+        shared by 'NetworkingThread' and 'multiplexer.MultiplexedSession'.
+
+        'read_packet' is a function taking a timeout in seconds, which returns
+        the next packet received, waiting for up to that long if necessary, or
+        None if there is none.
+    """
+    def __init__(self, connection, read_packet, previous=None):
         self.interrupt = False
         self.connection = connection
+        self.read_packet = read_packet
+        self.previous_thread = previous
+
+    def _write_step(self):
+        # Attempt to write out as many as 300 packets. Return the number of
+        # packets written and the 'exc_info' of any IOError that occurred.
+        num_packets = 0
+        self.connection._loop_thread_ident = get_ident()
+        tracer = self.connection.tracer
+        if tracer is not None:
+            token = tracer.begin('write_lock')
+        with self.connection._write_lock:
+            if tracer is not None:
+                tracer.end(token)
+            metrics = self.connection.metrics
+            if metrics is not None:
+                metrics.record_queue_depth(
+                    len(self.connection._outgoing_packet_queue))
+            try:
+                if self.connection.options.batch_writes:
+                    if not self.interrupt:
+                        num_packets = self.connection._pop_packets(300)
+                else:
+                    while not self.interrupt and \
+                            self.connection._pop_packet():
+                        num_packets += 1
+                        if num_packets >= 300:
+                            break
+                exc_info = None
+            except IOError:
+                exc_info = sys.exc_info()
+        return num_packets, exc_info
+
+    def _read_step(self, num_packets, exc_info, read_timeout=0):
+        # Read and react to packets until as many as 50 packets in total have
+        # been written or read, then raise the exception described by
+        # 'exc_info', if any. Return the total number of packets.
+        while num_packets < 50 and not self.interrupt:
+            packet = self.read_packet(read_timeout)
+            if not packet:
+                break
+            num_packets += 1
+            self.connection._react(packet)
+            read_timeout = 0
+
+            # Ignore the earlier exception if a disconnect packet is
+            # received, as it may have been caused by trying to write to
+            # the closed socket, which does not represent a program error.
+            if exc_info is not None and packet.packet_name == "disconnect":
+                exc_info = None
+
+        if exc_info is not None:
+            exc_value, exc_tb = exc_info[1:]
+            raise exc_value.with_traceback(exc_tb)
+        self.connection._raise_offloaded_exception()
+        return num_packets
+
+
+class NetworkingThread(threading.Thread, _NetworkingLoop):
+    def __init__(self, connection, previous=None):
+        threading.Thread.__init__(self)
+        _NetworkingLoop.__init__(
+            self, connection, self._read_packet, previous)
         self.name = "Networking Thread"
         self.daemon = True
-
-        self.previous_thread = previous
+        self.wakeup = connection._wakeup
 
     def run(self):
         try:
@@ -601,45 +1153,30 @@ class NetworkingThread(threading.Thread):
         finally:
             with self.connection._write_lock:
                 self.connection.networking_thread = None
+                if self.wakeup is not self.connection._wakeup:
+                    # The connection was disconnected (see 'disconnect').
+                    self.wakeup.close()
 
     def _run(self):
+        wakeup = self.wakeup
         while not self.interrupt:
-            # Attempt to write out as many as 300 packets.
-            num_packets = 0
-            with self.connection._write_lock:
-                try:
-                    while not self.interrupt and self.connection._pop_packet():
-                        num_packets += 1
-                        if num_packets >= 300:
-                            break
-                    exc_info = None
-                except IOError:
-                    exc_info = sys.exc_info()
-
-                # If any packets remain to be written, resume writing as soon
-                # as possible after reading any available packets; otherwise,
-                # wait for up to 50ms (1 tick) for new packets to arrive.
-                if self.connection._outgoing_packet_queue:
-                    read_timeout = 0
-                else:
-                    read_timeout = 0.05
-
-            # Read and react to as many as 50 packets.
-            while num_packets < 50 and not self.interrupt:
-                packet = self.connection.reactor.read_packet(
-                    self.connection.file_object, timeout=read_timeout)
-                if not packet:
-                    break
-                num_packets += 1
-                self.connection._react(packet)
+            # Any packet queued after this is either written by this step or
+            # wakes the thread from the following read.
+            wakeup.clear()
+            num_packets, exc_info = self._write_step()
+
+            # If any packets remain to be written, resume writing as soon as
+            # possible after reading any available packets; otherwise, wait
+            # until packets arrive, or until 'write_packet' or 'disconnect'
+            # wakes the thread.
+            if self.connection._outgoing_packet_queue:
                 read_timeout = 0
+            else:
+                read_timeout = None
 
-                # Ignore the earlier exception if a disconnect packet is
-                # received, as it may have been caused by trying to write to
-                # the closed socket, which does not represent a program error.
-                if exc_info is not None and packet.packet_name == "disconnect":
-                    exc_info = None
+            self._read_step(num_packets, exc_info, read_timeout)
 
-            if exc_info is not None:
-                exc_value, exc_tb = exc_info[1:]
-                raise exc_value.with_traceback(exc_tb)
+    def _read_packet(self, timeout):
+        return self.connection.reactor.read_packet(
+            self.connection.file_object, timeout=timeout,
+            wakeup=self.wakeup)
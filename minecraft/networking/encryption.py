@@ -48,14 +48,54 @@ def minecraft_sha1_hash_digest(sha1_hash):
     return format(number_representation, 'x')
 
 
+def _update_in_place(context, view):
+    # Pass the bytes in the writable memoryview 'view' through the cipher
+    # context 'context' (an encryptor or decryptor), replacing them with the
+    # result. As AES-CFB8 is a stream mode, the output is the same length as
+    # the input, so no further buffer is needed.
+    try:
+        context.update_into(view, view)
+    except (AttributeError, ValueError):
+        # 'update_into' is not provided by the oldest supported versions of
+        # 'cryptography', and some later versions require an output buffer
+        # 'block_size - 1' bytes longer than the input, raising ValueError
+        # (before changing the state of the context) if it is not.
+        view[:] = context.update(view)
+
+
 class EncryptedFileObjectWrapper(object):
+    """ Wraps a file object, decrypting the data read from it.
+
+        'readinto' should be preferred to 'read' where possible: it decrypts
+        all of the data received by a single call to the underlying object,
+        in place, and so calls the decryptor once for each chunk of received
+        data, rather than once for each field read from the stream.
+    """
     def __init__(self, file_object, decryptor):
         self.actual_file_object = file_object
         self.decryptor = decryptor
+        # If not None, the 'tracing.Tracer' of the decryption of each chunk
+        # read by 'readinto'.
+        self.tracer = None
 
     def read(self, length):
         return self.decryptor.update(self.actual_file_object.read(length))
 
+    def readinto(self, buffer):
+        count = self.actual_file_object.readinto(buffer)
+        if count:
+            tracer = self.tracer
+            if tracer is None:
+                _update_in_place(self.decryptor, memoryview(buffer)[:count])
+            else:
+                token = tracer.begin('decrypt')
+                try:
+                    _update_in_place(
+                        self.decryptor, memoryview(buffer)[:count])
+                finally:
+                    tracer.end(token, size=count)
+        return count
+
     def fileno(self):
         return self.actual_file_object.fileno()
 
@@ -64,6 +104,14 @@ class EncryptedFileObjectWrapper(object):
 
 
 class EncryptedSocketWrapper(object):
+    """ Wraps a socket, encrypting the data sent and decrypting the data
+        received through it.
+
+        Each call to 'send' or 'sendall' calls the encryptor once, so the
+        data of a packet, or a batch of packets, should be written with a
+        single call (as 'Packet.write' and 'framing.send_frames' do) rather
+        than field by field.
+    """
     def __init__(self, socket, encryptor, decryptor):
         self.actual_socket = socket
         self.encryptor = encryptor
@@ -72,8 +120,20 @@ class EncryptedSocketWrapper(object):
     def recv(self, length):
         return self.decryptor.update(self.actual_socket.recv(length))
 
+    def recv_into(self, buffer, nbytes=0):
+        count = self.actual_socket.recv_into(buffer, nbytes)
+        if count:
+            _update_in_place(self.decryptor, memoryview(buffer)[:count])
+        return count
+
     def send(self, data):
-        self.actual_socket.send(self.encryptor.update(data))
+        # The encryptor's state has advanced past all of 'data', so it must
+        # all be sent, even if the underlying socket would send only part.
+        self.sendall(data)
+        return len(data)
+
+    def sendall(self, data):
+        self.actual_socket.sendall(self.encryptor.update(data))
 
     def fileno(self):
         return self.actual_socket.fileno()
@@ -0,0 +1,187 @@
+""" Running many bot sessions across several processes.
+"""
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+from .connection import Connection
+from .multiplexer import Multiplexer
+from .packets import clientbound, serverbound
+
+
+FleetEvent = namedtuple('FleetEvent', ('kind', 'username', 'data'))
+FleetEvent.__doc__ = """ An event reported by a session run by a 'Fleet'.
+    'kind' is one of:
+     - 'chat': a chat message was received, and 'data' is its JSON data;
+     - 'disconnect': the server disconnected the session in the play state,
+       and 'data' is the JSON data of the reason given;
+     - 'exit': the session terminated without an error, and 'data' is None;
+     - 'error': an exception occurred in the session, and 'data' is its
+       'repr', as the exception itself may not be picklable;
+     - 'latency': a keep-alive packet was answered, and 'data' is the time in
+       seconds between its receipt and the response being written.
+"""
+
+# The arguments of 'Connection' which are given by the worker processes, so
+# may not be included in the 'connection_kwds' of a 'Fleet'.
+_RESERVED_KWDS = ('username', 'handle_exception', 'handle_exit')
+
+
+class Fleet(object):
+    """ Runs a session for each of the given usernames, connected in offline
+        mode to the given server, divided among 'processes' worker processes
+        (by default, one for each CPU), each of which runs its share of the
+        sessions using a single 'Multiplexer'. This allows the CPU-bound work
+        of the sessions, such as parsing, compression and encryption, to make
+        use of several cores.
+
+        The events of each worker's sessions are sent back to the parent
+        process in batches, once per iteration of its loop, and may be read
+        from 'events':
+
+            fleet = Fleet('localhost', 25565, ['Bot%d' % i for i in range(99)])
+            fleet.start()
+            for event in fleet.events():
+                print(event.kind, event.username, event.data)
+
+        'connection_kwds' are passed to the constructor of each 'Connection'.
+        They may not include 'username', 'handle_exception' or 'handle_exit',
+        which are given by the worker; the exceptions and exits of the
+        sessions are reported as events instead.
+        If 'setup' is not None, it is called with each 'Connection' in the
+        worker process before it connects, for example to register packet
+        listeners; it must be picklable, such as a module-level function.
+        'mp_context' may be a 'multiprocessing' context, such as that returned
+        by 'multiprocessing.get_context("spawn")'.
+    """
+
+    def __init__(self, address, port=25565, usernames=(), processes=None,
+                 connection_kwds=None, setup=None, mp_context=None):
+        reserved = set(connection_kwds or ()) & set(_RESERVED_KWDS)
+        if reserved:
+            raise ValueError('connection_kwds may not include: %s.'
+                             % ', '.join(sorted(reserved)))
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if mp_context is None:
+            mp_context = multiprocessing.get_context()
+        usernames = list(usernames)
+        processes = max(1, min(processes, len(usernames)))
+
+        self._queue = mp_context.Queue()
+        self._stop_event = mp_context.Event()
+        self._workers = [
+            mp_context.Process(
+                target=_run_worker, name='FleetWorker-%d' % i, daemon=True,
+                args=(address, port, usernames[i::processes],
+                      connection_kwds or {}, setup, self._queue,
+                      self._stop_event))
+            for i in range(processes)]
+        self._running = 0
+
+    def start(self):
+        """ Starts the worker processes. """
+        for worker in self._workers:
+            worker.start()
+        self._running = len(self._workers)
+
+    def events(self, timeout=None):
+        """ Yields a 'FleetEvent' for each event reported by the sessions, in
+            the order received, until all of the workers have finished (when
+            all of their sessions have terminated, or after 'stop' is called).
+            If 'timeout' is not None and no event is received for that many
+            seconds, 'queue.Empty' is raised.
+        """
+        while self._running:
+            batch = self._queue.get(timeout=timeout)
+            if batch is None:
+                self._running -= 1
+                continue
+            for event in batch:
+                yield FleetEvent(*event)
+
+    def stop(self):
+        """ Causes each worker to disconnect its sessions and finish. """
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        """ Waits for each worker process to exit. """
+        for worker in self._workers:
+            worker.join(timeout)
+
+
+def _run_worker(address, port, usernames, connection_kwds, setup, queue,
+                stop_event):
+    # The main function of a worker process of a 'Fleet'.
+    multiplexer = Multiplexer()
+    events = []
+    connections = []
+    for username in usernames:
+        connection = _make_connection(
+            address, port, username, connection_kwds, events)
+        if setup is not None:
+            setup(connection)
+        multiplexer.add(connection)
+        try:
+            connection.connect()
+        except Exception as e:
+            events.append(('error', username, repr(e)))
+        else:
+            connections.append(connection)
+
+    stopping = False
+    while multiplexer.num_sessions:
+        if not stopping and stop_event.is_set():
+            for connection in connections:
+                connection.disconnect()
+            stopping = True
+        multiplexer.run_once()
+        if events:
+            queue.put(events[:])
+            del events[:]
+    if events:
+        queue.put(events)
+    queue.put(None)
+
+
+def _make_connection(address, port, username, connection_kwds, events):
+    # Create a connection which reports its events by appending them, as
+    # tuples, to 'events'.
+    def handle_exception(exc, exc_info):
+        events.append(('error', username, repr(exc)))
+
+    def handle_exit():
+        events.append(('exit', username, None))
+
+    connection = Connection(
+        address, port, username=username, handle_exception=handle_exception,
+        handle_exit=handle_exit, **connection_kwds)
+
+    def handle_chat(packet):
+        events.append(('chat', username, packet.json_data))
+    connection.register_packet_listener(
+        handle_chat, clientbound.play.ChatMessagePacket)
+
+    def handle_disconnect(packet):
+        events.append(('disconnect', username, packet.json_data))
+    connection.register_packet_listener(
+        handle_disconnect, clientbound.play.DisconnectPacket)
+
+    keep_alive_times = {}
+
+    def handle_keep_alive(packet):
+        keep_alive_times[packet.keep_alive_id] = time.monotonic()
+    connection.register_packet_listener(
+        handle_keep_alive, clientbound.play.KeepAlivePacket, early=True)
+
+    def handle_keep_alive_response(packet):
+        received = keep_alive_times.pop(packet.keep_alive_id, None)
+        if received is not None:
+            events.append(
+                ('latency', username, time.monotonic() - received))
+    connection.register_packet_listener(
+        handle_keep_alive_response, serverbound.play.KeepAlivePacket,
+        outgoing=True)
+
+    return connection
@@ -0,0 +1,189 @@
+""" Buffered reading and vectored writing of length-prefixed packet frames.
+"""
+import os
+import select
+import time
+
+
+class FrameReader(object):
+    """ Reads length-prefixed frames from a stream into a reusable buffer,
+        receiving data in large chunks rather than one field at a time.
+
+        Each frame is returned as a 'memoryview' of the internal buffer,
+        without copying. Such a view is only valid until the next call to
+        'read_frame', after which its contents may be overwritten; it must be
+        copied if it is to be retained for longer.
+
+        The buffer is linear: consumed data is discarded by moving any
+        unconsumed data to its start, so that every frame is contiguous. If a
+        frame is larger than the buffer, a larger buffer is allocated.
+    """
+
+    __slots__ = '_buffer', '_view', '_start', '_end', 'tracer'
+
+    # Limit the size of the length prefix, as for 'types.VarInt', to prevent
+    # a malicious peer from making us read an unbounded length.
+    max_length_bytes = 5
+
+    # The largest frame length accepted, which is the largest that can be
+    # encoded in 3 bytes, as in the vanilla protocol. A longer frame is
+    # rejected before any buffer is allocated for it.
+    max_frame_length = 2 ** 21 - 1
+
+    def __init__(self, size=0x10000):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # The index of the first unconsumed byte.
+        self._end = 0    # The index just after the last received byte.
+        # If not None, the 'tracing.Tracer' of each call of 'receive'.
+        self.tracer = None
+
+    def read_frame(self, stream, timeout=0, wakeup=None):
+        """ Returns the next complete frame (excluding its length prefix), or
+            None if 'timeout' seconds elapse before one is available. If
+            'timeout' is None, this waits indefinitely.
+
+            'stream' must have the methods 'readinto' and 'fileno', as the
+            unbuffered file objects returned by 'socket.makefile' do. It is
+            only waited on (using 'select') if no complete frame is already
+            buffered. If the stream reaches end-of-file, EOFError is raised.
+
+            If 'wakeup' is not None, it is an object with a 'fileno' method
+            which is waited on together with the stream, and None is returned
+            as soon as it becomes readable. It is not read from.
+        """
+        frame = self.next_frame()
+        if frame is not None:
+            return frame
+
+        waited = [stream] if wakeup is None else [stream, wakeup]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ready_to_read = select.select(waited, [], [], timeout)[0]
+            if not ready_to_read:
+                return None
+            if ready_to_read[0] is stream:
+                self.receive(stream)
+                frame = self.next_frame()
+                if frame is not None:
+                    return frame
+            if ready_to_read[-1] is wakeup:
+                return None
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+
+    def transform_pending(self, function):
+        """ Replaces any data that has been received but not yet returned in a
+            frame with the result of calling 'function' on it. The result must
+            be of the same length. This is used when the stream's encoding
+            changes mid-stream, such as when encryption is enabled.
+        """
+        if self._end > self._start:
+            pending = self._view[self._start:self._end]
+            pending[:] = function(pending)
+
+    def next_frame(self):
+        """ Returns the next complete frame that has already been received,
+            as 'read_frame' does, or None if there is none. This does not read
+            from any stream, so it may be used with 'receive' when the stream
+            is known to be readable: for example, from an event loop.
+        """
+        buffer, index, end = self._buffer, self._start, self._end
+        length = shift = 0
+        while True:
+            if index >= end:
+                return None
+            byte = buffer[index]
+            index += 1
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+            if shift >= 7 * self.max_length_bytes:
+                raise ValueError("Tried to read too long of a VarInt")
+        if length > self.max_frame_length:
+            raise ValueError('Frame length of %d exceeds the maximum of %d.'
+                             % (length, self.max_frame_length))
+
+        if index + length > end:
+            self._reserve(index + length - self._start)
+            return None
+        self._start = index + length
+        return self._view[index:self._start]
+
+    def _reserve(self, size):
+        # Ensure that the buffer can hold at least 'size' bytes of unconsumed
+        # data. The existing buffer is never resized in place, as there may be
+        # exported views of it.
+        if size > len(self._buffer):
+            buffer = bytearray(max(size, 2 * len(self._buffer)))
+            buffer[:self._end - self._start] = \
+                self._view[self._start:self._end]
+            self._buffer, self._view = buffer, memoryview(buffer)
+            self._start, self._end = 0, self._end - self._start
+
+    def receive(self, stream):
+        """ Receives as much data as is available from 'stream' using a single
+            call to its 'readinto' method, up to the remaining capacity of the
+            buffer. If the stream reaches end-of-file, EOFError is raised.
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buffer) or \
+                self._start > len(self._buffer) // 2:
+            size = self._end - self._start
+            self._view[:size] = self._view[self._start:self._end]
+            self._start, self._end = 0, size
+
+        tracer = self.tracer
+        if tracer is None:
+            count = stream.readinto(self._view[self._end:])
+        else:
+            token = tracer.begin('receive')
+            count = None
+            try:
+                count = stream.readinto(self._view[self._end:])
+            finally:
+                tracer.end(token, size=count or 0)
+        if count == 0:
+            raise EOFError("Unexpected end of message.")
+        elif count is not None:
+            self._end += count
+
+
+def send_frames(socket, frames):
+    """ Writes each of the bytes-like objects in 'frames' to 'socket', in
+        order, blocking until all of them have been written.
+
+        If 'socket' supports 'sendmsg', the frames are written using vectored
+        I/O, so that they may reach the network in a single system call
+        without first being copied into one buffer; otherwise, they are joined
+        and written using a single call to 'sendall' (so that, for example,
+        an 'EncryptedSocketWrapper' encrypts them all at once).
+    """
+    sendmsg = getattr(socket, 'sendmsg', None)
+    if sendmsg is None:
+        socket.sendall(b''.join(frames))
+        return
+
+    buffers = [memoryview(frame) for frame in frames if len(frame)]
+    index = 0
+    while index < len(buffers):
+        sent = sendmsg(buffers[index:index + IOV_MAX])
+        # Skip past any buffers that were completely written, and trim the
+        # buffer that was partially written, if any.
+        while sent and sent >= len(buffers[index]):
+            sent -= len(buffers[index])
+            index += 1
+        if sent:
+            buffers[index] = buffers[index][sent:]
+
+
+# The maximum number of buffers that may be passed to a single call to
+# 'sendmsg' on this system.
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = -1
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
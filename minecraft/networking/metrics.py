@@ -0,0 +1,414 @@
+""" Metrics describing the activity of connections, which may be exported in
+    the Prometheus text exposition format.
+"""
+import threading
+from bisect import bisect_left
+from time import monotonic, perf_counter
+
+from .packets import clientbound, serverbound
+from .types import VarInt
+
+
+INCOMING, OUTGOING = 'incoming', 'outgoing'
+
+# The phases of the handling of incoming packets whose durations are measured.
+PHASES = ('decode', 'reactor', 'listeners')
+
+# The actions taken when a packet is added to a full outgoing queue.
+OVERFLOW_ACTIONS = ('dropped', 'coalesced', 'blocked')
+
+
+class Histogram(object):
+    """ Counts observed values in buckets with the given upper bounds (in
+        increasing order), as a Prometheus histogram does. Each value is
+        counted only in the first bucket whose bound is not less than it, or
+        in an implicit last bucket with no bound.
+    """
+
+    __slots__ = 'bounds', 'counts', 'sum', 'count'
+
+    # The default bounds, suitable for durations in seconds.
+    DEFAULT_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                      0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        """ Adds the counts of another histogram with the same bounds. """
+        if other.bounds != self.bounds:
+            raise ValueError('Histograms with different bounds: %r and %r.'
+                             % (self.bounds, other.bounds))
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative_counts(self):
+        """ Returns a list of pairs '(bound, count)' giving the number of
+            values not greater than each bound, ending with the bound
+            'float("inf")' and the total count.
+        """
+        result, total = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class ConnectionMetrics(object):
+    """ Counts the packets and bytes read and written by a connection, and
+        measures the time spent handling incoming packets.
+
+        A 'Connection' created with the 'metrics' argument records its
+        activity in an instance of this class, its 'metrics' attribute. The
+        attributes of the instance are:
+         - 'packets': a dict mapping '(direction, packet_class)' to the number
+           of packets of that class read (if 'direction' is 'INCOMING') or
+           written (if it is 'OUTGOING');
+         - 'bytes': a dict mapping '(direction, encoding)' to a number of
+           bytes, where 'encoding' is 'wire' for the size of each frame as
+           sent over the network (after compression, but excluding the length
+           prefix), or 'raw' for the size of the packet ID and fields before
+           compression;
+         - 'seconds': a dict mapping each of 'PHASES' to the total time spent
+           in it: decoding (including decompression) of incoming packets,
+           their handling by the connection's reactor, and the incoming
+           packet listeners;
+         - 'outgoing_queue_depth' and 'max_outgoing_queue_depth': the number
+           of packets waiting in the outgoing queue when it was last written
+           out, and the largest such number;
+         - 'keep_alive_seconds': a 'Histogram' of the times between receipt of
+           a keep-alive packet and the writing of the response, which is the
+           part of the round trip measured by the server that is due to the
+           client, including any time spent waiting in the outgoing queue;
+         - 'ping_seconds': a 'Histogram' of the round-trip times measured by
+           status queries made with 'Connection.status';
+         - 'offloaded_queue_depth' and 'max_offloaded_queue_depth': the number
+           of calls of offloaded listeners (see 'offload.ListenerExecutor')
+           waiting or running when one was last submitted, and the largest
+           such number;
+         - 'offload_wait_seconds': the total time spent waiting to submit
+           calls of offloaded listeners, because too many were pending;
+         - 'outgoing_overflow': a dict mapping each action taken when a packet
+           was added to the full outgoing queue (see 'outgoing.OutgoingQueue')
+           to the number of times it was taken: 'dropped' (an older packet
+           was discarded), 'coalesced' (an older packet was replaced) or
+           'blocked' (the caller waited for room);
+         - 'outgoing_wait_seconds': the total time spent waiting for room in
+           the outgoing queue;
+         - 'outgoing_coalesced': the number of packets replaced in the
+           outgoing queue by newer packets of the same class, because the
+           class is one of the connection's 'coalesce_packets'.
+
+        Recording these costs a few dict updates and calls to
+        'time.perf_counter' for each packet. The methods whose names begin
+        with 'record_' are called by the connection. Those which may be
+        called from other threads than its networking thread, by
+        'Connection.write_packet' or an offloaded listener, update the
+        metrics with a lock held: 'record_outgoing', 'record_offloaded',
+        'record_queue_overflow' and 'record_coalesced'. The others are only
+        called from the networking thread, and are not otherwise thread-safe.
+        It is safe to read or export the metrics from another thread at any
+        time.
+    """
+
+    def __init__(self):
+        self.packets = {}
+        self.bytes = {(d, e): 0 for d in (INCOMING, OUTGOING)
+                      for e in ('wire', 'raw')}
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.outgoing_queue_depth = 0
+        self.max_outgoing_queue_depth = 0
+        self.keep_alive_seconds = Histogram()
+        self.ping_seconds = Histogram()
+        self.offloaded_queue_depth = 0
+        self.max_offloaded_queue_depth = 0
+        self.offload_wait_seconds = 0.0
+        self.outgoing_overflow = {action: 0 for action in OVERFLOW_ACTIONS}
+        self.outgoing_wait_seconds = 0.0
+        self.outgoing_coalesced = 0
+        # The times at which the keep-alive packets not yet answered were
+        # received, by their IDs.
+        self._keep_alive_times = {}
+        # The time at which the phase currently being measured started.
+        self._lap_start = 0.0
+        # Held while updating the metrics recorded from several threads.
+        self._lock = threading.Lock()
+
+    def start_lap(self):
+        """ Begins measuring the duration of a phase, which is ended by
+            calling 'lap'.
+        """
+        self._lap_start = perf_counter()
+
+    def lap(self, phase):
+        """ Adds the time since the last call of 'start_lap' or 'lap' to the
+            given phase, and begins measuring the next phase.
+        """
+        now = perf_counter()
+        self.seconds[phase] += now - self._lap_start
+        self._lap_start = now
+
+    def record_incoming(self, packet, wire_size, raw_size):
+        """ Counts an incoming packet, having the given frame size on the
+            wire, and the given size when decompressed.
+        """
+        packet_class = type(packet)
+        key = INCOMING, packet_class
+        packets, bytes = self.packets, self.bytes
+        packets[key] = packets.get(key, 0) + 1
+        bytes[INCOMING, 'wire'] += wire_size
+        bytes[INCOMING, 'raw'] += raw_size
+        if packet_class is clientbound.play.KeepAlivePacket:
+            self._keep_alive_times[packet.keep_alive_id] = monotonic()
+
+    def record_outgoing(self, packet, frame, compression_enabled):
+        """ Counts an outgoing packet, given its complete serialised 'frame',
+            including its length prefix.
+        """
+        key = OUTGOING, type(packet)
+        wire_size, offset = VarInt.unpack_from(frame)
+        raw_size = wire_size
+        if compression_enabled:
+            data_length, data_offset = VarInt.unpack_from(frame, offset)
+            raw_size = data_length or wire_size - (data_offset - offset)
+        with self._lock:
+            self.packets[key] = self.packets.get(key, 0) + 1
+            self.bytes[OUTGOING, 'wire'] += wire_size
+            self.bytes[OUTGOING, 'raw'] += raw_size
+            if type(packet) is serverbound.play.KeepAlivePacket:
+                received = self._keep_alive_times.pop(
+                    packet.keep_alive_id, None)
+                if received is not None:
+                    self.keep_alive_seconds.observe(monotonic() - received)
+
+    def record_queue_depth(self, depth):
+        """ Records the number of packets in the outgoing queue, just before
+            they are written out.
+        """
+        self.outgoing_queue_depth = depth
+        if depth > self.max_outgoing_queue_depth:
+            self.max_outgoing_queue_depth = depth
+
+    def record_offloaded(self, depth, wait_seconds):
+        """ Records the submission of a call of an offloaded listener, after
+            which 'depth' calls were pending, having waited 'wait_seconds'.
+        """
+        with self._lock:
+            self.offloaded_queue_depth = depth
+            if depth > self.max_offloaded_queue_depth:
+                self.max_offloaded_queue_depth = depth
+            self.offload_wait_seconds += wait_seconds
+
+    def record_queue_overflow(self, action, wait_seconds=0.0):
+        """ Records one of the 'OVERFLOW_ACTIONS' taken when a packet was
+            added to the full outgoing queue, after waiting 'wait_seconds'.
+        """
+        with self._lock:
+            self.outgoing_overflow[action] += 1
+            self.outgoing_wait_seconds += wait_seconds
+
+    def record_coalesced(self):
+        """ Records the replacement of a packet in the outgoing queue by a
+            newer packet of the same class.
+        """
+        with self._lock:
+            self.outgoing_coalesced += 1
+
+    def merge(self, other):
+        """ Adds the metrics of another 'ConnectionMetrics' to these, except
+            for the queue depths, to which the other's depths are added, and
+            the maximum queue depths, which become the greater of the two.
+        """
+        for key, count in dict(other.packets).items():
+            self.packets[key] = self.packets.get(key, 0) + count
+        for key, count in dict(other.bytes).items():
+            self.bytes[key] += count
+        for phase, seconds in dict(other.seconds).items():
+            self.seconds[phase] += seconds
+        self.outgoing_queue_depth += other.outgoing_queue_depth
+        self.max_outgoing_queue_depth = max(
+            self.max_outgoing_queue_depth, other.max_outgoing_queue_depth)
+        self.keep_alive_seconds.merge(other.keep_alive_seconds)
+        self.ping_seconds.merge(other.ping_seconds)
+        self.offloaded_queue_depth += other.offloaded_queue_depth
+        self.max_offloaded_queue_depth = max(
+            self.max_offloaded_queue_depth, other.max_offloaded_queue_depth)
+        self.offload_wait_seconds += other.offload_wait_seconds
+        for action, count in dict(other.outgoing_overflow).items():
+            self.outgoing_overflow[action] += count
+        self.outgoing_wait_seconds += other.outgoing_wait_seconds
+        self.outgoing_coalesced += other.outgoing_coalesced
+
+    def to_prometheus(self, prefix='pycraft_', labels=None):
+        """ Returns these metrics in the Prometheus text exposition format, as
+            a string. Each metric's name begins with 'prefix', and has the
+            given 'labels', a dict mapping label names to values, in addition
+            to its own.
+        """
+        return ''.join(_prometheus_lines(prefix, [(labels or {}, self)]))
+
+
+class MetricsRegistry(object):
+    """ A collection of the metrics of several connections, which may be
+        exported together, either as totals or for each connection:
+
+            registry = MetricsRegistry()
+            connection = Connection(address, username=name, metrics=registry)
+            ...
+            text = registry.to_prometheus()
+
+        When a connection is no longer in use, its metrics may be removed
+        using 'remove', after which they are still included in the totals, so
+        that counters never decrease.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._removed = ConnectionMetrics()
+
+    def add(self, metrics, name):
+        """ Adds a 'ConnectionMetrics' with the given name, which is used as
+            the value of the 'connection' label when exporting the metrics of
+            each connection separately. Returns 'metrics'.
+        """
+        with self._lock:
+            self._metrics[metrics] = name
+        return metrics
+
+    def remove(self, metrics):
+        with self._lock:
+            del self._metrics[metrics]
+            metrics.outgoing_queue_depth = 0
+            metrics.offloaded_queue_depth = 0
+            self._removed.merge(metrics)
+
+    def total(self):
+        """ Returns a new 'ConnectionMetrics' holding the totals of the
+            metrics of all connections, including those removed.
+        """
+        total = ConnectionMetrics()
+        with self._lock:
+            total.merge(self._removed)
+            for metrics in self._metrics:
+                total.merge(metrics)
+        return total
+
+    def to_prometheus(self, prefix='pycraft_', per_connection=False):
+        """ Returns the metrics in the Prometheus text exposition format: if
+            'per_connection' is True, those of each connection separately,
+            with a 'connection' label; otherwise, only their totals.
+        """
+        if not per_connection:
+            return self.total().to_prometheus(prefix)
+        with self._lock:
+            samples = [({'connection': name}, metrics)
+                       for metrics, name in self._metrics.items()]
+        return ''.join(_prometheus_lines(prefix, samples))
+
+
+def _prometheus_lines(prefix, samples):
+    # Generate the lines of the Prometheus text format describing each of the
+    # 'ConnectionMetrics' in 'samples', a list of pairs '(labels, metrics)'.
+    def metric(name, kind, description, values):
+        yield '# HELP %s%s %s\n' % (prefix, name, description)
+        yield '# TYPE %s%s %s\n' % (prefix, name, kind)
+        for labels, metrics in samples:
+            for suffix, extra_labels, value in values(metrics):
+                yield '%s%s%s%s %s\n' % (
+                    prefix, name, suffix,
+                    _format_labels(dict(labels, **extra_labels)),
+                    _format_value(value))
+
+    def histogram(attribute):
+        def values(metrics):
+            histogram = getattr(metrics, attribute)
+            for bound, count in histogram.cumulative_counts():
+                yield '_bucket', {'le': _format_value(bound)}, count
+            yield '_sum', {}, histogram.sum
+            yield '_count', {}, histogram.count
+        return values
+
+    yield from metric(
+        'packets_total', 'counter',
+        'Packets read or written, by direction and packet class.',
+        lambda m: (('', {'direction': d, 'packet': name}, n)
+                   for d, name, n in sorted(
+                       (d, c.__name__, n)
+                       for (d, c), n in dict(m.packets).items())))
+    yield from metric(
+        'bytes_total', 'counter',
+        'Bytes read or written, by direction, on the wire or uncompressed.',
+        lambda m: (('', {'direction': d, 'encoding': e}, n)
+                   for (d, e), n in sorted(dict(m.bytes).items())))
+    yield from metric(
+        'handling_seconds_total', 'counter',
+        'Time spent handling incoming packets, by phase.',
+        lambda m: (('', {'phase': p}, m.seconds[p]) for p in PHASES))
+    yield from metric(
+        'outgoing_queue_depth', 'gauge',
+        'Packets waiting in the outgoing queue when it was last written.',
+        lambda m: [('', {}, m.outgoing_queue_depth)])
+    yield from metric(
+        'max_outgoing_queue_depth', 'gauge',
+        'The greatest number of packets seen in the outgoing queue.',
+        lambda m: [('', {}, m.max_outgoing_queue_depth)])
+    yield from metric(
+        'keep_alive_seconds', 'histogram',
+        'Time from receiving a keep-alive packet to writing the response.',
+        histogram('keep_alive_seconds'))
+    yield from metric(
+        'ping_seconds', 'histogram',
+        'Round-trip times measured by status queries.',
+        histogram('ping_seconds'))
+    yield from metric(
+        'offloaded_queue_depth', 'gauge',
+        'Calls of offloaded listeners pending when one was last submitted.',
+        lambda m: [('', {}, m.offloaded_queue_depth)])
+    yield from metric(
+        'max_offloaded_queue_depth', 'gauge',
+        'The greatest number of calls of offloaded listeners pending.',
+        lambda m: [('', {}, m.max_offloaded_queue_depth)])
+    yield from metric(
+        'offload_wait_seconds_total', 'counter',
+        'Time spent waiting to submit calls of offloaded listeners.',
+        lambda m: [('', {}, m.offload_wait_seconds)])
+    yield from metric(
+        'outgoing_overflow_total', 'counter',
+        'Packets added to the full outgoing queue, by the action taken.',
+        lambda m: (('', {'action': a}, m.outgoing_overflow[a])
+                   for a in OVERFLOW_ACTIONS))
+    yield from metric(
+        'outgoing_wait_seconds_total', 'counter',
+        'Time spent waiting for room in the outgoing queue.',
+        lambda m: [('', {}, m.outgoing_wait_seconds)])
+    yield from metric(
+        'outgoing_coalesced_total', 'counter',
+        'Packets replaced in the outgoing queue by newer ones of the same '
+        'class.',
+        lambda m: [('', {}, m.outgoing_coalesced)])
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in sorted(labels.items()))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,313 @@
+""" Running many connections from a single thread, using one selector.
+"""
+import selectors
+import sys
+import threading
+
+from .connection import _NetworkingLoop, _Wakeup
+
+
+class Multiplexer(object):
+    """ Runs the networking loops of many 'Connection' objects in the thread
+        calling 'run', using a single selector to wait for incoming data,
+        rather than running each connection in its own 'NetworkingThread'.
+
+        A connection must be added to the multiplexer before it is connected:
+
+            multiplexer = Multiplexer()
+            for username in usernames:
+                connection = Connection(address, port, username=username)
+                multiplexer.add(connection)
+                connection.connect()
+            multiplexer.run()
+
+        Each connection behaves as it would with its own 'NetworkingThread':
+        its packets are written and read in the same way, and its reactor,
+        packet listeners, exception handlers and 'handle_exit' function are
+        called in the same circumstances, but from the thread running the
+        multiplexer. Reconnecting (for example, from a packet listener) runs
+        the new session on the same multiplexer.
+
+        If an exception would be re-raised from a connection's networking
+        thread (see the 'handle_exception' argument of 'Connection'), it is
+        instead passed to 'sys.excepthook', and does not affect the other
+        connections.
+
+        The connections' sockets are non-blocking, so that a peer which is
+        slow to receive data does not delay the other connections. Data which
+        cannot be written immediately is buffered, and written when the
+        selector reports that the socket is writable; meanwhile, no further
+        packets are taken from that connection's outgoing queue, so that any
+        limit on the size of the queue still applies.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        # Sessions which have been started but are waiting for the previous
+        # session of the same connection to terminate.
+        self._new_sessions = []
+        self._new_sessions_lock = threading.Lock()
+        self._sessions = set()
+        self._stopping = False
+        # Woken when a connection has packets to write, or must be started or
+        # stopped, so that 'run_once' need not wait for its timeout.
+        self._wakeup = _Wakeup()
+        self._selector.register(self._wakeup, selectors.EVENT_READ, None)
+
+    def add(self, connection):
+        """ Causes the given connection, which must not currently be
+            connected, to be run by this multiplexer whenever it connects.
+        """
+        connection.multiplexer = self
+        connection._wakeup = self._wakeup
+
+    def run(self, timeout=None):
+        """ Runs the added connections until 'stop' is called, or until none
+            of them remain connected. 'timeout' is as for 'run_once'; since the
+            multiplexer is woken whenever a connection has packets to write,
+            disconnects, or is connected, it is only needed if something
+            else must be checked periodically.
+        """
+        self._stopping = False
+        while not self._stopping and self.num_sessions:
+            self.run_once(timeout)
+
+    @property
+    def num_sessions(self):
+        """ The number of connections which are connected, or are waiting to
+            be run after connecting.
+        """
+        return len(self._sessions) + len(self._new_sessions)
+
+    def stop(self):
+        """ Causes 'run' to return after its current iteration. This may be
+            called from any thread.
+        """
+        self._stopping = True
+        self._wakeup.set()
+
+    def run_once(self, timeout=0.05):
+        """ Writes as many as 300 of the packets waiting to be written by each
+            connection, then waits for up to 'timeout' seconds (or not at all,
+            if any connection has packets waiting to be written or read) for
+            incoming data, and reads and reacts to the packets received by
+            each connection, up to a total of 50 packets written or read.
+
+            The wait ends early if a connection queues a packet to be written,
+            disconnects or connects, or if 'stop' is called. If 'timeout' is
+            None, there is no other limit to the wait.
+        """
+        self._wakeup.clear()
+        self._start_sessions()
+
+        steps = {}
+        for session in list(self._sessions):
+            result = self._call(session, session._write_step)
+            if result is not False:
+                steps[session] = result
+
+        for session in steps:
+            self._update_events(session)
+
+        busy = any(session.connection._outgoing_packet_queue and
+                   not session.writer.buffer or
+                   session.saturated for session in steps)
+        for key, events in self._selector.select(0 if busy else timeout):
+            session = key.data
+            if session not in steps or session.interrupt:
+                continue
+            if events & selectors.EVENT_WRITE:
+                num_packets, exc_info = steps[session]
+                if exc_info is None:
+                    steps[session] = num_packets, session._flush_step()
+                self._update_events(session)
+            if events & selectors.EVENT_READ:
+                connection = session.connection
+                if self._call(session, connection.frame_reader.receive,
+                              connection.file_object) is False:
+                    del steps[session]
+
+        for session, (num_packets, exc_info) in steps.items():
+            num_packets = self._call(
+                session, session._read_step, num_packets, exc_info)
+            session.saturated = num_packets is not None and num_packets >= 50
+
+        for session in list(self._sessions):
+            if session.interrupt:
+                self._finish_session(session)
+
+    def _update_events(self, session):
+        # Wait for the session's socket to become writable only while it has
+        # buffered data to write.
+        events = selectors.EVENT_READ
+        if session.writer.buffer:
+            events |= selectors.EVENT_WRITE
+        if events != session.events and not session.interrupt:
+            try:
+                self._selector.modify(session.socket, events, session)
+            except (KeyError, ValueError):
+                # The socket has been closed by 'disconnect'.
+                return
+            session.events = events
+
+    def _call(self, session, function, *args):
+        # Call 'function' with the given arguments, and return its result. If
+        # an exception occurs, handle it as a 'NetworkingThread' would, and
+        # return False.
+        try:
+            return function(*args)
+        except Exception as e:
+            session.interrupt = True
+            session.failed = True
+            try:
+                session.connection._handle_exception(e, sys.exc_info())
+            except Exception:
+                sys.excepthook(*sys.exc_info())
+            return False
+
+    def _start_session(self, connection):
+        # Called by 'connection' when it connects.
+        session = MultiplexedSession(
+            connection, previous=connection.networking_thread)
+        if connection.networking_thread is None:
+            connection.networking_thread = session
+        else:
+            connection.new_networking_thread = session
+        with self._new_sessions_lock:
+            self._new_sessions.append(session)
+        self._wakeup.set()
+
+    def _start_sessions(self):
+        # Start running each new session whose previous session, if any, has
+        # terminated.
+        with self._new_sessions_lock:
+            sessions = [s for s in self._new_sessions
+                        if s.previous_thread not in self._sessions]
+            for session in sessions:
+                self._new_sessions.remove(session)
+
+        for session in sessions:
+            connection = session.connection
+            if session.previous_thread is not None:
+                with connection._write_lock:
+                    connection.networking_thread = session
+                    connection.new_networking_thread = None
+            try:
+                self._selector.register(
+                    session.socket, selectors.EVENT_READ, session)
+            except KeyError:
+                # The socket's file descriptor was reused after it was closed
+                # by a disconnected session which has not yet terminated.
+                stale_key = self._selector.get_key(session.socket.fileno())
+                self._finish_session(stale_key.data)
+                self._selector.register(
+                    session.socket, selectors.EVENT_READ, session)
+            self._sessions.add(session)
+
+    def _finish_session(self, session):
+        # Stop running the given session, which has been interrupted.
+        self._sessions.discard(session)
+        try:
+            self._selector.unregister(session.socket)
+        except (KeyError, ValueError):
+            pass
+
+        connection = session.connection
+        if not session.failed:
+            self._call(session, connection._handle_exit)
+        with connection._write_lock:
+            connection.networking_thread = None
+
+
+class MultiplexedSession(_NetworkingLoop):
+    """ The counterpart of 'NetworkingThread' for a connection run by a
+        'Multiplexer'.
+    """
+    def __init__(self, connection, previous=None):
+        super(MultiplexedSession, self).__init__(
+            connection, self._read_packet, previous)
+        # The connection's socket, before it is wrapped by any encryption.
+        self.socket = connection.socket
+        # The connection writes through this instead, so that writing never
+        # blocks. The caller holds the connection's write lock.
+        self.writer = connection.socket = _BufferedSocket(self.socket)
+        # The events for which the socket is registered with the selector.
+        self.events = selectors.EVENT_READ
+        self.failed = False
+        # Whether a complete packet may already have been received.
+        self.saturated = False
+
+    def _write_step(self):
+        # Leave the packets in the queue until any data already written has
+        # been sent.
+        if self.writer.buffer:
+            return 0, None
+        return super(MultiplexedSession, self)._write_step()
+
+    def _flush_step(self):
+        # Send as much buffered data as possible, and return the 'exc_info' of
+        # any IOError that occurred, as '_write_step' does.
+        with self.connection._write_lock:
+            try:
+                self.writer.flush()
+            except IOError:
+                return sys.exc_info()
+        return None
+
+    def _read_packet(self, timeout):
+        # Only data already received by the multiplexer is read.
+        frame = self.connection.frame_reader.next_frame()
+        if frame is None:
+            return None
+        return self.connection.reactor.parse_packet(frame)
+
+
+class _BufferedSocket(object):
+    # Provides the methods of a socket used to write packets, writing to a
+    # non-blocking socket (possibly through an 'EncryptedSocketWrapper').
+    # Data which cannot be sent immediately is kept in 'buffer', to be sent
+    # by 'flush' once the socket is writable. This has no 'sendmsg' method,
+    # so 'framing.send_frames' writes each batch with a single 'sendall'.
+    __slots__ = 'actual_socket', 'buffer'
+
+    def __init__(self, socket):
+        self.actual_socket = socket
+        self.buffer = bytearray()
+        socket.setblocking(False)
+
+    def sendall(self, data):
+        if self.buffer:
+            self.buffer += data
+            return
+        sent = self._send(data)
+        if sent < len(data):
+            self.buffer += memoryview(data)[sent:]
+
+    send = sendall
+
+    def flush(self):
+        if self.buffer:
+            del self.buffer[:self._send(self.buffer)]
+
+    def _send(self, data):
+        try:
+            return self.actual_socket.send(data)
+        except (BlockingIOError, InterruptedError):
+            return 0
+
+    def fileno(self):
+        return self.actual_socket.fileno()
+
+    def shutdown(self, *args, **kwds):
+        # Called by 'Connection.disconnect': send the remaining data first,
+        # blocking if necessary, as a blocking socket would have.
+        if self.buffer:
+            self.actual_socket.setblocking(True)
+            try:
+                self.actual_socket.sendall(self.buffer)
+            finally:
+                del self.buffer[:]
+        return self.actual_socket.shutdown(*args, **kwds)
+
+    def close(self):
+        return self.actual_socket.close()
@@ -0,0 +1,169 @@
+""" Running packet listeners in a pool of worker threads, rather than in the
+    thread which reads and writes a connection's packets.
+"""
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from ..exceptions import IgnorePacket
+from .tracing import listener_name
+
+
+# The 'worker' attribute of this is True in the worker thread of any
+# 'ListenerExecutor'.
+_local = threading.local()
+
+
+def in_worker_thread():
+    """ Returns True if called from a worker thread of a 'ListenerExecutor',
+        that is, from an offloaded packet listener.
+    """
+    return getattr(_local, 'worker', False)
+
+
+class ListenerExecutor(object):
+    """ Runs the offloaded packet listeners of one or more connections (those
+        registered with 'offload=True') in a pool of at most 'max_workers'
+        threads, which may be shared by many connections:
+
+            executor = ListenerExecutor(max_workers=4)
+            connection = Connection(address, username=name,
+                                    listener_executor=executor)
+            connection.register_packet_listener(
+                save_chat, clientbound.play.ChatMessagePacket, offload=True)
+
+        The offloaded listeners of each connection are called one at a time,
+        in the order in which the packets were read or written, so a
+        connection's listeners never run concurrently with each other; those
+        of different connections may.
+
+        At most 'max_pending' calls may be waiting or running at once. When
+        this many are pending, a connection offloading another call waits for
+        one to finish, which slows the reading of further packets, rather
+        than letting the backlog grow without bound. This waiting is recorded
+        in the connection's metrics, if any, as is the number of its calls
+        pending. Calls offloaded from the worker threads themselves (by a
+        listener writing packets, for example) never wait, so as not to
+        deadlock the pool, nor do those offloaded with the connection's write
+        lock held, which the networking thread may be waiting for.
+    """
+
+    # The number of calls made for one connection before its worker thread
+    # is yielded to those of other connections.
+    BATCH_SIZE = 64
+
+    def __init__(self, max_workers=None, max_pending=1024):
+        if max_pending < 1:
+            raise ValueError('max_pending must be positive: %r.'
+                             % max_pending)
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._condition = threading.Condition()
+        # The calls waiting for each connection, which are present only while
+        # a worker thread is scheduled to make them.
+        self._queues = {}
+
+    def submit(self, connection, callback, packet, outgoing=False,
+               may_wait=True):
+        """ Schedules 'callback(packet)' to be called, after any calls already
+            submitted for the same connection. Returns the number of seconds
+            spent waiting for another call to finish, which is never done if
+            'may_wait' is False.
+        """
+        waited = 0.0
+        with self._condition:
+            if self.pending >= self.max_pending and may_wait and \
+                    not in_worker_thread():
+                start = perf_counter()
+                while self.pending >= self.max_pending:
+                    self._condition.wait()
+                waited = perf_counter() - start
+            self.pending += 1
+            queue = self._queues.get(connection)
+            schedule = queue is None
+            if schedule:
+                queue = self._queues[connection] = deque()
+            queue.append((callback, packet, outgoing))
+            depth = len(queue)
+        if schedule:
+            self._executor.submit(self._run, connection, queue)
+
+        metrics = connection.metrics
+        if metrics is not None:
+            metrics.record_offloaded(depth, waited)
+        return waited
+
+    def join(self, timeout=None):
+        """ Waits until no calls are pending, or until 'timeout' seconds have
+            passed. Returns True if no calls are pending.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self.pending, timeout)
+
+    def shutdown(self, wait=True):
+        """ Stops the worker threads once all pending calls have been made.
+            No further calls may be submitted.
+        """
+        self._executor.shutdown(wait)
+
+    def _run(self, connection, queue):
+        # Make as many as 'BATCH_SIZE' of the calls in the given connection's
+        # queue, then schedule the remainder, if any.
+        _local.worker = True
+        try:
+            for _ in range(self.BATCH_SIZE):
+                with self._condition:
+                    if not queue:
+                        del self._queues[connection]
+                        return
+                    callback, packet, outgoing = queue.popleft()
+                try:
+                    self._call(connection, callback, packet, outgoing)
+                finally:
+                    with self._condition:
+                        self.pending -= 1
+                        self._condition.notify_all()
+            self._executor.submit(self._run, connection, queue)
+        finally:
+            _local.worker = False
+
+    @staticmethod
+    def _call(connection, callback, packet, outgoing):
+        tracer = connection.tracer
+        if tracer is not None:
+            token = tracer.begin(
+                'listener', packet=type(packet).__name__,
+                listener=listener_name(callback), outgoing=outgoing,
+                offloaded=True)
+        try:
+            callback(packet)
+        except IgnorePacket:
+            pass
+        except Exception:
+            connection._offloaded_exception(sys.exc_info())
+        finally:
+            if tracer is not None:
+                tracer.end(token)
+
+
+class OffloadedListener(object):
+    """ The callback of a listener registered with 'offload=True', which
+        passes each packet to the connection's 'ListenerExecutor'.
+    """
+    def __init__(self, connection, callback, outgoing=False):
+        self.connection = connection
+        self.callback = callback
+        self.outgoing = outgoing
+        self.__qualname__ = listener_name(callback)
+
+    def __call__(self, packet):
+        # Outgoing packets are dispatched with the write lock held, so must
+        # not wait for the executor.
+        connection = self.connection
+        connection.listener_executor.submit(
+            connection, self.callback, packet, self.outgoing,
+            may_wait=not connection._write_lock.held())
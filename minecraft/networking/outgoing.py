@@ -0,0 +1,178 @@
+""" The queue of packets waiting to be written by a connection's networking
+    thread.
+"""
+import threading
+from collections import deque
+from time import perf_counter
+
+from .packets import serverbound
+
+
+# The serverbound packets describing the player's movement, of which only the
+# latest of each class is usually needed: a suitable value for the
+# 'coalesce' argument of 'OutgoingQueue'.
+MOVEMENT_PACKETS = frozenset((
+    serverbound.play.PlayerPositionPacket,
+    serverbound.play.PositionAndLookPacket,
+    serverbound.play.VehicleMovePacket,
+))
+
+# The policies of an 'OutgoingQueue' for packets added when it is full.
+BLOCK, DROP_OLDEST, COALESCE = 'block', 'drop_oldest', 'coalesce'
+POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+class OutgoingQueue(object):
+    """ A queue of packets waiting to be written, holding at most 'max_size'
+        packets (or any number, if 'max_size' is None) in its normal lane,
+        and any number in a separate high-priority lane, whose packets are
+        always removed first. The priority lane is meant for the few packets
+        which must not wait behind others, such as keep-alive responses.
+
+        When a packet is added to the normal lane while it is full, 'policy'
+        determines what happens:
+         - 'BLOCK': the caller waits until there is room, or until the queue
+           is closed;
+         - 'DROP_OLDEST': the oldest packet in the lane is discarded;
+         - 'COALESCE': the most recently added packet of the same class is
+           replaced by the new packet, keeping its place in the queue, or,
+           if there is none, the caller waits as for 'BLOCK'.
+        A caller which may not wait (see 'put') instead adds the packet even
+        though the lane is full.
+
+        Independently of the policy, a packet whose class is in 'coalesce'
+        replaces any packet of the same class waiting in the normal lane,
+        keeping its place in the queue, so that at most one packet of each
+        such class is ever waiting. This suits packets of which only the
+        latest matters, such as 'MOVEMENT_PACKETS'. Since the packets are
+        keyed by their exact class, a packet may be written after a newer one
+        of a different class: for example, a 'PositionAndLookPacket' may
+        replace one queued before a 'PlayerPositionPacket', and so be written
+        before it.
+
+        Discarded, replaced and waited-for packets are counted in 'metrics',
+        a 'metrics.ConnectionMetrics', if it is not None.
+
+        Packets may be added from any thread, and removed by one thread.
+    """
+
+    def __init__(self, max_size=None, policy=BLOCK, metrics=None,
+                 coalesce=()):
+        if policy not in POLICIES:
+            raise ValueError('Unknown outgoing queue policy: %r.' % policy)
+        if max_size is not None and max_size < 1:
+            raise ValueError('max_size must be positive: %r.' % max_size)
+        self.max_size = max_size
+        self.policy = policy
+        self.metrics = metrics
+        self.coalesce = frozenset(coalesce)
+        self.closed = False
+        self._normal = deque()
+        self._priority = deque()
+        # The '_Slot' in the normal lane holding the packet of each class in
+        # 'coalesce' that is waiting, if any.
+        self._slots = {}
+        self._condition = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self._normal) + len(self._priority)
+
+    def __bool__(self):
+        return bool(self._normal) or bool(self._priority)
+
+    def put(self, packet, priority=False, may_wait=True):
+        """ Adds a packet to the end of the normal or priority lane. If
+            'may_wait' is False, this never waits for room in the queue.
+        """
+        with self._condition:
+            if priority:
+                self._priority.append(packet)
+                return
+            packet_class, item = type(packet), packet
+            if packet_class in self.coalesce:
+                slot = self._slots.get(packet_class)
+                if slot is not None:
+                    slot.packet = packet
+                    if self.metrics is not None:
+                        self.metrics.record_coalesced()
+                    return
+                item = self._slots[packet_class] = _Slot(packet)
+
+            normal = self._normal
+            if self.max_size is None or len(normal) < self.max_size or \
+                    self.closed:
+                normal.append(item)
+                return
+
+            if self.policy == DROP_OLDEST:
+                self._unwrap(normal.popleft())
+                normal.append(item)
+                self._record_overflow('dropped')
+                return
+            if self.policy == COALESCE:
+                # Packets of the classes in 'coalesce' are held in slots, so
+                # are not matched here; but they only reach here if none of
+                # the same class is waiting.
+                for index in range(len(normal) - 1, -1, -1):
+                    if type(normal[index]) is packet_class:
+                        normal[index] = packet
+                        self._record_overflow('coalesced')
+                        return
+            if may_wait:
+                start = perf_counter()
+                while len(normal) >= self.max_size and not self.closed:
+                    self._condition.wait()
+                self._record_overflow('blocked', perf_counter() - start)
+            normal.append(item)
+
+    def popleft(self):
+        """ Removes and returns the first packet, or raises IndexError if the
+            queue is empty.
+        """
+        with self._condition:
+            if self._priority:
+                return self._priority.popleft()
+            packet = self._unwrap(self._normal.popleft())
+            self._condition.notify()
+            return packet
+
+    def pop_batch(self, max_packets):
+        """ Removes and returns a list of up to 'max_packets' packets from the
+            start of the queue.
+        """
+        with self._condition:
+            batch, priority, normal = [], self._priority, self._normal
+            while priority and len(batch) < max_packets:
+                batch.append(priority.popleft())
+            while normal and len(batch) < max_packets:
+                batch.append(self._unwrap(normal.popleft()))
+            self._condition.notify_all()
+            return batch
+
+    def close(self):
+        """ Causes any callers waiting in 'put', and any future callers, to
+            add their packets without waiting.
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def _unwrap(self, item):
+        # Return the packet held by an item removed from the normal lane.
+        if type(item) is not _Slot:
+            return item
+        del self._slots[type(item.packet)]
+        return item.packet
+
+    def _record_overflow(self, action, wait_seconds=0.0):
+        if self.metrics is not None:
+            self.metrics.record_queue_overflow(action, wait_seconds)
+
+
+class _Slot(object):
+    # The place in the normal lane of an 'OutgoingQueue' of a packet which is
+    # replaced if another of the same class is added.
+    __slots__ = 'packet',
+
+    def __init__(self, packet):
+        self.packet = packet
@@ -1,5 +1,6 @@
 from .packet import Packet
-from .packet_buffer import PacketBuffer
+from .packet_buffer import PacketBuffer, PacketView
+from .packet_codec import PacketCodec
 from .packet_listener import PacketListener
 from .plugin_message_packet import AbstractPluginMessagePacket
 from .keep_alive_packet import AbstractKeepAlivePacket, KeepAlivePacket
@@ -1,3 +1,8 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from minecraft.networking.packets import Packet
 from minecraft.networking.types import (
     Type, VarInt, VarLong, UnsignedLong, Integer, UnsignedByte, Position,
@@ -141,17 +146,101 @@ class MultiBlockChangePacket(Packet):
                 UnsignedByte.send(record.y, socket)
                 VarInt.send(record.block_state_id, socket)
 
+    # The NumPy dtype of the structured arrays into which the records are
+    # decoded if the context's 'numpy_arrays' is set; None if NumPy is not
+    # installed.
+    record_dtype = None if numpy is None else numpy.dtype([
+        ('x', 'u1'), ('y', 'u1'), ('z', 'u1'), ('block_state_id', 'i8')])
+
+    class RecordArray(PrefixedArray):
+        """ The type of the 'records' field: a 'PrefixedArray' of 'Record's,
+            except that, if the context's 'numpy_arrays' is set and NumPy is
+            installed, it is read as a NumPy structured array with the dtype
+            'MultiBlockChangePacket.record_dtype', which is decoded without
+            creating a Python object for each record. Such an array may also
+            be written.
+        """
+        __slots__ = ()
+
+        def __init__(self):
+            super(MultiBlockChangePacket.RecordArray, self).__init__(
+                VarInt, MultiBlockChangePacket.Record)
+
+        def read_with_context(self, file_object, context):
+            if numpy is None or not context.numpy_arrays:
+                return super(MultiBlockChangePacket.RecordArray, self) \
+                    .read_with_context(file_object, context)
+
+            count = VarInt.read(file_object)
+            records = numpy.empty(
+                count, dtype=MultiBlockChangePacket.record_dtype)
+            if context.protocol_later_eq(741):
+                view = getattr(file_object, 'view', None)
+                if view is None:
+                    values = numpy.array(VarLong.read_many(
+                        file_object, count), dtype=numpy.uint64)
+                else:
+                    values, file_object.offset = _unpack_varlongs(
+                        view, count, file_object.offset)
+                records['block_state_id'] = values >> 12
+                records['x'] = (values >> 8) & 0xF
+                records['z'] = (values >> 4) & 0xF
+                records['y'] = values & 0xF
+            else:
+                for i in range(count):
+                    h_position = UnsignedByte.read(file_object)
+                    y = UnsignedByte.read(file_object)
+                    records[i] = (h_position >> 4, y, h_position & 0xF,
+                                  VarInt.read(file_object))
+            return records
+
+        def send_with_context(self, value, socket, context):
+            if numpy is not None and isinstance(value, numpy.ndarray):
+                value = [MultiBlockChangePacket.Record(
+                             x=int(x), y=int(y), z=int(z),
+                             block_state_id=int(block_state_id))
+                         for x, y, z, block_state_id in value.tolist()]
+            super(MultiBlockChangePacket.RecordArray, self) \
+                .send_with_context(value, socket, context)
+
     get_definition = staticmethod(lambda context: [
         {'chunk_section_pos': MultiBlockChangePacket.ChunkSectionPos},
         {'invert_trust_edges': Boolean}
         if context.protocol_later_eq(748) else {},  # Provisional field name.
-        {'records': PrefixedArray(VarInt, MultiBlockChangePacket.Record)},
+        {'records': MultiBlockChangePacket.RecordArray()},
     ] if context.protocol_later_eq(741) else [
         {'chunk_x': Integer},
         {'chunk_z': Integer},
-        {'records': PrefixedArray(VarInt, MultiBlockChangePacket.Record)},
+        {'records': MultiBlockChangePacket.RecordArray()},
     ])
 
     # Access the 'chunk_x' and 'chunk_z' fields as a tuple.
     # Only used prior to protocol 741.
     chunk_pos = multi_attribute_alias(tuple, 'chunk_x', 'chunk_z')
+
+
+def _unpack_varlongs(buffer, count, offset):
+    # Decode 'count' consecutive VarLongs from 'buffer', starting at index
+    # 'offset', as 'VarLong.unpack_many_from' does, but returning the values
+    # in a NumPy array of unsigned 64-bit integers.
+    if count == 0:
+        return numpy.zeros(0, dtype=numpy.uint64), offset
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8, offset=offset)
+
+    # The index of the last byte of each value.
+    ends = numpy.flatnonzero(data < 0x80)[:count]
+    if len(ends) < count:
+        raise EOFError("Unexpected end of message.")
+    data = data[:ends[-1] + 1]
+    starts = numpy.empty(count, dtype=numpy.intp)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    if lengths.max() > VarLong.max_bytes:
+        raise ValueError("Tried to read too long of a VarInt")
+
+    # Shift the 7 bits held by each byte into place, and combine them.
+    shifts = 7 * (numpy.arange(len(data)) - numpy.repeat(starts, lengths))
+    groups = (data & 0x7F).astype(numpy.uint64) << shifts.astype(numpy.uint64)
+    values = numpy.bitwise_or.reduceat(groups, starts)
+    return values, offset + len(data)
@@ -24,8 +24,8 @@ class DestroyEntitiesPacket(Packet):
     fields = 'entity_ids',
 
     def read(self, file_object):
-        self.entity_ids = [VarInt.read(file_object)
-                           for i in range(VarInt.read(file_object))]
+        self.entity_ids = VarInt.read_many(
+            file_object, VarInt.read(file_object))
 
     def write_fields(self, packet_buffer):
         count = len(self.entity_ids)
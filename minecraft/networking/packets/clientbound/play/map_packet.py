@@ -1,3 +1,8 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from minecraft import PRE
 from minecraft.networking.packets import Packet
 from minecraft.networking.types import (
@@ -46,6 +51,11 @@ class MapPacket(Packet):
             self.display_name = display_name
 
     class Map(MutableRecord):
+        """ The state of a map, as updated by 'MapPacket.apply_to_map'.
+            'pixels' is a 'bytearray' holding the colour of each pixel in
+            row-major order, so that the pixel at '(x, z)' has the index
+            'x + width * z'.
+        """
         __slots__ = ('id', 'scale', 'icons', 'pixels', 'width', 'height',
                      'is_tracking_position', 'is_locked')
 
@@ -55,10 +65,29 @@ class MapPacket(Packet):
             self.icons = []
             self.width = width
             self.height = height
-            self.pixels = bytearray(0 for i in range(width*height))
+            self.pixels = bytearray(width * height)
             self.is_tracking_position = True
             self.is_locked = False
 
+        def export(self):
+            """ Returns a 2-dimensional 'memoryview' of 'pixels', with the
+                shape '(height, width)', which shares its memory rather than
+                copying it (and is read-only, in Python 3.8 and later). This
+                may be passed to image libraries supporting the buffer
+                protocol, for example:
+
+                    PIL.Image.frombuffer('P', (map.width, map.height),
+                                         map.export(), 'raw', 'P', 0, 1)
+
+                While the view exists, 'pixels' cannot be resized; the view
+                should be released (using its 'release' method, or a 'with'
+                statement) when it is no longer needed.
+            """
+            view = memoryview(self.pixels)
+            if hasattr(view, 'toreadonly'):  # Python 3.8 and later.
+                view = view.toreadonly()
+            return view.cast('B', (self.height, self.width))
+
     class MapSet(object):
         __slots__ = 'maps_by_id'
 
@@ -121,14 +150,37 @@ class MapPacket(Packet):
         map.id = self.map_id
         map.scale = self.scale
         map.icons[:] = self.icons
-        if self.pixels is not None:
-            for i in range(len(self.pixels)):
-                x = self.offset[0] + i % self.width
-                z = self.offset[1] + i // self.width
-                map.pixels[x + map.width * z] = self.pixels[i]
+        if self.pixels is not None and not self._apply_pixels_numpy(map):
+            # Each row of the patch is contiguous in 'map.pixels'.
+            x, z = self.offset
+            with memoryview(self.pixels) as pixels:
+                for start in range(0, len(pixels), self.width):
+                    row = pixels[start:start + self.width]
+                    index = x + map.width * (z + start // self.width)
+                    if index + len(row) > len(map.pixels):
+                        raise IndexError('The patch lies outside of the map.')
+                    map.pixels[index:index + len(row)] = row
         map.is_tracking_position = self.is_tracking_position
         map.is_locked = self.is_locked
 
+    def _apply_pixels_numpy(self, map):
+        # Copy the patch of pixels into 'map' with a single 2-D slice
+        # assignment, and return True; or return False if NumPy is not
+        # installed or the patch does not lie within the map.
+        if numpy is None or not self.width:
+            return False
+        height, remainder = divmod(len(self.pixels), self.width)
+        x, z = self.offset
+        if remainder or x + self.width > map.width or \
+                z + height > map.height or \
+                len(map.pixels) != map.width * map.height:
+            return False
+        target = numpy.frombuffer(map.pixels, dtype=numpy.uint8)
+        target = target.reshape(map.height, map.width)
+        target[z:z + height, x:x + self.width] = numpy.frombuffer(
+            self.pixels, dtype=numpy.uint8).reshape(height, self.width)
+        return True
+
     def apply_to_map_set(self, map_set):
         map = map_set.maps_by_id.get(self.map_id)
         if map is None:
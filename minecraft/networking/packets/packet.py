@@ -1,6 +1,8 @@
-from zlib import compress
+from zlib import compress, Z_DEFAULT_COMPRESSION
 
-from .packet_buffer import PacketBuffer
+from .packet_buffer import PacketBuffer, PacketView
+from .packet_codec import PacketCodec
+from .packet_registry import get_packet_id
 from minecraft.networking.types import (
     VarInt, Enum,
 )
@@ -23,7 +25,8 @@ class Packet(object):
 
     @overridable_property
     def id(self):
-        return None if self.context is None else self.get_id(self.context)
+        return None if self.context is None else \
+               get_packet_id(type(self), self.context)
 
     # To define the network data layout of a packet, either:
     #  1. Define the attribute `definition', a list of fields, each of which
@@ -65,20 +68,46 @@ class Packet(object):
         return self
 
     def read(self, file_object):
-        for field in self.definition:  # pylint: disable=not-an-iterable
-            for var_name, data_type in field.items():
-                value = data_type.read_with_context(file_object, self.context)
-                setattr(self, var_name, value)
+        PacketCodec.get(self).read(self, file_object, self.context)
+
+    # A packet may instead be read with 'read_lazily', which stores the
+    # remaining data of the packet without decoding it, so that packets which
+    # are received but never inspected are not decoded. The fields are then
+    # decoded when any of them is first accessed, or when 'decode' is called.
+    #
+    # Fields which also exist as class attributes (e.g. with default values)
+    # do not trigger decoding when accessed, so 'decode' should be called
+    # before accessing them.
+    def read_lazily(self, file_object):
+        self._lazy_data = file_object.read()
+
+    def decode(self):
+        """ Decodes the fields of this packet if it was read with
+            'read_lazily' and has not yet been decoded; otherwise, does
+            nothing. Returns this packet.
+        """
+        data = self.__dict__.pop('_lazy_data', None)
+        if data is not None:
+            self.read(PacketView(data))
+        return self
+
+    def __getattr__(self, name):
+        # This is only called if the attribute does not otherwise exist.
+        if name.startswith('_') or '_lazy_data' not in self.__dict__:
+            raise AttributeError('%r object has no attribute %r'
+                                 % (type(self).__name__, name))
+        return getattr(self.decode(), name)
 
     # Writes a packet buffer to the socket with the appropriate headers
-    # and compressing the data if necessary
-    def _write_buffer(self, socket, packet_buffer, compression_threshold):
+    # and compressing the data if necessary, at the given zlib level
+    def _write_buffer(self, socket, packet_buffer, compression_threshold,
+                      compression_level=Z_DEFAULT_COMPRESSION):
         # compression_threshold of None means compression is disabled
         if compression_threshold is not None:
             if len(packet_buffer.get_writable()) > compression_threshold != -1:
                 # compress the current payload
                 packet_data = packet_buffer.get_writable()
-                compressed_data = compress(packet_data)
+                compressed_data = compress(packet_data, compression_level)
                 packet_buffer.reset()
                 # write out the length of the uncompressed payload
                 VarInt.send(len(packet_data), packet_buffer)
@@ -91,10 +120,16 @@ class Packet(object):
                 VarInt.send(0, packet_buffer)
                 packet_buffer.send(packet_data)
 
-        VarInt.send(len(packet_buffer.get_writable()), socket)  # Packet Size
-        socket.send(packet_buffer.get_writable())  # Packet Payload
+        # Prefix the payload with its size, and send both in a single call,
+        # which, unlike 'send', is guaranteed to write all of the data.
+        packet_data = packet_buffer.get_writable()
+        packet_buffer.reset()
+        VarInt.send(len(packet_data), packet_buffer)  # Packet Size
+        packet_buffer.send(packet_data)  # Packet Payload
+        socket.sendall(packet_buffer.get_writable())
 
-    def write(self, socket, compression_threshold=None):
+    def write(self, socket, compression_threshold=None,
+              compression_level=Z_DEFAULT_COMPRESSION):
         # buffer the data since we need to know the length of each packet's
         # payload
         packet_buffer = PacketBuffer()
@@ -102,15 +137,23 @@ class Packet(object):
         VarInt.send(self.id, packet_buffer)
         # write every individual field
         self.write_fields(packet_buffer)
-        self._write_buffer(socket, packet_buffer, compression_threshold)
+        self._write_buffer(socket, packet_buffer, compression_threshold,
+                           compression_level)
+
+    def serialize(self, compression_threshold=None,
+                  compression_level=Z_DEFAULT_COMPRESSION):
+        """ Returns the bytes that 'write' would send, including the packet's
+            size, so that several packets may be sent together: for example,
+            using 'minecraft.networking.framing.send_frames'.
+        """
+        packet_buffer = PacketBuffer()
+        self.write(packet_buffer, compression_threshold, compression_level)
+        return packet_buffer.get_writable()
 
     def write_fields(self, packet_buffer):
         # Write the fields comprising the body of the packet (excluding the
         # length, packet ID, compression and encryption) into a PacketBuffer.
-        for field in self.definition:  # pylint: disable=not-an-iterable
-            for var_name, data_type in field.items():
-                data = getattr(self, var_name)
-                data_type.send_with_context(data, packet_buffer, self.context)
+        PacketCodec.get(self).write(self, packet_buffer, self.context)
 
     def __repr__(self):
         str = type(self).__name__
@@ -12,6 +12,14 @@ class PacketBuffer(object):
         """
         self.bytes.write(value)
 
+    def sendall(self, value):
+        """
+        Writes the given bytes to the buffer, designed to emulate
+        socket.sendall
+        :param value: The bytes to write
+        """
+        self.bytes.write(value)
+
     def read(self, length=None):
         return self.bytes.read(length)
 
@@ -29,3 +37,37 @@ class PacketBuffer(object):
 
     def is_eof(self):
         return self.bytes.tell() == self.bytes.getbuffer().nbytes
+
+
+class PacketView(object):
+    """ A read-only counterpart to 'PacketBuffer', which reads from an existing
+        bytes-like object (such as a 'memoryview' of a received frame) without
+        first copying it.
+
+        Types may decode directly from 'view', starting at the index
+        'offset', provided that they advance 'offset' past the data consumed.
+    """
+    __slots__ = 'view', 'offset'
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def read(self, length=None):
+        start = self.offset
+        end = len(self.view) if length is None else \
+            min(start + length, len(self.view))
+        self.offset = end
+        return self.view[start:end].tobytes()
+
+    def recv(self, length=None):
+        return self.read(length)
+
+    def reset_cursor(self):
+        self.offset = 0
+
+    def get_writable(self):
+        return self.view.tobytes()
+
+    def is_eof(self):
+        return self.offset == len(self.view)
@@ -0,0 +1,189 @@
+""" Compilation of packet definitions into specialised reading and writing
+    functions, which are cached for each packet class and protocol version.
+"""
+import keyword
+import struct
+import uuid
+
+from minecraft.networking.types import (
+    UnsignedByte, Angle, FixedPoint, FixedWidth, UUID,
+)
+
+
+def _fixed_width_format(data_type):
+    # Return the 'struct' format, without its byte order character, of the
+    # given type if it is a 'FixedWidth' type, or None otherwise.
+    if isinstance(data_type, type) and issubclass(data_type, FixedWidth):
+        fmt = data_type.struct.format
+        if isinstance(fmt, bytes):  # Python < 3.7
+            fmt = fmt.decode('ascii')
+        return fmt.lstrip('@=<>!')
+
+
+def _read_format(data_type):
+    # Return a tuple '(format, convert)' if 'data_type' may be read as part
+    # of a run of fixed-width fields, where 'convert' is None or a function
+    # applied to the unpacked value; otherwise, return None.
+    if isinstance(data_type, FixedPoint):
+        fmt = _fixed_width_format(data_type.integer_type)
+        denominator = data_type.denominator
+        return None if fmt is None else (fmt, lambda v: v / denominator)
+    elif data_type is Angle:
+        return _fixed_width_format(UnsignedByte), lambda v: 360 * v / 256
+    elif data_type is UUID:
+        return _fixed_width_format(UUID), lambda v: str(uuid.UUID(bytes=v))
+    fmt = _fixed_width_format(data_type)
+    return None if fmt is None else (fmt, None)
+
+
+def _write_format(data_type):
+    # As '_read_format', but for writing, with 'convert' applied to the
+    # value before it is packed.
+    if data_type is Angle:
+        return (_fixed_width_format(UnsignedByte),
+                lambda v: round(256 * ((v % 360) / 360)))
+    elif data_type is UUID:
+        return _fixed_width_format(UUID), lambda v: uuid.UUID(v).bytes
+    fmt = _fixed_width_format(data_type)
+    return None if fmt is None else (fmt, None)
+
+
+class PacketCodec(object):
+    """ A reader and writer for packets with a given definition (as described
+        in 'Packet'), whose fields are read and written by functions generated
+        once for that definition, rather than by interpreting the definition
+        for every packet. Runs of adjacent fields of 'FixedWidth' types are
+        read or written using a single precompiled 'struct.Struct' and, when
+        reading from a 'PacketView', are unpacked directly from its buffer.
+
+        'PacketCodec.get' returns the codec for a given packet, which is
+        cached for each packet class and protocol version. This relies on the
+        definition of a packet depending only on these.
+    """
+    __slots__ = 'read', 'write'
+
+    _cache = {}
+
+    def __init__(self, definition):
+        # pylint: disable=not-an-iterable
+        fields = [(name, data_type) for field in definition
+                  for name, data_type in field.items()]
+        self.read = self._compile(
+            fields, _read_format, self._read_lines,
+            # Fixed-width fields are unpacked directly from the buffer of a
+            # 'PacketView', whose contents are available as 'view'.
+            prologue=["view = getattr(buffer, 'view', None)"])
+        self.write = self._compile(fields, _write_format, self._write_lines)
+
+    @classmethod
+    def get(cls, packet):
+        """ Returns the codec for the current definition of the given packet,
+            which should have its 'context' set.
+        """
+        if 'definition' in vars(packet) or packet.context is None:
+            # The definition is not determined by the class and context.
+            return cls(packet.definition)
+        key = type(packet), packet.context.protocol_version
+        codec = cls._cache.get(key)
+        if codec is None:
+            codec = cls._cache[key] = cls(packet.definition)
+        return codec
+
+    @classmethod
+    def clear_cache(cls):
+        """ Discards all cached codecs. This should be called if the protocol
+            version information in the 'minecraft' package is changed.
+        """
+        cls._cache.clear()
+
+    @staticmethod
+    def _compile(fields, get_format, get_lines, prologue=()):
+        # Generate the source code of a function 'f(packet, buffer, context)'
+        # processing the given fields, and return the function.
+        namespace, lines = {}, list(prologue)
+        index = 0
+        while index < len(fields):
+            end = index
+            formats = []
+            while end < len(fields):
+                fmt = get_format(fields[end][1])
+                if fmt is None:
+                    break
+                formats.append(fmt)
+                end += 1
+            if formats:
+                lines.extend(get_lines(
+                    namespace, index, fields[index:end], formats))
+                index = end
+            else:
+                lines.extend(get_lines(
+                    namespace, index, fields[index:index + 1]))
+                index += 1
+
+        source = 'def f(packet, buffer, context):\n'
+        source += ''.join('    %s\n' % line for line in lines) or '    pass\n'
+        exec(source, namespace)  # pylint: disable=exec-used
+        return namespace['f']
+
+    @staticmethod
+    def _attribute(namespace, index, name):
+        # Return an expression referring to the attribute 'name' of 'packet'.
+        if name.isidentifier() and not keyword.iskeyword(name):
+            return 'packet.%s' % name
+        namespace['_name_%d' % index] = name
+        return 'getattr(packet, _name_%d)' % index
+
+    @classmethod
+    def _read_lines(cls, namespace, start, fields, formats=None):
+        if formats is None:
+            (name, data_type), = fields
+            namespace['_read_%d' % start] = data_type.read_with_context
+            value = '_read_%d(buffer, context)' % start
+            return [cls._assign(namespace, start, name, value)]
+
+        unpacker = struct.Struct('>' + ''.join(f for f, _ in formats))
+        namespace['_unpack_%d' % start] = unpacker.unpack
+        namespace['_unpack_from_%d' % start] = unpacker.unpack_from
+        values = ', '.join('_v%d' % (start + i) for i in range(len(fields)))
+        lines = [
+            'if view is None:',
+            '    %s, = _unpack_%d(buffer.read(%d))'
+            % (values, start, unpacker.size),
+            'else:',
+            '    %s, = _unpack_from_%d(view, buffer.offset)' % (values, start),
+            '    buffer.offset += %d' % unpacker.size,
+        ]
+        values = ['_v%d' % (start + i) for i in range(len(fields))]
+        for i, ((name, _), (_, convert)) in enumerate(zip(fields, formats)):
+            value = values[i]
+            if convert is not None:
+                namespace['_convert_%d' % (start + i)] = convert
+                value = '_convert_%d(%s)' % (start + i, value)
+            lines.append(cls._assign(namespace, start + i, name, value))
+        return lines
+
+    @classmethod
+    def _write_lines(cls, namespace, start, fields, formats=None):
+        if formats is None:
+            (name, data_type), = fields
+            namespace['_send_%d' % start] = data_type.send_with_context
+            value = cls._attribute(namespace, start, name)
+            return ['_send_%d(%s, buffer, context)' % (start, value)]
+
+        packer = struct.Struct('>' + ''.join(f for f, _ in formats))
+        namespace['_pack_%d' % start] = packer.pack
+        values = []
+        for i, ((name, _), (_, convert)) in enumerate(zip(fields, formats)):
+            value = cls._attribute(namespace, start + i, name)
+            if convert is not None:
+                namespace['_convert_%d' % (start + i)] = convert
+                value = '_convert_%d(%s)' % (start + i, value)
+            values.append(value)
+        return ['buffer.send(_pack_%d(%s))' % (start, ', '.join(values))]
+
+    @classmethod
+    def _assign(cls, namespace, index, name, value):
+        if name.isidentifier() and not keyword.iskeyword(name):
+            return 'packet.%s = %s' % (name, value)
+        namespace['_name_%d' % index] = name
+        return 'setattr(packet, _name_%d, %s)' % (index, value)
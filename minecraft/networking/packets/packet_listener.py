@@ -15,3 +15,10 @@ class PacketListener(object):
                 self.callback(packet)
                 return True
         return False
+
+    def listens_to(self, packet_class):
+        """ Returns True if this listener is called for packets of the given
+            class.
+        """
+        return any(issubclass(packet_class, packet_type)
+                   for packet_type in self.packets_to_listen)
@@ -0,0 +1,43 @@
+""" Process-wide caches of the packet IDs, and the tables mapping IDs to packet
+    classes, for each protocol version. These are computed lazily, once per
+    protocol version, and shared by all connections.
+"""
+
+_packet_tables = {}
+_packet_ids = {}
+
+
+def get_packet_table(get_packets, context, key='get_id'):
+    """ Returns a dict mapping the ID of each packet class returned by
+        'get_packets(context)' (such as 'clientbound.play.get_packets') to that
+        class, where the ID is given by the class method named by 'key'
+        ('get_id' or, for plugin message packets, 'get_channel').
+
+        The result is shared between callers, and must not be modified.
+    """
+    cache_key = get_packets, key, context.protocol_version, context.enable_fml
+    table = _packet_tables.get(cache_key)
+    if table is None:
+        table = {getattr(packet, key)(context): packet
+                 for packet in get_packets(context)}
+        table = _packet_tables.setdefault(cache_key, table)
+    return table
+
+
+def get_packet_id(packet_class, context):
+    """ Returns 'packet_class.get_id(context)', which is cached for each packet
+        class and protocol version.
+    """
+    cache_key = packet_class, context.protocol_version
+    packet_id = _packet_ids.get(cache_key)
+    if packet_id is None:
+        packet_id = _packet_ids[cache_key] = packet_class.get_id(context)
+    return packet_id
+
+
+def clear_cache():
+    """ Discards all cached packet IDs and tables. This should be called if the
+        protocol version information in the 'minecraft' package is changed.
+    """
+    _packet_tables.clear()
+    _packet_ids.clear()
@@ -1,3 +1,5 @@
+from zlib import Z_DEFAULT_COMPRESSION
+
 from minecraft.networking.types import String, VarInt
 from . import PacketBuffer
 from .packet import Packet
@@ -21,7 +23,8 @@ class AbstractPluginMessagePacket(Packet):
     def channel(self):
         return None if self.context is None else self.get_channel(self.context)
 
-    def write(self, socket, compression_threshold=None):
+    def write(self, socket, compression_threshold=None,
+              compression_level=Z_DEFAULT_COMPRESSION):
         # buffer the data since we need to know the length of each packet's
         # payload
         packet_buffer = PacketBuffer()
@@ -30,4 +33,5 @@ class AbstractPluginMessagePacket(Packet):
         String.send(self.channel, packet_buffer)
         # write every individual field
         self.write_fields(packet_buffer)
-        self._write_buffer(socket, packet_buffer, compression_threshold)
+        self._write_buffer(socket, packet_buffer, compression_threshold,
+                           compression_level)
@@ -1,17 +1,30 @@
 import zlib
 
-import select
-
 from minecraft.networking import packets
+from minecraft.networking.packets import packet_registry
 from minecraft.networking.packets import clientbound, AbstractPluginMessagePacket
 from minecraft.networking.types import VarInt
 
 
+# The largest size of the data of a received packet after decompression, as
+# accepted by vanilla clients (which accepted at most 2 ** 21 bytes before
+# Minecraft 1.17). A larger advertised size is rejected before decompressing,
+# so that it cannot cause an arbitrarily large buffer to be allocated.
+MAX_DECOMPRESSED_SIZE = 2 ** 23
+
+
 class PacketReactor(object):
     """
     Reads and reacts to packets
     """
-    state_name = None
+    # The name of the protocol state in which this reactor is used: one of
+    # 'handshake', 'status', 'login' or 'play'.
+    state_name = 'handshake'
+
+    # The 'packet_name' of each packet to which 'react' responds, or None if
+    # it may respond to any packet. If the connection's 'lazy_decoding' option
+    # is enabled, other packets are only decoded if some listener needs them.
+    react_packet_names = None
 
     # Handshaking is considered the "default" state
     get_clientbound_packets = staticmethod(clientbound.handshake.get_packets)
@@ -23,64 +36,110 @@ class PacketReactor(object):
     def __init__(self, connection):
         self.connection = connection
         context = self.connection.context
-        self.clientbound_packets = {
-            packet.get_id(context): packet
-            for packet in self.__class__.get_clientbound_packets(context)}
-        self.plugin_packets = {
-            packet.get_channel(context): packet
-            for packet in self.__class__.get_plugin_packets(context)}
-
-    def read_packet(self, stream, timeout=0):
-        # Block for up to `timeout' seconds waiting for `stream' to become
-        # readable, returning `None' if the timeout elapses.
-        ready_to_read = select.select([stream], [], [], timeout)[0]
-
-        if ready_to_read:
-            length = VarInt.read(stream)
-
-            packet_data = packets.PacketBuffer()
-            packet_data.send(stream.read(length))
-            # Ensure we read all the packet
-            while len(packet_data.get_writable()) < length:
-                packet_data.send(
-                    stream.read(length - len(packet_data.get_writable())))
-            packet_data.reset_cursor()
-
-            if self.connection.options.compression_enabled:
-                decompressed_size = VarInt.read(packet_data)
-                if decompressed_size > 0:
-                    decompressor = zlib.decompressobj()
-                    decompressed_packet = decompressor.decompress(
-                                                       packet_data.read())
-                    assert len(decompressed_packet) == decompressed_size, \
-                        'decompressed length %d, but expected %d' % \
-                        (len(decompressed_packet), decompressed_size)
-                    packet_data.reset()
-                    packet_data.send(decompressed_packet)
-                    packet_data.reset_cursor()
-
-            packet_id = VarInt.read(packet_data)
-
-            # If we know the structure of the packet, attempt to parse it
-            # otherwise, just return an instance of the base Packet class.
-            if packet_id in self.clientbound_packets:
-                packet = self.clientbound_packets[packet_id]()
+        # These tables are shared by all reactors of the same class using the
+        # same protocol version, so must not be modified.
+        self.clientbound_packets = packet_registry.get_packet_table(
+            self.__class__.get_clientbound_packets, context)
+        self.plugin_packets = packet_registry.get_packet_table(
+            self.__class__.get_plugin_packets, context, key='get_channel')
+
+    def read_packet(self, stream, timeout=0, wakeup=None):
+        # Block for up to `timeout' seconds waiting for a complete packet to be
+        # received from `stream', returning `None' if the timeout elapses, or
+        # if `wakeup' is given and becomes readable (see `read_frame').
+        frame = self.connection.frame_reader.read_frame(
+            stream, timeout, wakeup)
+        if frame is None:
+            return None
+        return self.parse_packet(frame)
+
+    def parse_packet(self, frame):
+        # Parse a packet from `frame', the data of a received frame excluding
+        # its length prefix.
+        metrics = self.connection.metrics
+        if metrics is not None:
+            metrics.start_lap()
+        packet_data = packets.PacketView(frame)
+        recorder = self.connection.packet_recorder
+        tracer = self.connection.tracer
+        if self.connection.options.compression_enabled:
+            decompressed_size = VarInt.read(packet_data)
+            if decompressed_size > MAX_DECOMPRESSED_SIZE:
+                raise ValueError(
+                    'Decompressed packet size of %d exceeds the maximum of %d.'
+                    % (decompressed_size, MAX_DECOMPRESSED_SIZE))
+            if decompressed_size > 0:
+                # Each packet is compressed separately, so is decompressed in
+                # one call, into a buffer of the advertised size.
+                if tracer is not None:
+                    token = tracer.begin('decompress', size=len(frame))
+                try:
+                    decompressed_packet = zlib.decompress(
+                        frame[packet_data.offset:], bufsize=decompressed_size)
+                finally:
+                    if tracer is not None:
+                        tracer.end(token, raw_size=decompressed_size)
+                assert len(decompressed_packet) == decompressed_size, \
+                    'decompressed length %d, but expected %d' % \
+                    (len(decompressed_packet), decompressed_size)
+                packet_data = packets.PacketView(decompressed_packet)
+
+        if recorder is not None:
+            recorder.record_incoming(
+                self.connection, packet_data.view[packet_data.offset:])
+
+        raw_size = len(packet_data.view) - packet_data.offset
+        if tracer is None:
+            packet = self._read_packet_data(packet_data)
+        else:
+            token = tracer.begin('decode', size=raw_size)
+            packet = None
+            try:
+                packet = self._read_packet_data(packet_data)
+            finally:
+                tracer.end(token, packet=type(packet).__name__)
+        if metrics is None:
+            return packet
+        metrics.lap('decode')
+        metrics.record_incoming(packet, len(frame), raw_size)
+        return packet
+
+    def _read_packet_data(self, packet_data):
+        # Read the ID and fields of a packet from 'packet_data', a PacketView
+        # of its data after any decompression.
+        packet_id = VarInt.read(packet_data)
+
+        # If we know the structure of the packet, attempt to parse it
+        # otherwise, just return an instance of the base Packet class.
+        if packet_id in self.clientbound_packets:
+            packet_class = self.clientbound_packets[packet_id]
+            packet = packet_class()
+            packet.context = self.connection.context
+            if self.connection.options.lazy_decoding and \
+                    not issubclass(packet_class, AbstractPluginMessagePacket) \
+                    and not self.connection._wants_packet(packet_class):
+                packet.read_lazily(packet_data)
+                return packet
+            packet.read(packet_data)
+
+            if isinstance(packet, AbstractPluginMessagePacket) and \
+                    packet.channel in self.plugin_packets:
+                packet = self.plugin_packets[packet.channel]()
                 packet.context = self.connection.context
                 packet.read(packet_data)
 
-                if isinstance(packet, AbstractPluginMessagePacket) and packet.channel in self.plugin_packets:
-                    packet = self.plugin_packets[packet.channel]()
-                    packet.context = self.connection.context
-                    packet.read(packet_data)
-
-            else:
-                packet = packets.Packet()
-                packet.context = self.connection.context
-                packet.id = packet_id
-            return packet
         else:
-            return None
-
+            packet = packets.Packet()
+            packet.context = self.connection.context
+            packet.id = packet_id
+        return packet
+
+    def reacts_to(self, packet_class):
+        """Returns True if 'react' may respond to packets of the given class,
+           which must then be decoded before they are passed to it.
+        """
+        return self.react_packet_names is None or \
+            packet_class.packet_name in self.react_packet_names
 
     def react(self, packet):
         """Called with each incoming packet after early packet listeners are
@@ -8,6 +8,7 @@ from minecraft.networking.reactors import PacketReactor, PlayingReactor
 
 
 class LoginReactor(PacketReactor):
+    state_name = 'login'
     get_clientbound_packets = staticmethod(clientbound.login.get_packets)
 
     def react(self, packet):
@@ -41,6 +42,9 @@ class LoginReactor(PacketReactor):
             self.connection.file_object = \
                 encryption.EncryptedFileObjectWrapper(
                     self.connection.file_object, decryptor)
+            self.connection.file_object.tracer = self.connection.tracer
+            # Any data already received after this packet is encrypted.
+            self.connection.frame_reader.transform_pending(decryptor.update)
 
         elif packet.packet_name == "disconnect":
             # Receiving a disconnect packet in the login state indicates an
@@ -4,9 +4,16 @@ from minecraft.networking.reactors import PacketReactor
 
 
 class PlayingReactor(PacketReactor):
+    state_name = 'play'
     get_clientbound_packets = staticmethod(clientbound.play.get_packets)
     get_plugin_packets = staticmethod(clientbound.plugins.get_packets)
 
+    # Plugin message packets are always decoded, so are not included here.
+    react_packet_names = frozenset((
+        "set compression", "keep alive", "player position and look",
+        "disconnect",
+    ))
+
     def react(self, packet):
         if packet.packet_name == "set compression":
             self.connection.options.compression_threshold = packet.threshold
@@ -15,13 +22,13 @@ class PlayingReactor(PacketReactor):
         elif packet.packet_name == "keep alive":
             keep_alive_packet = serverbound.play.KeepAlivePacket()
             keep_alive_packet.keep_alive_id = packet.keep_alive_id
-            self.connection.write_packet(keep_alive_packet)
+            self.connection.write_packet(keep_alive_packet, priority=True)
 
         elif packet.packet_name == "player position and look":
             if self.connection.context.protocol_later_eq(107):
                 teleport_confirm = serverbound.play.TeleportConfirmPacket()
                 teleport_confirm.teleport_id = packet.teleport_id
-                self.connection.write_packet(teleport_confirm)
+                self.connection.write_packet(teleport_confirm, priority=True)
             else:
                 position_response = serverbound.play.PositionAndLookPacket()
                 position_response.x = packet.x
@@ -6,6 +6,7 @@ from minecraft.networking.reactors import PacketReactor
 
 
 class StatusReactor(PacketReactor):
+    state_name = 'status'
     get_clientbound_packets = staticmethod(clientbound.status.get_packets)
 
     def __init__(self, connection, do_ping=False):
@@ -28,6 +29,9 @@ class StatusReactor(PacketReactor):
         elif packet.packet_name == "ping":
             if self.do_ping:
                 now = time.monotonic_ns()
+                metrics = self.connection.metrics
+                if metrics is not None:
+                    metrics.ping_seconds.observe((now - packet.time) / 1e9)
                 self.connection.disconnect()
                 self.handle_ping(now - packet.time)
 
@@ -0,0 +1,214 @@
+""" Recording the packets of a session to a file, and replaying them offline.
+"""
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from . import reactors
+from .connection import Connection
+from .packets import serverbound
+
+
+# The first bytes of a recording, identifying its format.
+MAGIC = b'pyCraft recording\x00\x01'
+
+# The header of each frame in a recording: its time, direction, state and
+# protocol version, and the length of its data.
+_FRAME_HEADER = struct.Struct('>dBBiI')
+
+# The protocol states, indexed by their codes in a recording.
+STATES = ('handshake', 'status', 'login', 'play')
+
+# The reactor used to parse the packets received in each protocol state.
+_STATE_REACTORS = {
+    'handshake': reactors.PacketReactor,
+    'status': reactors.StatusReactor,
+    'login': reactors.LoginReactor,
+    'play': reactors.PlayingReactor,
+}
+
+INCOMING, OUTGOING = 0, 1
+
+
+RecordedFrame = namedtuple('RecordedFrame', (
+    'time', 'direction', 'state', 'protocol_version', 'data'))
+RecordedFrame.__doc__ = """ A frame read from a recording:
+     - 'time' is the time (as given by 'time.time') at which it was recorded;
+     - 'direction' is 'INCOMING' or 'OUTGOING';
+     - 'state' is the name of the protocol state in which it was sent, as
+       given by the 'state_name' of the connection's reactor, or None if this
+       was not one of those in 'STATES';
+     - 'protocol_version' is the protocol version of the connection; and
+     - 'data' is the packet's ID and fields, without its length prefix, and
+       after any decompression.
+"""
+
+
+class PacketRecorder(object):
+    """ Writes the packets sent and received by one or more connections to a
+        binary file, which may be read by 'PacketReplayer':
+
+            recorder = PacketRecorder('session.rec')
+            recorder.attach(connection)
+            connection.connect()
+            ...
+            recorder.close()
+
+        'file' is either the name of a file, which is opened for appending, or
+        a binary file object opened for writing. The data of each packet is
+        recorded after decompression and decryption, along with the time, the
+        direction, the protocol state and the protocol version. Received
+        packets are recorded before they are parsed, so that packets unknown
+        to pyCraft are also recorded; sent packets are recorded as they are
+        serialized, so the data recorded is exactly that written.
+
+        The recording starts with a header identifying its format, unless
+        'file' is a seekable file which is not empty, to which the frames
+        are appended.
+    """
+
+    def __init__(self, file):
+        if isinstance(file, str):
+            self._file, self._owns_file = open(file, 'ab'), True
+        else:
+            self._file, self._owns_file = file, False
+        self._lock = threading.Lock()
+        self.closed = False
+        if not self._file.seekable() or self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def attach(self, connection):
+        """ Causes the packets sent and received by the given connection to
+            be recorded, until this recorder is closed.
+        """
+        connection.packet_recorder = self
+
+    def record_incoming(self, connection, data):
+        """ Records the given data (a bytes-like object containing the ID and
+            fields of a packet) as having been received by 'connection'.
+        """
+        self._record(connection, INCOMING, data)
+
+    def record_outgoing(self, connection, packet, data):
+        """ Records the given data (a bytes-like object containing the ID and
+            fields of 'packet', as written) as having been sent by
+            'connection'.
+        """
+        # The reactor for the next state is installed before the handshake
+        # is sent, so the state of the handshake is not that of the reactor.
+        state_name = 'handshake' if isinstance(
+            packet, serverbound.handshake.HandShakePacket) else None
+        self._record(connection, OUTGOING, data, state_name)
+
+    def _record(self, connection, direction, data, state_name=None):
+        if state_name is None:
+            state_name = connection.reactor.state_name
+        state = STATES.index(state_name) if state_name in STATES else 0xFF
+        header = _FRAME_HEADER.pack(
+            time.time(), direction, state,
+            connection.context.protocol_version, len(data))
+        with self._lock:
+            if not self.closed:
+                self._file.write(header)
+                self._file.write(data)
+
+    def flush(self):
+        """ Writes any buffered data to the file. """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """ Stops recording. The file is closed if it was opened by this
+            recorder, and is otherwise flushed.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._owns_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+
+class PacketReplayer(object):
+    """ Reads a recording written by 'PacketRecorder', and parses the packets
+        received in it in the same way as a connection would, so that the
+        parsing of real sessions can be reproduced and measured offline:
+
+            replayer = PacketReplayer('session.rec')
+            for frame, packet in replayer.packets():
+                print(frame.time, packet)
+
+        'file' is either the name of a file or a binary file object opened for
+        reading. The packets are parsed by the reactor for the recorded state
+        of the 'Connection' in 'connection', which is never connected. Its
+        'options' may be changed: for example, if 'options.lazy_decoding' is
+        set, the packets are decoded lazily as they would be by a connection
+        with the same packet listeners.
+    """
+
+    def __init__(self, file):
+        if isinstance(file, str):
+            with open(file, 'rb') as file_object:
+                self._data = file_object.read()
+        else:
+            self._data = file.read()
+        if not self._data.startswith(MAGIC):
+            raise ValueError('The file is not a pyCraft recording.')
+        self.connection = Connection('replay', username='Replay')
+
+    def frames(self):
+        """ Yields each 'RecordedFrame' in the recording, in order. The data
+            of each frame is a 'memoryview' of the recording.
+        """
+        view = memoryview(self._data)
+        offset = len(MAGIC)
+        while offset < len(view):
+            if offset + _FRAME_HEADER.size > len(view):
+                raise EOFError('The recording is truncated.')
+            timestamp, direction, state, protocol_version, length = \
+                _FRAME_HEADER.unpack_from(view, offset)
+            offset += _FRAME_HEADER.size
+            if offset + length > len(view):
+                raise EOFError('The recording is truncated.')
+            yield RecordedFrame(
+                timestamp, direction,
+                STATES[state] if state < len(STATES) else None,
+                protocol_version, view[offset:offset + length])
+            offset += length
+
+    def packets(self, speed=None):
+        """ Yields a tuple '(frame, packet)' for each frame received in the
+            recording, where 'packet' is the packet parsed from it.
+
+            If 'speed' is None, the packets are parsed as quickly as possible;
+            otherwise, the replay is paced so that the time between frames is
+            that recorded, divided by 'speed' (so a speed of 1 replays at the
+            original wall-clock rate).
+        """
+        connection = self.connection
+        connection.options.compression_enabled = False
+        reactor = None
+        start = first_time = None
+        for frame in self.frames():
+            if speed is not None:
+                if start is None:
+                    start, first_time = time.monotonic(), frame.time
+                delay = (frame.time - first_time) / speed - \
+                    (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            if frame.direction != INCOMING:
+                continue
+
+            reactor_type = _STATE_REACTORS.get(frame.state)
+            if reactor_type is None:
+                continue
+            if type(reactor) is not reactor_type or \
+                    connection.context.protocol_version \
+                    != frame.protocol_version:
+                connection.context.protocol_version = frame.protocol_version
+                reactor = connection.reactor = reactor_type(connection)
+            yield frame, reactor.parse_packet(frame.data)
@@ -0,0 +1,157 @@
+""" Hooks marking the start and end of each stage in the handling of a
+    connection's packets, and a sampler which records them in the Chrome
+    trace event format, as read by 'chrome://tracing' and Perfetto.
+"""
+import json
+import os
+import threading
+from time import perf_counter
+
+
+# The stages traced, and the arguments with which they are ended (in
+# addition to those with which they are begun, described below):
+#  - 'receive': a single read from the connection's stream, including any
+#    decryption, ended with 'size', the number of bytes read;
+#  - 'decrypt': the decryption of the data read, ended with 'size';
+#  - 'decompress': the decompression of an incoming packet, begun with
+#    'size', its compressed size, and ended with 'raw_size';
+#  - 'decode': the decoding of an incoming packet's ID and fields, begun with
+#    'size', and ended with 'packet', the name of its class;
+#  - 'react': a call of the reactor's 'react' method, begun with 'packet';
+#  - 'listener': a call of a packet listener, begun with 'packet', 'listener'
+#    (the listener's qualified name) and 'outgoing' (True if the listener
+#    is called for outgoing packets); for an offloaded listener, this is the
+#    submission of the call, and the call itself is traced separately, in a
+#    worker thread, with the additional argument 'offloaded=True';
+#  - 'write': the encoding and writing of one or more outgoing packets, begun
+#    with 'packet' (or 'packets', their number, if there are several), and
+#    ended with 'size', the number of bytes written;
+#  - 'write_lock': waiting to acquire the connection's write lock, which is
+#    held while packets are written.
+STAGES = ('receive', 'decrypt', 'decompress', 'decode', 'react', 'listener',
+          'write', 'write_lock')
+
+
+class Tracer(object):
+    """ The interface of the 'tracer' of a 'Connection', which, if it is not
+        None, is called at the start and end of each of the 'STAGES' in the
+        handling of the connection's packets. These calls are made from the
+        thread performing the stage, which is usually the connection's
+        networking thread, but is a worker thread of its
+        'offload.ListenerExecutor' for offloaded listeners.
+
+        The implementations in this class do nothing, and may be overridden.
+    """
+
+    def begin(self, stage, **args):
+        """ Called at the start of the given stage, with the arguments
+            described in 'STAGES'. Returns a value which is passed to 'end'.
+        """
+        return None
+
+    def end(self, token, **args):
+        """ Called at the end of the stage for which 'begin' returned 'token',
+            with the arguments described in 'STAGES'. This is called even if
+            the stage ends with an exception.
+        """
+
+
+def listener_name(callback):
+    """ Returns the name by which the given listener is identified in traces.
+    """
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+class ChromeTraceSampler(object):
+    """ Records the stages traced for one or more connections, and writes them
+        as a JSON file in the Chrome trace event format:
+
+            sampler = ChromeTraceSampler(period=10, window=1)
+            sampler.attach(connection)
+            connection.connect()
+            ...
+            sampler.save('trace.json')
+
+        Each stage is shown as a slice on the track of the thread in which it
+        ran, with the name of the connection's user among its arguments.
+
+        If 'period' is not None, only stages begun during the first 'window'
+        seconds of each 'period' seconds are recorded, which limits both the
+        overhead and the size of the trace for long sessions. At most
+        'max_events' stages are recorded in total.
+    """
+
+    def __init__(self, period=None, window=1, max_events=1000000):
+        self.period = period
+        self.window = window
+        self.max_events = max_events
+        self._origin = perf_counter()
+        self._events = []
+        self._thread_names = {}
+
+    def attach(self, connection):
+        """ Causes the stages of the given connection to be recorded, by
+            setting its 'tracer'.
+        """
+        connection.tracer = _SamplerTracer(self, connection.username)
+
+    def events(self):
+        """ Returns a list of the trace events recorded so far, including
+            metadata events naming the threads.
+        """
+        pid = os.getpid()
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                     'tid': tid, 'args': {'name': name}}
+                    for tid, name in dict(self._thread_names).items()]
+        return metadata + list(self._events)
+
+    def write(self, file):
+        """ Writes the trace, as JSON, to the given text file object. """
+        json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'},
+                  file)
+
+    def save(self, path):
+        """ Writes the trace, as JSON, to the file with the given name. """
+        with open(path, 'w') as file:
+            self.write(file)
+
+    def _sampling(self, now):
+        # Return True if a stage begun at the given time should be recorded.
+        if len(self._events) >= self.max_events:
+            return False
+        return self.period is None or \
+            (now - self._origin) % self.period < self.window
+
+    def _record(self, stage, start, end, args):
+        thread = threading.current_thread()
+        if thread.ident not in self._thread_names:
+            self._thread_names[thread.ident] = thread.name
+        self._events.append({
+            'name': stage, 'cat': 'pycraft', 'ph': 'X',
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(), 'tid': thread.ident, 'args': args,
+        })
+
+
+class _SamplerTracer(Tracer):
+    # The tracer of a connection attached to a 'ChromeTraceSampler'.
+
+    def __init__(self, sampler, name):
+        self.sampler = sampler
+        self.name = name
+
+    def begin(self, stage, **args):
+        now = perf_counter()
+        if not self.sampler._sampling(now):
+            return None
+        args['connection'] = self.name
+        return stage, now, args
+
+    def end(self, token, **args):
+        if token is None:
+            return
+        now = perf_counter()
+        stage, start, begin_args = token
+        begin_args.update(args)
+        self.sampler._record(stage, start, now, begin_args)
@@ -16,7 +16,7 @@ __all__ = (
     'Integer', 'FixedPoint', 'FixedPointInteger', 'Angle', 'VarInt', 'VarLong',
     'Long', 'UnsignedLong', 'Float', 'Double', 'ShortPrefixedByteArray',
     'VarIntPrefixedByteArray', 'TrailingByteArray', 'String', 'UUID',
-    'Position', 'NBT', 'PrefixedArray',
+    'Position', 'NBT', 'PrefixedArray', 'FixedWidth',
 )
 
 from ...utility import class_and_instancemethod
@@ -53,64 +53,70 @@ class Type(object):
                             'call "send_with_context" instead of "send".')
 
 
-class Boolean(Type):
+class FixedWidth(object):
+    """ A mixin for subclasses of 'Type' whose values have a fixed-width
+        network representation, given by the precompiled 'struct.Struct'
+        class attribute 'struct', which packs or unpacks a single value.
+        Such types may be read from or written to a buffer at a given offset
+        using 'unpack_from' and 'pack_into', and adjacent fields of these
+        types are read or written together by 'PacketCodec'.
+    """
+    __slots__ = ()
+
+    struct = None
+
     @classmethod
     def read(cls, file_object):
-        return struct.unpack('?', file_object.read(1))[0]
+        view = getattr(file_object, 'view', None)
+        if view is not None:
+            value, file_object.offset = \
+                cls.unpack_from(view, file_object.offset)
+            return value
+        return cls.unpack_from(file_object.read(cls.struct.size))[0]
 
     @classmethod
     def send(cls, value, socket):
-        socket.send(struct.pack('?', value))
-
+        socket.send(cls.struct.pack(value))
 
-class UnsignedByte(Type):
     @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>B', file_object.read(1))[0]
+    def unpack_from(cls, buffer, offset=0):
+        """ Decodes a value from the bytes-like object 'buffer', starting at
+            index 'offset', and returns a tuple '(value, new_offset)'.
+        """
+        return cls.struct.unpack_from(buffer, offset)[0], \
+            offset + cls.struct.size
 
     @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>B', value))
+    def pack_into(cls, buffer, offset, value):
+        """ Encodes 'value' into the writable bytes-like object 'buffer',
+            starting at index 'offset', and returns the index just after it.
+        """
+        cls.struct.pack_into(buffer, offset, value)
+        return offset + cls.struct.size
 
 
-class Byte(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>b', file_object.read(1))[0]
+class Boolean(FixedWidth, Type):
+    struct = struct.Struct('?')
 
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>b', value))
 
+class UnsignedByte(FixedWidth, Type):
+    struct = struct.Struct('>B')
 
-class Short(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>h', file_object.read(2))[0]
 
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>h', value))
+class Byte(FixedWidth, Type):
+    struct = struct.Struct('>b')
 
 
-class UnsignedShort(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>H', file_object.read(2))[0]
+class Short(FixedWidth, Type):
+    struct = struct.Struct('>h')
 
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>H', value))
 
+class UnsignedShort(FixedWidth, Type):
+    struct = struct.Struct('>H')
 
-class Integer(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>i', file_object.read(4))[0]
 
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>i', value))
+class Integer(FixedWidth, Type):
+    struct = struct.Struct('>i')
 
 
 class FixedPoint(Type):
@@ -124,7 +130,7 @@ class FixedPoint(Type):
         return self.integer_type.read(file_object) / self.denominator
 
     def send(self, value, socket):
-        self.integer_type.send(int(value * self.denominator))
+        self.integer_type.send(int(value * self.denominator), socket)
 
 
 # This named instance is retained for backward compatibility:
@@ -144,10 +150,24 @@ class Angle(Type):
 
 
 class VarInt(Type):
+    """ A variable-length integer. As well as the usual 'read' and 'send',
+        this provides 'unpack_from', 'unpack_many_from' and 'pack', which
+        operate directly on bytes-like objects.
+
+        When reading from a 'PacketView' (as is done for every received
+        packet), 'read' and 'read_many' decode directly from its underlying
+        buffer, rather than reading one byte at a time.
+    """
     max_bytes = 5
 
     @classmethod
     def read(cls, file_object):
+        view = getattr(file_object, 'view', None)
+        if view is not None:
+            number, file_object.offset = \
+                cls.unpack_from(view, file_object.offset)
+            return number
+
         number = 0
         # Limit of 'cls.max_bytes' bytes, otherwise its possible to cause
         # a DOS attack by sending VarInts that just keep going
@@ -168,15 +188,83 @@ class VarInt(Type):
         return number
 
     @classmethod
-    def send(cls, value, socket):
-        out = bytes()
+    def read_many(cls, file_object, count):
+        """ Reads 'count' consecutive values, returning them in a list. """
+        view = getattr(file_object, 'view', None)
+        if view is not None:
+            numbers, file_object.offset = \
+                cls.unpack_many_from(view, count, file_object.offset)
+            return numbers
+        return [cls.read(file_object) for _ in range(count)]
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        """ Decodes a value from the bytes-like object 'buffer', starting at
+            index 'offset', and returns a tuple '(value, new_offset)', where
+            'new_offset' is the index just after the value.
+        """
+        # This is a specialisation of 'unpack_many_from', for speed.
+        number = shift = 0
+        limit = 7 * cls.max_bytes
+        end = len(buffer)
+        while True:
+            if offset >= end:
+                raise EOFError("Unexpected end of message.")
+            byte = buffer[offset]
+            offset += 1
+            number |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return number, offset
+            if shift >= limit:
+                raise ValueError("Tried to read too long of a VarInt")
+            shift += 7
+
+    @classmethod
+    def unpack_many_from(cls, buffer, count, offset=0):
+        """ As 'unpack_from', but decodes 'count' consecutive values in one
+            pass, and returns a tuple '(values, new_offset)', where 'values'
+            is a list.
+        """
+        numbers = []
+        append = numbers.append
+        limit = 7 * cls.max_bytes
+        end = len(buffer)
+        for _ in range(count):
+            number = shift = 0
+            while True:
+                if offset >= end:
+                    raise EOFError("Unexpected end of message.")
+                byte = buffer[offset]
+                offset += 1
+                number |= (byte & 0x7F) << shift
+                if not byte & 0x80:
+                    break
+                if shift >= limit:
+                    raise ValueError("Tried to read too long of a VarInt")
+                shift += 7
+            append(number)
+        return numbers, offset
+
+    @classmethod
+    def pack(cls, value):
+        """ Returns the encoding of 'value' as a 'bytes' object. """
+        if 0 <= value < 0x80:
+            return bytes((value,))
+        elif value < 0:
+            raise ValueError("Negative values cannot be encoded as a VarInt")
+        out = bytearray()
         while True:
             byte = value & 0x7F
             value >>= 7
-            out += struct.pack("B", byte | (0x80 if value > 0 else 0))
-            if value == 0:
-                break
-        socket.send(out)
+            if value > 0:
+                out.append(byte | 0x80)
+            else:
+                out.append(byte)
+                return bytes(out)
+
+    @classmethod
+    def send(cls, value, socket):
+        socket.send(cls.pack(value))
 
     @staticmethod
     def size(value):
@@ -207,44 +295,20 @@ VARINT_SIZE_TABLE = {
 }
 
 
-class Long(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>q', file_object.read(8))[0]
+class Long(FixedWidth, Type):
+    struct = struct.Struct('>q')
 
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>q', value))
 
+class UnsignedLong(FixedWidth, Type):
+    struct = struct.Struct('>Q')
 
-class UnsignedLong(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>Q', file_object.read(8))[0]
 
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>Q', value))
+class Float(FixedWidth, Type):
+    struct = struct.Struct('>f')
 
 
-class Float(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>f', file_object.read(4))[0]
-
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>f', value))
-
-
-class Double(Type):
-    @classmethod
-    def read(cls, file_object):
-        return struct.unpack('>d', file_object.read(8))[0]
-
-    @classmethod
-    def send(cls, value, socket):
-        socket.send(struct.pack('>d', value))
+class Double(FixedWidth, Type):
+    struct = struct.Struct('>d')
 
 
 class ShortPrefixedByteArray(Type):
@@ -297,15 +361,23 @@ class String(Type):
         socket.send(value)
 
 
-class UUID(Type):
-    @classmethod
-    def read(cls, file_object):
-        return str(uuid.UUID(bytes=file_object.read(16)))
+class UUID(FixedWidth, Type):
+    struct = struct.Struct('16s')
 
     @classmethod
     def send(cls, value, socket):
         socket.send(uuid.UUID(value).bytes)
 
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        value, offset = super(UUID, cls).unpack_from(buffer, offset)
+        return str(uuid.UUID(bytes=value)), offset
+
+    @classmethod
+    def pack_into(cls, buffer, offset, value):
+        return super(UUID, cls).pack_into(
+            buffer, offset, uuid.UUID(value).bytes)
+
 
 class Position(Type, Vector):
     """3D position vectors with a specific, compact network representation."""
@@ -364,12 +436,18 @@ class PrefixedArray(Type):
         self.element_type = element_type
 
     def read(self, file_object):
+        read_many = getattr(self.element_type, 'read_many', None)
+        if read_many is not None:
+            return read_many(file_object, self.length_type.read(file_object))
         return self.__read(file_object, self.element_type.read)
 
     def send(self, value, socket):
         return self.__send(value, socket, self.element_type.send)
 
     def read_with_context(self, file_object, context):
+        if hasattr(self.element_type, 'read_many'):
+            return self.read(file_object)
+
         def element_read(file_object):
             return self.element_type.read_with_context(file_object, context)
         return self.__read(file_object, element_read)
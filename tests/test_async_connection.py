@@ -0,0 +1,132 @@
+import asyncio
+import sys
+import threading
+import time
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.async_connection import AsyncConnection
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server, test_connection
+
+
+class AsyncConnectTest(unittest.TestCase):
+    """ Connects an 'AsyncConnection' to a 'FakeServer' running in another
+        thread, which behaves as in 'ConnectTest'.
+    """
+    client_versions = None
+    compression_threshold = None
+    private_key = None
+    public_key_bytes = None
+
+    def test_connect(self):
+        client_handler_type = test_connection.ConnectTest.client_handler_type
+        server = fake_server.FakeServer(
+            compression_threshold=self.compression_threshold,
+            client_handler_type=client_handler_type,
+            private_key=self.private_key,
+            public_key_bytes=self.public_key_bytes, test_case=self)
+        port = server.listen_socket.getsockname()[1]
+
+        server_exc_info = []
+
+        def run_server():
+            try:
+                server.run()
+            except Exception:
+                server_exc_info.append(sys.exc_info())
+        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread.start()
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(asyncio.wait_for(
+                self._run_client(port), fake_server.THREAD_TIMEOUT_S))
+        finally:
+            loop.close()
+            server.stop()
+            server_thread.join(fake_server.THREAD_TIMEOUT_S)
+        if server_exc_info:
+            exc_value, exc_tb = server_exc_info[0][1:]
+            raise exc_value.with_traceback(exc_tb)
+
+    async def _run_client(self, port):
+        client = AsyncConnection('localhost', port, username='TestUser',
+                                 allowed_versions=self.client_versions)
+        events = []
+
+        async def handle_join_game(packet):
+            await asyncio.sleep(0)
+            events.append('join game')
+        client.register_packet_listener(
+            handle_join_game, clientbound.play.JoinGamePacket)
+
+        def handle_keep_alive(packet):
+            events.append('keep alive %d' % packet.keep_alive_id)
+        client.register_packet_listener(
+            handle_keep_alive, serverbound.play.KeepAlivePacket,
+            outgoing=True)
+
+        def handle_disconnect(packet):
+            events.append('disconnect')
+        client.register_packet_listener(
+            handle_disconnect, clientbound.play.DisconnectPacket)
+
+        await client.connect()
+        await client.wait_closed()
+        self.assertEqual(events, [
+            'join game', 'keep alive 1223334444', 'disconnect'])
+        self.assertFalse(client.connected)
+
+
+class AsyncConnectCompressionTest(AsyncConnectTest):
+    compression_threshold = 0
+
+
+class AsyncConnectKnownVersionTest(AsyncConnectTest):
+    client_versions = {SUPPORTED_PROTOCOL_VERSIONS[-1]}
+
+
+class AsyncOffloadExceptionTest(unittest.TestCase):
+    """ Checks that an exception raised by an offloaded listener is reported
+        even if the server sends no further packets.
+    """
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_packet(self, packet):
+            pass
+
+    def test_connect(self):
+        server = fake_server.FakeServer(
+            client_handler_type=self.client_handler_type, test_case=self)
+        port = server.listen_socket.getsockname()[1]
+        server_thread = threading.Thread(target=server.run, daemon=True)
+        server_thread.start()
+
+        loop = asyncio.new_event_loop()
+        try:
+            exceptions = loop.run_until_complete(asyncio.wait_for(
+                self._run_client(port), fake_server.THREAD_TIMEOUT_S))
+        finally:
+            loop.close()
+            server.stop()
+            server_thread.join(fake_server.THREAD_TIMEOUT_S)
+        self.assertEqual([str(e) for e in exceptions], ['offloaded'])
+
+    async def _run_client(self, port):
+        client = AsyncConnection('localhost', port, username='TestUser')
+        exceptions = []
+
+        def handle_join_game(packet):
+            # Raise once the networking task has gone idle.
+            time.sleep(0.1)
+            raise ValueError('offloaded')
+        client.register_packet_listener(
+            handle_join_game, clientbound.play.JoinGamePacket, offload=True)
+        self.addCleanup(client.listener_executor.shutdown)
+        client.exception_handler()(
+            lambda exc, exc_info: exceptions.append(exc))
+
+        await client.connect()
+        await client.wait_closed()
+        return exceptions
@@ -0,0 +1,45 @@
+import json
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+
+from benchmarks import __main__ as benchmarks_main, load as benchmarks_load
+
+
+class BenchmarksTest(unittest.TestCase):
+    """ Runs each benchmark suite briefly, to check that it still works. """
+
+    def test_run(self):
+        protocol_version = SUPPORTED_PROTOCOL_VERSIONS[-1]
+        output = benchmarks_main.run(
+            protocol_versions=[protocol_version], min_time=0)
+        json.dumps(output)
+
+        benchmarks = {r['benchmark'] for r in output['results']}
+        self.assertEqual(benchmarks, {'type_read', 'type_write',
+                                      'packet_encode', 'packet_decode',
+                                      'read_path'})
+        for result in output['results']:
+            self.assertGreater(result['calls'], 0)
+            self.assertGreater(result['items_per_sec'], 0)
+
+        # Only packets without a definition, and without a factory in
+        # 'benchmarks.samples', should be skipped.
+        for skipped in output['skipped']:
+            self.assertIn('has no definition', skipped['reason'])
+        self.assertNotIn('MapPacket',
+                         {s['packet'] for s in output['skipped']})
+
+    def test_load(self):
+        result = benchmarks_load.run(
+            clients=4, rate=50, duration=0.5, processes=1,
+            compression_threshold=256, keep_alive_interval=0.1)
+        server, clients = result['server'], result['clients']
+        self.assertEqual(server['errors'], [])
+        self.assertEqual(clients['errors'], [])
+        self.assertEqual(server['sessions'], 4)
+        self.assertEqual(clients['joined'], 4)
+        self.assertEqual(server['keep_alives_dropped'], 0)
+        self.assertGreater(server['keep_alives_sent'], 0)
+        self.assertGreater(clients['packets_received'], 0)
+        self.assertGreater(clients['latency']['count'], 0)
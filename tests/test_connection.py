@@ -2,17 +2,25 @@ from minecraft import (
     SUPPORTED_MINECRAFT_VERSIONS, SUPPORTED_PROTOCOL_VERSIONS,
     PROTOCOL_VERSION_INDICES,
 )
+from minecraft.networking import packets
 from minecraft.networking.packets import clientbound, serverbound
 from minecraft.networking.connection import Connection
+from minecraft.networking.framing import FrameReader
+from minecraft.networking.reactors import PlayingReactor
+from minecraft.networking.types import VarInt
 from minecraft.exceptions import (
     VersionMismatch, LoginDisconnect, InvalidState, IgnorePacket
 )
 
 from . import fake_server
 
+import unittest
+import socket
+import threading
 import sys
 import re
 import io
+import zlib
 
 
 class ConnectTest(fake_server._FakeServerTest):
@@ -33,6 +41,27 @@ class ConnectTest(fake_server._FakeServerTest):
                 raise fake_server.FakeServerDisconnect
 
 
+class WakeupCloseTest(ConnectTest):
+    """ Checks that the sockets used to wake the networking thread are closed
+        once the connection is disconnected and the thread has exited.
+    """
+    def test_connect(self):
+        connections, threads = [], []
+
+        def connection_type(*args, **kwds):
+            connection = Connection(*args, **kwds)
+            connection.register_packet_listener(
+                lambda packet: threads.append(threading.current_thread()),
+                clientbound.play.JoinGamePacket)
+            connections.append(connection)
+            return connection
+        self._test_connect(connection_type=connection_type)
+
+        threads[0].join(fake_server.THREAD_TIMEOUT_S)
+        self.assertIsNone(connections[0]._wakeup)
+        self.assertEqual(threads[0].wakeup.fileno(), -1)
+
+
 class ReconnectTest(ConnectTest):
     phase = 0
 
@@ -120,6 +149,26 @@ class ConnectCompressionHighTest(ConnectTest):
     compression_threshold = 256
 
 
+def fast_compression_connection(*args, **kwds):
+    return Connection(*args, compression_level=1, **kwds)
+
+
+class ConnectCompressionLevelTest(ConnectCompressionLowTest):
+    connection_type = staticmethod(fast_compression_connection)
+
+
+def batch_writes_connection(*args, **kwds):
+    return Connection(*args, batch_writes=True, **kwds)
+
+
+class BatchWritesTest(ConnectTest):
+    connection_type = staticmethod(batch_writes_connection)
+
+
+class BatchWritesCompressionTest(BatchWritesTest, ConnectCompressionLowTest):
+    pass
+
+
 class AllowedVersionsTest(fake_server._FakeServerTest):
     versions = list(SUPPORTED_MINECRAFT_VERSIONS.items())
     test_indices = (0, len(versions) // 2, len(versions) - 1)
@@ -478,3 +527,136 @@ class VersionNegotiationEdgeCases(fake_server._FakeServerTest):
         self._test_connect(server_version=self.earliest_version,
                            client_handler_type=ClientHandler,
                            connection_type=make_connection)
+
+
+class BatchWritesIgnorePacketTest(IgnorePacketTest):
+    connection_type = staticmethod(batch_writes_connection)
+
+
+def lazy_decoding_connection(*args, **kwds):
+    return Connection(*args, lazy_decoding=True, **kwds)
+
+
+class LazyDecodingTest(EarlyPacketListenerTest):
+    connection_type = staticmethod(lazy_decoding_connection)
+
+
+class LazyDecodingIgnorePacketTest(IgnorePacketTest):
+    connection_type = staticmethod(lazy_decoding_connection)
+
+
+class LazyDecodingReactorTest(unittest.TestCase):
+    def setUp(self):
+        self.client = lazy_decoding_connection('localhost', username='Player')
+        self.client.reactor = PlayingReactor(self.client)
+        self.client.frame_reader = FrameReader()
+        self.client_socket, self.server_socket = socket.socketpair()
+        self.stream = self.client_socket.makefile('rb', 0)
+
+    def tearDown(self):
+        self.stream.close()
+        self.client_socket.close()
+        self.server_socket.close()
+
+    def _read_packet(self, packet):
+        packet.context = self.client.context
+        packet.write(self.server_socket)
+        return self.client.reactor.read_packet(self.stream, timeout=1)
+
+    def test_lazy_decoding(self):
+        packet = self._read_packet(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "hello"}', position=0,
+            sender='00000000-0000-0000-0000-000000000000'))
+        self.assertIsInstance(packet, clientbound.play.ChatMessagePacket)
+        self.assertNotIn('json_data', vars(packet))
+        self.assertEqual(packet.json_data, '{"text": "hello"}')
+        self.assertEqual(packet.position, 0)
+
+        # Packets handled by the reactor are always decoded.
+        packet = self._read_packet(
+            clientbound.play.KeepAlivePacket(keep_alive_id=5))
+        self.assertIn('keep_alive_id', vars(packet))
+
+        # Packets are decoded once a listener is registered for them.
+        self.client.register_packet_listener(
+            lambda packet: None, clientbound.play.ChatMessagePacket)
+        packet = self._read_packet(clientbound.play.ChatMessagePacket(
+            json_data='{"text": "world"}', position=1,
+            sender='00000000-0000-0000-0000-000000000000'))
+        self.assertIn('json_data', vars(packet))
+        self.assertFalse(self.client._wants_packet(
+            clientbound.play.MapPacket))
+
+
+class DecompressionLimitTest(unittest.TestCase):
+    def test_decompressed_size(self):
+        client = Connection('localhost', username='Player')
+        client.reactor = PlayingReactor(client)
+        client.options.compression_enabled = True
+        frame = packets.PacketBuffer()
+        VarInt.send(2 ** 30, frame)
+        frame.send(zlib.compress(b'\x00'))
+        with self.assertRaisesRegex(ValueError, 'exceeds the maximum'):
+            client.reactor.parse_packet(frame.get_writable())
+
+
+class DispatchTableTest(unittest.TestCase):
+    def test_dispatch(self):
+        client = Connection('localhost', username='Player')
+        client.reactor = PlayingReactor(client)
+        calls = []
+
+        def listener(name):
+            return lambda packet: calls.append((name, type(packet)))
+        client.register_packet_listener(
+            listener('chat'), clientbound.play.ChatMessagePacket)
+        client.register_packet_listener(listener('any'), packets.Packet)
+        client.register_packet_listener(
+            listener('early'), clientbound.play.ChatMessagePacket,
+            clientbound.play.KeepAlivePacket, early=True)
+
+        chat = clientbound.play.ChatMessagePacket(client.context)
+        time_update = clientbound.play.TimeUpdatePacket(client.context)
+        client._react(chat)
+        client._react(time_update)
+        self.assertEqual(calls, [
+            ('early', type(chat)), ('chat', type(chat)), ('any', type(chat)),
+            ('any', type(time_update)),
+        ])
+
+        # Registering a listener invalidates the cached dispatch table.
+        del calls[:]
+        client.register_packet_listener(
+            listener('late'), clientbound.play.TimeUpdatePacket)
+        client._react(time_update)
+        self.assertEqual(calls, [
+            ('any', type(time_update)), ('late', type(time_update)),
+        ])
+
+    def test_register_while_dispatching(self):
+        client = Connection('localhost', username='Player')
+        client.reactor = PlayingReactor(client)
+        time_update = clientbound.play.TimeUpdatePacket(client.context)
+        building, registered = threading.Event(), threading.Event()
+
+        class DispatchTable(dict):
+            # Pause between computing and caching the callbacks, giving the
+            # main thread a chance to register a listener.
+            def __setitem__(self, key, value):
+                if key[0] == 'packet_listeners':
+                    building.set()
+                    registered.wait(0.2)
+                super(DispatchTable, self).__setitem__(key, value)
+        client._dispatch_table = DispatchTable()
+
+        thread = threading.Thread(target=client._react, args=(time_update,))
+        thread.start()
+        self.assertTrue(building.wait(fake_server.THREAD_TIMEOUT_S))
+        calls = []
+        client.register_packet_listener(
+            calls.append, clientbound.play.TimeUpdatePacket)
+        registered.set()
+        thread.join(fake_server.THREAD_TIMEOUT_S)
+
+        client._react(time_update)
+        self.assertEqual(calls, [time_update])
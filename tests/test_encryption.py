@@ -12,7 +12,7 @@ from minecraft.networking.encryption import (
     EncryptedSocketWrapper
 )
 from minecraft.networking.packets import clientbound
-from tests import test_connection
+from tests import test_connection, test_async_connection
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
@@ -85,6 +85,44 @@ class Encryption(unittest.TestCase):
 
         self.assertEqual(test_data, decrypted_data)
 
+    def test_file_object_wrapper_readinto(self):
+        cipher = create_aes_cipher(generate_shared_secret())
+        encryptor = cipher.encryptor()
+        decryptor = cipher.decryptor()
+
+        test_data = os.urandom(1000)
+        io = BytesIO(encryptor.update(test_data))
+        file_object_wrapper = EncryptedFileObjectWrapper(io, decryptor)
+
+        # Data read in chunks is decrypted in place, continuing the stream.
+        buffer = bytearray(600)
+        self.assertEqual(file_object_wrapper.readinto(buffer), 600)
+        self.assertEqual(buffer, test_data[:600])
+        self.assertEqual(file_object_wrapper.readinto(buffer), 400)
+        self.assertEqual(buffer[:400], test_data[600:])
+        self.assertEqual(file_object_wrapper.readinto(buffer), 0)
+
+    def test_file_object_wrapper_readinto_fallback(self):
+        # Older versions of 'cryptography' lack 'update_into', or refuse to
+        # use an output buffer no longer than the input.
+        class Decryptor(object):
+            def __init__(self, decryptor, error):
+                self.update = decryptor.update
+                self.error = error
+
+            def update_into(self, data, buffer):
+                raise self.error
+
+        test_data = os.urandom(100)
+        for error in AttributeError(), ValueError('buffer too small'):
+            cipher = create_aes_cipher(generate_shared_secret())
+            io = BytesIO(cipher.encryptor().update(test_data))
+            file_object_wrapper = EncryptedFileObjectWrapper(
+                io, Decryptor(cipher.decryptor(), error))
+            buffer = bytearray(100)
+            self.assertEqual(file_object_wrapper.readinto(buffer), 100)
+            self.assertEqual(buffer, test_data)
+
     def test_socket_wrapper(self):
         secret = generate_shared_secret()
 
@@ -108,9 +146,15 @@ class Encryption(unittest.TestCase):
         # Ensure that hello reaches the server properly after undergoing
         # encryption
         test_data = "hello".encode('utf-8')
-        wrapper.send(test_data)
+        self.assertEqual(wrapper.send(test_data), len(test_data))
         self.assertEqual(test_data, mock_socket.received)
 
+        # Ensure that data received into a buffer continues the stream.
+        buffer = bytearray(20)
+        self.assertEqual(wrapper.recv_into(buffer, 8), 8)
+        self.assertEqual(buffer[:8], mock_socket.raw_data[:8])
+        self.assertEqual(buffer[8:], bytes(12))
+
 
 class EncryptedConnection(test_connection.ConnectTest):
     def test_connect(self):
@@ -131,12 +175,29 @@ class EncryptedCompressedConnection(EncryptedConnection,
     pass
 
 
+class EncryptedBatchWritesConnection(EncryptedConnection,
+                                     test_connection.BatchWritesTest):
+    pass
+
+
 # Regression test for <https://github.com/ammaraskar/pyCraft/issues/109>.
 class EncryptedCompressedReconnect(test_connection.ReconnectTest,
                                    EncryptedCompressedConnection):
     pass
 
 
+class AsyncEncryptedConnection(test_async_connection.AsyncConnectTest):
+    def setUp(self):
+        self.private_key = private_key
+        self.public_key_bytes = public_key
+
+
+class AsyncEncryptedCompressedConnection(
+        AsyncEncryptedConnection,
+        test_async_connection.AsyncConnectCompressionTest):
+    pass
+
+
 class MockSocket(object):
 
     def __init__(self, encryptor, decryptor):
@@ -152,8 +213,16 @@ class MockSocket(object):
 
     # decrypt the data as it reaches
     # the server side
+    def recv_into(self, buffer, nbytes=0):
+        data = self.recv(nbytes or len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
     def send(self, data):
         self.received = self.decryptor.update(data)
+        return len(data)
+
+    sendall = send
 
     def fileno(self):
         return 0
@@ -0,0 +1,58 @@
+import sys
+import threading
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.fleet import Fleet
+
+from . import fake_server, test_connection
+
+
+class FleetTest(unittest.TestCase):
+    """ Runs several sessions in two worker processes, connected to a
+        'FakeServer' which handles them one after another as in 'ConnectTest'.
+    """
+    def test_fleet(self):
+        client_handler_type = test_connection.ConnectTest.client_handler_type
+        server = fake_server.FakeServer(
+            client_handler_type=client_handler_type, test_case=self)
+        port = server.listen_socket.getsockname()[1]
+
+        server_exc_info = []
+
+        def run_server():
+            try:
+                server.run()
+            except Exception:
+                server_exc_info.append(sys.exc_info())
+        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread.start()
+
+        usernames = ['TestUser%d' % i for i in range(4)]
+        fleet = Fleet('localhost', port, usernames, processes=2,
+                      connection_kwds={'allowed_versions': {
+                          SUPPORTED_PROTOCOL_VERSIONS[-1]}})
+        fleet.start()
+        try:
+            events = list(fleet.events(timeout=fake_server.THREAD_TIMEOUT_S))
+        finally:
+            fleet.stop()
+            fleet.join(fake_server.THREAD_TIMEOUT_S)
+            server.stop()
+            server_thread.join(fake_server.THREAD_TIMEOUT_S)
+
+        if server_exc_info:
+            exc_value, exc_tb = server_exc_info[0][1:]
+            raise exc_value.with_traceback(exc_tb)
+
+        for username in usernames:
+            kinds = [e.kind for e in events if e.username == username]
+            self.assertEqual(kinds, ['latency', 'disconnect', 'exit'])
+        for event in events:
+            if event.kind == 'latency':
+                self.assertGreaterEqual(event.data, 0)
+
+    def test_reserved_kwds(self):
+        with self.assertRaisesRegex(ValueError, 'handle_exit'):
+            Fleet('localhost', 25565, ['TestUser'],
+                  connection_kwds={'handle_exit': print})
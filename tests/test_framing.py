@@ -0,0 +1,138 @@
+import unittest
+import socket
+import threading
+
+from minecraft.networking.connection import _Wakeup
+from minecraft.networking.framing import FrameReader, send_frames
+from minecraft.networking.packets import PacketBuffer, PacketView
+from minecraft.networking.types import VarInt
+
+
+def make_frame(data):
+    buffer = PacketBuffer()
+    VarInt.send(len(data), buffer)
+    buffer.send(data)
+    return buffer.get_writable()
+
+
+class FrameReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.client, self.server = socket.socketpair()
+        self.stream = self.client.makefile('rb', 0)
+
+    def tearDown(self):
+        self.stream.close()
+        self.client.close()
+        self.server.close()
+
+    def test_multiple_frames(self):
+        reader = FrameReader()
+        payloads = [b'', b'a', b'hello', bytes(range(200))]
+        self.server.sendall(b''.join(make_frame(p) for p in payloads))
+        for payload in payloads:
+            self.assertEqual(reader.read_frame(self.stream), payload)
+        self.assertIsNone(reader.read_frame(self.stream, timeout=0))
+
+    def test_partial_frame(self):
+        reader = FrameReader()
+        frame = make_frame(b'0123456789' * 20)
+        self.server.sendall(frame[:7])
+        self.assertIsNone(reader.read_frame(self.stream, timeout=0.01))
+        self.server.sendall(frame[7:])
+        self.assertEqual(reader.read_frame(self.stream, timeout=1), frame[2:])
+
+    def test_buffer_growth(self):
+        reader = FrameReader(size=16)
+        payloads = [bytes(10), b'x' * 1000, bytes(range(256)) * 9]
+        for payload in payloads:
+            self.server.sendall(make_frame(payload))
+            self.assertEqual(reader.read_frame(self.stream, timeout=1),
+                             payload)
+
+    def test_compaction(self):
+        reader = FrameReader(size=64)
+        for i in range(100):
+            payload = bytes([i]) * (i % 40)
+            self.server.sendall(make_frame(payload))
+            self.assertEqual(reader.read_frame(self.stream, timeout=1),
+                             payload)
+
+    def test_transform_pending(self):
+        reader = FrameReader()
+        self.server.sendall(make_frame(b'abc') + make_frame(b'def'))
+        self.assertEqual(reader.read_frame(self.stream, timeout=1), b'abc')
+        reader.transform_pending(lambda data: data.tobytes().upper())
+        # The length prefix is also transformed, but is unaffected by upper().
+        self.assertEqual(reader.read_frame(self.stream, timeout=1), b'DEF')
+
+    def test_eof(self):
+        reader = FrameReader()
+        self.server.sendall(make_frame(b'abc')[:2])
+        self.server.close()
+        with self.assertRaises(EOFError):
+            reader.read_frame(self.stream, timeout=1)
+
+    def test_max_frame_length(self):
+        reader = FrameReader(size=16)
+        length = PacketBuffer()
+        VarInt.send(2 ** 21, length)
+        self.server.sendall(length.get_writable())
+        with self.assertRaisesRegex(ValueError, 'exceeds the maximum'):
+            reader.read_frame(self.stream, timeout=1)
+        self.assertEqual(len(reader._buffer), 16)
+
+    def test_wakeup(self):
+        reader = FrameReader()
+        wakeup = _Wakeup()
+        self.addCleanup(wakeup.close)
+        timer = threading.Timer(0.01, wakeup.set)
+        timer.start()
+        self.assertIsNone(reader.read_frame(self.stream, None, wakeup))
+        timer.join()
+
+        # A frame already received is returned even if woken.
+        self.server.sendall(make_frame(b'abc'))
+        self.assertEqual(reader.read_frame(self.stream, None, wakeup), b'abc')
+        self.assertIsNone(reader.read_frame(self.stream, None, wakeup))
+
+        wakeup.clear()
+        self.assertIsNone(reader.read_frame(self.stream, 0, wakeup))
+        self.server.sendall(make_frame(b'def'))
+        self.assertEqual(reader.read_frame(self.stream, None, wakeup), b'def')
+
+
+class PacketViewTest(unittest.TestCase):
+    def test_read(self):
+        view = PacketView(memoryview(b'hello world'))
+        self.assertEqual(view.read(5), b'hello')
+        self.assertFalse(view.is_eof())
+        self.assertEqual(view.read(), b' world')
+        self.assertTrue(view.is_eof())
+        self.assertEqual(view.read(1), b'')
+        view.reset_cursor()
+        self.assertEqual(view.recv(), b'hello world')
+        self.assertEqual(view.get_writable(), b'hello world')
+
+
+class SendFramesTest(unittest.TestCase):
+    frames = [b'abc', b'', bytearray(b'defg'), memoryview(b'h' * 5000)]
+
+    def test_sendmsg(self):
+        client, server = socket.socketpair()
+        received = []
+        thread = threading.Thread(
+            target=lambda: received.append(server.makefile('rb').read()))
+        thread.start()
+        try:
+            send_frames(client, self.frames * 1000)
+            client.shutdown(socket.SHUT_WR)
+            thread.join()
+        finally:
+            client.close()
+            server.close()
+        self.assertEqual(received, [b''.join(self.frames) * 1000])
+
+    def test_sendall(self):
+        buffer = PacketBuffer()
+        send_frames(buffer, self.frames)
+        self.assertEqual(buffer.get_writable(), b''.join(self.frames))
@@ -0,0 +1,133 @@
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection, ConnectionContext
+from minecraft.networking.metrics import (
+    ConnectionMetrics, Histogram, MetricsRegistry, INCOMING, OUTGOING,
+)
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server, test_connection
+
+
+class HistogramTest(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram(bounds=(1, 2, 5))
+        for value in 0.5, 1, 1.5, 3, 10:
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.cumulative_counts(),
+                         [(1, 2), (2, 3), (5, 4), (float('inf'), 5)])
+        self.assertEqual((histogram.sum, histogram.count), (16, 5))
+
+        other = Histogram(bounds=(1, 2, 5))
+        other.observe(2)
+        histogram.merge(other)
+        self.assertEqual(histogram.counts, [2, 2, 1, 1])
+        with self.assertRaises(ValueError):
+            histogram.merge(Histogram(bounds=(1, 2)))
+
+
+class ConnectionMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.context = ConnectionContext(
+            protocol_version=SUPPORTED_PROTOCOL_VERSIONS[-1])
+
+    def test_record_outgoing(self):
+        metrics = ConnectionMetrics()
+        chat = serverbound.play.ChatPacket(self.context, message='x' * 100)
+        raw = chat.serialize()
+        compressed = chat.serialize(compression_threshold=16)
+        uncompressed = chat.serialize(compression_threshold=1000)
+        self.assertLess(len(compressed), len(raw))
+
+        metrics.record_outgoing(chat, raw, False)
+        metrics.record_outgoing(chat, compressed, True)
+        metrics.record_outgoing(chat, uncompressed, True)
+        self.assertEqual(metrics.packets,
+                         {(OUTGOING, serverbound.play.ChatPacket): 3})
+        # Each frame has a 1-byte length prefix, and the compressed frames a
+        # 1-byte uncompressed length.
+        raw_size = len(raw) - 1
+        self.assertEqual(metrics.bytes[OUTGOING, 'raw'], 3 * raw_size)
+        self.assertEqual(metrics.bytes[OUTGOING, 'wire'],
+                         raw_size + len(compressed) + len(uncompressed) - 2)
+
+    def test_keep_alive(self):
+        metrics = ConnectionMetrics()
+        metrics.record_incoming(clientbound.play.KeepAlivePacket(
+            self.context, keep_alive_id=5), 10, 10)
+        response = serverbound.play.KeepAlivePacket(
+            self.context, keep_alive_id=5)
+        metrics.record_outgoing(response, response.serialize(), False)
+        metrics.record_outgoing(response, response.serialize(), False)
+        self.assertEqual(metrics.keep_alive_seconds.count, 1)
+        self.assertEqual(metrics.bytes[INCOMING, 'wire'], 10)
+
+    def test_to_prometheus(self):
+        metrics = ConnectionMetrics()
+        metrics.record_incoming(clientbound.play.KeepAlivePacket(
+            self.context, keep_alive_id=5), 10, 12)
+        metrics.ping_seconds.observe(0.003)
+        metrics.record_queue_depth(7)
+        metrics.record_queue_depth(2)
+        lines = metrics.to_prometheus(labels={'bot': 'a"b'}).splitlines()
+
+        self.assertIn('# TYPE pycraft_packets_total counter', lines)
+        self.assertIn('pycraft_packets_total{bot="a\\"b",direction="incoming",'
+                      'packet="KeepAlivePacket"} 1', lines)
+        self.assertIn('pycraft_bytes_total{bot="a\\"b",direction="incoming",'
+                      'encoding="raw"} 12', lines)
+        self.assertIn('pycraft_outgoing_queue_depth{bot="a\\"b"} 2', lines)
+        self.assertIn('pycraft_max_outgoing_queue_depth{bot="a\\"b"} 7',
+                      lines)
+        self.assertIn('# TYPE pycraft_ping_seconds histogram', lines)
+        self.assertIn('pycraft_ping_seconds_bucket{bot="a\\"b",le="0.0025"} 0',
+                      lines)
+        self.assertIn('pycraft_ping_seconds_bucket{bot="a\\"b",le="0.005"} 1',
+                      lines)
+        self.assertIn('pycraft_ping_seconds_bucket{bot="a\\"b",le="+Inf"} 1',
+                      lines)
+        self.assertIn('pycraft_ping_seconds_count{bot="a\\"b"} 1', lines)
+
+
+class MetricsConnectTest(fake_server._FakeServerTest):
+    """ Connects with metrics enabled and compression, and checks the metrics
+        recorded.
+    """
+    compression_threshold = 8
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+
+    def test_connect(self):
+        registry = MetricsRegistry()
+        connections = []
+
+        def connection_type(*args, **kwds):
+            connections.append(Connection(*args, metrics=registry, **kwds))
+            return connections[-1]
+        self._test_connect(connection_type=connection_type)
+
+        total = registry.total()
+        packets = total.packets
+        self.assertEqual(packets[INCOMING, clientbound.play.JoinGamePacket],
+                         1)
+        self.assertEqual(packets[INCOMING, clientbound.play.KeepAlivePacket],
+                         1)
+        self.assertEqual(packets[OUTGOING, serverbound.play.KeepAlivePacket],
+                         1)
+        self.assertEqual(total.keep_alive_seconds.count, 1)
+        self.assertGreater(total.bytes[INCOMING, 'raw'],
+                           total.bytes[INCOMING, 'wire'])
+        self.assertGreater(total.seconds['decode'], 0)
+        self.assertGreater(total.seconds['reactor'], 0)
+
+        text = registry.to_prometheus(per_connection=True)
+        self.assertIn('pycraft_packets_total{connection="TestUser",'
+                      'direction="outgoing",packet="KeepAlivePacket"} 1',
+                      text.splitlines())
+
+        # Removed connections are still counted in the totals.
+        registry.remove(connections[0].metrics)
+        self.assertEqual(registry.to_prometheus(per_connection=True).count(
+            'connection='), 0)
+        self.assertEqual(registry.total().packets, packets)
@@ -0,0 +1,197 @@
+import socket
+import sys
+import threading
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection
+from minecraft.networking.multiplexer import Multiplexer
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server, test_connection
+
+
+class MultiplexerTest(unittest.TestCase):
+    """ Connects several clients, run by a single 'Multiplexer', to a
+        'FakeServer' which handles them one after another as in 'ConnectTest'.
+    """
+    num_clients = 3
+    client_versions = None
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+
+    def test_connect(self):
+        server = fake_server.FakeServer(
+            client_handler_type=self.client_handler_type, test_case=self)
+        port = server.listen_socket.getsockname()[1]
+
+        server_exc_info = []
+
+        def run_server():
+            try:
+                server.run()
+            except Exception:
+                server_exc_info.append(sys.exc_info())
+        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread.start()
+
+        multiplexer = Multiplexer()
+        self.events = []
+        clients = []
+        for i in range(self.num_clients):
+            client = Connection(
+                'localhost', port, username='TestUser%d' % i,
+                allowed_versions=self.client_versions,
+                handle_exit=lambda i=i: self.events.append(('exit', i)))
+            multiplexer.add(client)
+            self._start_client(client, i)
+            clients.append(client)
+
+        multiplexer_thread = threading.Thread(
+            target=multiplexer.run, daemon=True)
+        multiplexer_thread.start()
+        multiplexer_thread.join(fake_server.THREAD_TIMEOUT_S * 2)
+        server.stop()
+        server_thread.join(fake_server.THREAD_TIMEOUT_S)
+
+        if server_exc_info:
+            exc_value, exc_tb = server_exc_info[0][1:]
+            raise exc_value.with_traceback(exc_tb)
+        self.assertFalse(multiplexer_thread.is_alive())
+        self._check_events(dict(enumerate(clients)))
+
+    def _start_client(self, client, i):
+        def handle_join_game(packet):
+            self.events.append(('join game', i))
+        client.register_packet_listener(
+            handle_join_game, clientbound.play.JoinGamePacket)
+        client.connect()
+
+    def _check_events(self, clients):
+        for i, client in clients.items():
+            self.assertIn(('join game', i), self.events)
+            self.assertLess(self.events.index(('join game', i)),
+                            self.events.index(('exit', i)))
+            self.assertIsNone(client.networking_thread)
+            self.assertFalse(client.connected)
+
+
+class MultiplexerKnownVersionTest(MultiplexerTest):
+    client_versions = {SUPPORTED_PROTOCOL_VERSIONS[-1]}
+
+
+class MultiplexerExceptionTest(MultiplexerTest):
+    """ An exception raised in one connection should be passed to its exception
+        handlers, without affecting the other connections.
+    """
+    class CustomException(Exception):
+        pass
+
+    def _start_client(self, client, i):
+        if i != 1:
+            return super(MultiplexerExceptionTest, self)._start_client(
+                client, i)
+
+        @client.listener(clientbound.play.JoinGamePacket)
+        def handle_join_game(packet):
+            raise self.CustomException
+
+        @client.exception_handler(self.CustomException)
+        def handle_custom_exception(exc, exc_info):
+            self.events.append(('exception', i))
+
+        client.connect()
+
+    def _check_events(self, clients):
+        self.assertIn(('exception', 1), self.events)
+        self.assertNotIn(('exit', 1), self.events)
+        self.assertFalse(clients.pop(1).connected)
+        super(MultiplexerExceptionTest, self)._check_events(clients)
+
+    class client_handler_type(test_connection.ConnectTest.client_handler_type):
+        def handle_abnormal_disconnect(self, exc):
+            return True
+
+
+class MultiplexerSlowPeerTest(unittest.TestCase):
+    """ A connection whose server has stopped reading should not prevent the
+        other connections run by the same 'Multiplexer' from making progress.
+    """
+    num_chat_packets = 600
+    buffer_size = 8192
+
+    class client_handler_type(test_connection.ConnectTest.client_handler_type):
+        def handle_play_start(self):
+            test_case = self.server.test_case
+            if self.user_name != 'Slow':
+                test_case.slow_writing.wait(fake_server.THREAD_TIMEOUT_S)
+                return super(MultiplexerSlowPeerTest.client_handler_type,
+                             self).handle_play_start()
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                   test_case.buffer_size)
+            fake_server.FakeClientHandler.handle_play_start(self)
+            # Stop reading until the other connection has finished.
+            test_case.released = test_case.fast_exited.wait(
+                fake_server.THREAD_TIMEOUT_S)
+
+        def handle_play_packet(self, packet):
+            if self.user_name != 'Slow':
+                return super(MultiplexerSlowPeerTest.client_handler_type,
+                             self).handle_play_packet(packet)
+            if isinstance(packet, serverbound.play.ChatPacket) and \
+                    packet.message == 'last':
+                raise fake_server.FakeServerDisconnect
+
+    def test_connect(self):
+        server = fake_server.FakeServer(
+            client_handler_type=self.client_handler_type, test_case=self,
+            concurrent=True)
+        port = server.listen_socket.getsockname()[1]
+        self.slow_writing = threading.Event()
+        self.fast_exited = threading.Event()
+        self.released = None
+
+        server_exc_info = []
+
+        def run_server():
+            try:
+                server.run()
+            except Exception:
+                server_exc_info.append(sys.exc_info())
+        server_thread = threading.Thread(target=run_server, daemon=True)
+        server_thread.start()
+
+        multiplexer = Multiplexer()
+        slow = Connection('localhost', port, username='Slow')
+        multiplexer.add(slow)
+
+        @slow.listener(clientbound.play.JoinGamePacket)
+        def handle_join_game(packet):
+            slow.networking_thread.socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, self.buffer_size)
+            # Queue more data than the sockets' buffers can hold.
+            message = 'x' * 256
+            for i in range(self.num_chat_packets):
+                slow.write_packet(serverbound.play.ChatPacket(message=message))
+            slow.write_packet(serverbound.play.ChatPacket(message='last'))
+            self.slow_writing.set()
+        slow.connect()
+
+        fast = Connection('localhost', port, username='Fast',
+                          handle_exit=self.fast_exited.set)
+        multiplexer.add(fast)
+        fast.connect()
+
+        multiplexer_thread = threading.Thread(
+            target=multiplexer.run, daemon=True)
+        multiplexer_thread.start()
+        multiplexer_thread.join(fake_server.THREAD_TIMEOUT_S * 2)
+        server.stop()
+        server_thread.join(fake_server.THREAD_TIMEOUT_S)
+
+        if server_exc_info:
+            exc_value, exc_tb = server_exc_info[0][1:]
+            raise exc_value.with_traceback(exc_tb)
+        self.assertTrue(self.released)
+        self.assertFalse(multiplexer_thread.is_alive())
+        self.assertFalse(slow.connected)
+        self.assertFalse(fast.connected)
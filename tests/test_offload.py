@@ -0,0 +1,151 @@
+import threading
+import unittest
+
+from minecraft.networking.connection import Connection
+from minecraft.networking.offload import ListenerExecutor, OffloadedListener
+from minecraft.networking.outgoing import OutgoingQueue
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server, test_connection
+
+
+class ListenerExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = ListenerExecutor(max_workers=4, max_pending=16)
+        self.connections = [
+            Connection('localhost', username='User%d' % i, metrics=True,
+                       listener_executor=self.executor) for i in range(3)]
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_ordering(self):
+        calls = {connection: [] for connection in self.connections}
+        running = set()
+        lock = threading.Lock()
+
+        def callback(connection):
+            def call(packet):
+                with lock:
+                    self.assertNotIn(connection, running)
+                    running.add(connection)
+                calls[connection].append(packet)
+                with lock:
+                    running.remove(connection)
+            return call
+
+        for i in range(500):
+            for connection in self.connections:
+                self.executor.submit(connection, callback(connection), i)
+        self.assertTrue(self.executor.join(fake_server.THREAD_TIMEOUT_S))
+        for connection in self.connections:
+            self.assertEqual(calls[connection], list(range(500)))
+            self.assertLessEqual(
+                connection.metrics.max_offloaded_queue_depth, 16)
+
+    def test_backpressure(self):
+        executor = ListenerExecutor(max_workers=1, max_pending=1)
+        self.addCleanup(executor.shutdown)
+        connection = self.connections[0]
+        release = threading.Event()
+        executor.submit(connection, lambda packet: release.wait(), None)
+
+        submitted = threading.Event()
+
+        def submit():
+            executor.submit(connection, lambda packet: None, None)
+            submitted.set()
+        thread = threading.Thread(target=submit, daemon=True)
+        thread.start()
+        self.assertFalse(submitted.wait(0.1))
+        release.set()
+        self.assertTrue(submitted.wait(fake_server.THREAD_TIMEOUT_S))
+        self.assertTrue(executor.join(fake_server.THREAD_TIMEOUT_S))
+        self.assertGreater(connection.metrics.offload_wait_seconds, 0)
+
+    def test_no_wait(self):
+        executor = ListenerExecutor(max_workers=1, max_pending=1)
+        self.addCleanup(executor.shutdown)
+        connection = Connection('localhost', username='User',
+                                listener_executor=executor)
+        connection._outgoing_packet_queue = OutgoingQueue(max_size=1)
+
+        # An offloaded listener does not wait for room in the outgoing queue,
+        # which the networking thread may be unable to make while waiting to
+        # offload another call.
+        def write_packets(packet):
+            for i in range(3):
+                connection.write_packet(
+                    serverbound.play.ChatPacket(message=str(i)))
+        executor.submit(connection, write_packets, None)
+        self.assertTrue(executor.join(fake_server.THREAD_TIMEOUT_S))
+        connection._raise_offloaded_exception()
+        self.assertEqual(len(connection._outgoing_packet_queue), 3)
+
+        # Nor does a call offloaded with the write lock held wait for the
+        # executor.
+        release = threading.Event()
+        executor.submit(connection, lambda packet: release.wait(), None)
+        with connection._write_lock:
+            OffloadedListener(connection, lambda packet: None, True)(None)
+        release.set()
+        self.assertTrue(executor.join(fake_server.THREAD_TIMEOUT_S))
+        self.assertFalse(connection._write_lock.held())
+
+    def test_exception(self):
+        connection = self.connections[0]
+
+        def callback(packet):
+            raise ValueError(packet)
+        self.executor.submit(connection, callback, 'first')
+        self.executor.submit(connection, callback, 'second')
+        self.assertTrue(self.executor.join(fake_server.THREAD_TIMEOUT_S))
+        with self.assertRaisesRegex(ValueError, 'first'):
+            connection._raise_offloaded_exception()
+        connection._raise_offloaded_exception()
+
+    def test_early(self):
+        with self.assertRaises(ValueError):
+            self.connections[0].register_packet_listener(
+                lambda packet: None, clientbound.play.JoinGamePacket,
+                early=True, offload=True)
+
+
+class OffloadConnectTest(fake_server._FakeServerTest):
+    """ Connects with an offloaded listener which does not return until the
+        response to a later keep-alive packet has been written, which would
+        never happen if it were called in the networking thread.
+    """
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+
+    def test_connect(self):
+        keep_alive_written = threading.Event()
+        connections, results = [], []
+
+        def handle_join_game(packet):
+            results.append((threading.current_thread().name,
+                            keep_alive_written.wait(
+                                fake_server.THREAD_TIMEOUT_S)))
+
+        def connection_type(*args, **kwds):
+            connection = Connection(*args, **kwds)
+            connection.register_packet_listener(
+                handle_join_game, clientbound.play.JoinGamePacket,
+                offload=True)
+            connection.register_packet_listener(
+                lambda packet: keep_alive_written.set(),
+                serverbound.play.KeepAlivePacket, outgoing=True)
+            self.addCleanup(connection.listener_executor.shutdown)
+            connections.append(connection)
+            return connection
+        self._test_connect(connection_type=connection_type)
+        self.assertTrue(connections[0].listener_executor.join(
+            fake_server.THREAD_TIMEOUT_S))
+
+        thread_name, waited = results[0]
+        self.assertNotEqual(thread_name, 'Networking Thread')
+        self.assertTrue(waited)
+
+
+if __name__ == '__main__':
+    unittest.main()
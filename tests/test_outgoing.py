@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.async_connection import AsyncConnection
+from minecraft.networking.connection import Connection, ConnectionContext
+from minecraft.networking.metrics import ConnectionMetrics
+from minecraft.networking.outgoing import (
+    OutgoingQueue, BLOCK, DROP_OLDEST, COALESCE, MOVEMENT_PACKETS,
+)
+from minecraft.networking.packets import clientbound, serverbound
+
+from . import fake_server
+
+
+class Chat(object):
+    def __init__(self, message):
+        self.message = message
+
+
+class Position(Chat):
+    pass
+
+
+class OutgoingQueueTest(unittest.TestCase):
+    def test_priority(self):
+        queue = OutgoingQueue(max_size=2)
+        queue.put(1)
+        queue.put(2)
+        for packet in 'a', 'b', 'c':
+            queue.put(packet, priority=True)
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(queue.popleft(), 'a')
+        self.assertEqual(queue.pop_batch(3), ['b', 'c', 1])
+        self.assertEqual(queue.pop_batch(3), [2])
+        self.assertFalse(queue)
+        with self.assertRaises(IndexError):
+            queue.popleft()
+
+    def test_drop_oldest(self):
+        metrics = ConnectionMetrics()
+        queue = OutgoingQueue(3, DROP_OLDEST, metrics)
+        for packet in range(5):
+            queue.put(packet)
+        self.assertEqual(queue.pop_batch(10), [2, 3, 4])
+        self.assertEqual(metrics.outgoing_overflow['dropped'], 2)
+
+    def test_coalesce(self):
+        metrics = ConnectionMetrics()
+        queue = OutgoingQueue(3, COALESCE, metrics)
+        packets = [Position(1), Chat('a'), Position(2), Position(3)]
+        for packet in packets:
+            queue.put(packet, may_wait=False)
+        # The last position replaced the previous one, in place.
+        self.assertEqual(list(queue.pop_batch(10)),
+                         [packets[0], packets[1], packets[3]])
+        self.assertEqual(metrics.outgoing_overflow['coalesced'], 1)
+
+        # With no packet of the same class, the queue may exceed its size.
+        for packet in packets[:1] + packets[2:] + [Chat('b')]:
+            queue.put(packet, may_wait=False)
+        self.assertEqual(len(queue), 4)
+
+    def test_coalesce_packets(self):
+        context = ConnectionContext(
+            protocol_version=SUPPORTED_PROTOCOL_VERSIONS[-1])
+        metrics = ConnectionMetrics()
+        queue = OutgoingQueue(3, DROP_OLDEST, metrics, MOVEMENT_PACKETS)
+
+        def position(x):
+            return serverbound.play.PlayerPositionPacket(
+                context, x=x, feet_y=64, z=0, on_ground=True)
+        chat = serverbound.play.ChatPacket(context, message='hi')
+        for packet in position(1), chat, position(2), position(3):
+            queue.put(packet)
+        batch = queue.pop_batch(10)
+        self.assertEqual([type(p) for p in batch],
+                         [serverbound.play.PlayerPositionPacket,
+                          serverbound.play.ChatPacket])
+        self.assertEqual(batch[0].x, 3)
+        self.assertEqual(metrics.outgoing_coalesced, 2)
+
+        # Once written, a packet is no longer replaced.
+        queue.put(position(4))
+        self.assertEqual(queue.popleft().x, 4)
+        queue.put(position(5))
+        self.assertEqual(queue.popleft().x, 5)
+
+        # A dropped packet is no longer replaced either.
+        for packet in position(6), chat, chat, chat, position(7):
+            queue.put(packet)
+        self.assertEqual([getattr(p, 'x', None) for p in queue.pop_batch(10)],
+                         [None, None, 7])
+        self.assertEqual(metrics.outgoing_overflow['dropped'], 2)
+
+    def test_async_coalesce_packets(self):
+        async def write_packets():
+            connection = AsyncConnection(
+                'localhost', username='User',
+                coalesce_packets=MOVEMENT_PACKETS)
+            first = connection.write_packet(
+                serverbound.play.PlayerPositionPacket(x=1))
+            chat = connection.write_packet(
+                serverbound.play.ChatPacket(message='hi'))
+            second = connection.write_packet(
+                serverbound.play.PlayerPositionPacket(x=2))
+            self.assertIs(first, second)
+            self.assertIsNot(first, chat)
+            queue = connection._outgoing_packet_queue
+            self.assertEqual(len(queue), 2)
+            self.assertEqual(queue[0][0].x, 2)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(write_packets())
+        finally:
+            loop.close()
+
+    def test_block(self):
+        metrics = ConnectionMetrics()
+        queue = OutgoingQueue(1, BLOCK, metrics)
+        queue.put(1)
+        added = threading.Event()
+
+        def put():
+            queue.put(2)
+            added.set()
+        threading.Thread(target=put, daemon=True).start()
+        self.assertFalse(added.wait(0.05))
+        self.assertEqual(queue.popleft(), 1)
+        self.assertTrue(added.wait(fake_server.THREAD_TIMEOUT_S))
+        self.assertEqual(metrics.outgoing_overflow['blocked'], 1)
+        self.assertGreater(metrics.outgoing_wait_seconds, 0)
+
+        # Closing the queue releases any waiting callers.
+        added.clear()
+        threading.Thread(target=put, daemon=True).start()
+        self.assertFalse(added.wait(0.05))
+        queue.close()
+        self.assertTrue(added.wait(fake_server.THREAD_TIMEOUT_S))
+        self.assertEqual(queue.pop_batch(10), [2, 2])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            OutgoingQueue(policy='wait')
+        with self.assertRaises(ValueError):
+            Connection('localhost', username='User', queue_policy='wait')
+
+
+class BoundedQueueConnectTest(fake_server._FakeServerTest):
+    """ Connects with a small outgoing queue, which is overfilled by a packet
+        listener in the networking thread, and checks that this never waits,
+        and that the keep-alive response and the newest packets are written.
+    """
+    class client_handler_type(fake_server.FakeClientHandler):
+        def handle_play_start(self):
+            super(BoundedQueueConnectTest.client_handler_type, self) \
+                .handle_play_start()
+            self.write_packet(clientbound.play.KeepAlivePacket(
+                keep_alive_id=1223334444))
+
+        def handle_play_packet(self, packet):
+            received = self.server.test_case.received
+            if isinstance(packet, serverbound.play.KeepAlivePacket):
+                received.append(packet.keep_alive_id)
+            elif isinstance(packet, serverbound.play.ChatPacket):
+                received.append(packet.message)
+            if len(received) == 5:
+                raise fake_server.FakeServerDisconnect
+
+    def test_connect(self):
+        self.received, connections = [], []
+
+        def connection_type(*args, **kwds):
+            connection = Connection(
+                *args, metrics=True, max_queue_size=4,
+                queue_policy=DROP_OLDEST, **kwds)
+
+            def handle_join_game(packet):
+                for i in range(20):
+                    connection.write_packet(
+                        serverbound.play.ChatPacket(message=str(i)))
+            connection.register_packet_listener(
+                handle_join_game, clientbound.play.JoinGamePacket)
+            connections.append(connection)
+            return connection
+        self._test_connect(connection_type=connection_type)
+
+        self.assertEqual(sorted(self.received, key=str),
+                         [1223334444, '16', '17', '18', '19'])
+        metrics = connections[0].metrics
+        self.assertEqual(metrics.outgoing_overflow['dropped'], 16)
+        self.assertEqual(metrics.packets[
+            'outgoing', serverbound.play.KeepAlivePacket], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
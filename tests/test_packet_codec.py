@@ -0,0 +1,118 @@
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import (
+    Packet, PacketBuffer, PacketView, PacketCodec, clientbound
+)
+from minecraft.networking.types import (
+    Boolean, Byte, Short, Integer, Long, Float, Double, VarInt, String,
+    Angle, FixedPoint, Position, UUID,
+)
+
+
+class ExamplePacket(Packet):
+    id = 0x42
+    definition = [
+        {'entity_id': VarInt},
+        {'x': Double, 'y': Double, 'z': Double},
+        {'yaw': Angle},
+        {'delta': FixedPoint(Short, 12)},
+        {'on-ground': Boolean},
+        {'name': String},
+        {'location': Position},
+        {'count': Byte},
+        {'class': Integer},
+        {'time': Long},
+        {'health': Float},
+        {'uuid': UUID},
+    ]
+
+    values = {
+        'entity_id': 300, 'x': 1.5, 'y': -64.25, 'z': 1e6, 'yaw': 90.0,
+        'delta': -0.5, 'on-ground': True, 'name': 'Steve',
+        'location': Position(1, 2, 3), 'count': -7, 'class': 123456789,
+        'time': -2**40, 'health': 20.0,
+        'uuid': '12345678-1234-5678-1234-567812345678',
+    }
+
+    def write_fields_interpreted(self, packet_buffer):
+        for field in self.definition:
+            for var_name, data_type in field.items():
+                data_type.send_with_context(
+                    getattr(self, var_name), packet_buffer, self.context)
+
+
+class PacketCodecTest(unittest.TestCase):
+    def setUp(self):
+        self.context = ConnectionContext(
+            protocol_version=SUPPORTED_PROTOCOL_VERSIONS[-1])
+
+    def test_read_write(self):
+        packet = ExamplePacket(self.context)
+        for name, value in ExamplePacket.values.items():
+            setattr(packet, name, value)
+
+        expected = PacketBuffer()
+        packet.write_fields_interpreted(expected)
+        written = PacketBuffer()
+        packet.write_fields(written)
+        self.assertEqual(written.get_writable(), expected.get_writable())
+
+        buffer = PacketBuffer()
+        buffer.send(expected.get_writable())
+        buffer.reset_cursor()
+        deserialized = ExamplePacket(self.context)
+        deserialized.read(buffer)
+        self.assertTrue(buffer.is_eof())
+        for name, value in ExamplePacket.values.items():
+            self.assertEqual(getattr(deserialized, name), value, name)
+
+        # Fixed-width fields are unpacked directly from a 'PacketView'.
+        view = PacketView(expected.get_writable())
+        deserialized = ExamplePacket(self.context)
+        deserialized.read(view)
+        self.assertTrue(view.is_eof())
+        for name, value in ExamplePacket.values.items():
+            self.assertEqual(getattr(deserialized, name), value, name)
+
+    def test_fixed_width(self):
+        buffer = bytearray(40)
+        offset = Double.pack_into(buffer, 2, -64.25)
+        offset = Short.pack_into(buffer, offset, -340)
+        offset = UUID.pack_into(
+            buffer, offset, ExamplePacket.values['uuid'])
+        self.assertEqual(offset, 28)
+
+        self.assertEqual(Double.unpack_from(buffer, 2), (-64.25, 10))
+        self.assertEqual(Short.unpack_from(buffer, 10), (-340, 12))
+        self.assertEqual(UUID.unpack_from(buffer, 12),
+                         (ExamplePacket.values['uuid'], 28))
+        self.assertEqual(Short.struct.size, 2)
+
+        view = PacketView(buffer)
+        view.read(2)
+        self.assertEqual(Double.read(view), -64.25)
+        self.assertEqual(Short.read(view), -340)
+        self.assertEqual(UUID.read(view), ExamplePacket.values['uuid'])
+        self.assertEqual(view.offset, 28)
+
+    def test_write(self):
+        packet = clientbound.play.EntityLookPacket(
+            self.context, entity_id=5, yaw=45.0, pitch=180.0, on_ground=False)
+        buffer = PacketBuffer()
+        packet.write_fields(buffer)
+        self.assertEqual(buffer.get_writable(), b'\x05\x20\x80\x00')
+
+    def test_cache(self):
+        packet = ExamplePacket(self.context)
+        self.assertIs(PacketCodec.get(packet), PacketCodec.get(packet))
+
+        packet.definition = [{'value': VarInt}]
+        self.assertIsNot(PacketCodec.get(packet),
+                         PacketCodec.get(ExamplePacket(self.context)))
+        buffer = PacketBuffer()
+        VarInt.send(1000, buffer)
+        buffer.reset_cursor()
+        packet.read(buffer)
+        self.assertEqual(packet.value, 1000)
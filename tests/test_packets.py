@@ -6,6 +6,11 @@ import struct
 from zlib import decompress
 from random import choice
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from minecraft.utility import protocol_earlier
 from minecraft import (
     PRE, SUPPORTED_PROTOCOL_VERSIONS, RELEASE_PROTOCOL_VERSIONS,
@@ -15,8 +20,8 @@ from minecraft.networking.types import (
     VarInt, Enum, Vector, PositionAndLook, OriginPoint,
 )
 from minecraft.networking.packets import (
-    Packet, PacketBuffer, PacketListener, KeepAlivePacket, serverbound,
-    clientbound
+    Packet, PacketBuffer, PacketView, PacketListener, KeepAlivePacket,
+    serverbound, clientbound, packet_registry
 )
 
 TEST_VERSIONS = list(RELEASE_PROTOCOL_VERSIONS)
@@ -72,6 +77,47 @@ class PacketSerializationTest(unittest.TestCase):
 
             self.assertEqual(packet.message, deserialized.message)
 
+    def test_serialize(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        packet = serverbound.play.ChatPacket(context, message='x' * 300)
+        for compression_threshold in None, -1, 20:
+            packet_buffer = PacketBuffer()
+            packet.write(packet_buffer, compression_threshold)
+            self.assertEqual(packet.serialize(compression_threshold),
+                             packet_buffer.get_writable())
+
+    def test_compression_level(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        packet = serverbound.play.ChatPacket(context, message='abc' * 100)
+        payload = packet.serialize()[2:]
+        sizes = []
+        for level in 0, 1, 9:
+            packet_buffer = PacketBuffer()
+            packet.write(packet_buffer, 20, compression_level=level)
+            sizes.append(len(packet_buffer.get_writable()))
+
+            packet_buffer.reset_cursor()
+            VarInt.read(packet_buffer)
+            self.assertEqual(VarInt.read(packet_buffer), len(payload))
+            self.assertEqual(decompress(packet_buffer.read()), payload)
+        self.assertGreater(sizes[0], sizes[1])
+        self.assertGreaterEqual(sizes[1], sizes[2])
+
+    def test_read_lazily(self):
+        context = ConnectionContext(protocol_version=TEST_VERSIONS[-1])
+        packet = serverbound.play.ChatPacket(context, message='hello')
+        packet_buffer = PacketBuffer()
+        packet.write_fields(packet_buffer)
+
+        packet_buffer.reset_cursor()
+        deserialized = serverbound.play.ChatPacket(context)
+        deserialized.read_lazily(packet_buffer)
+        self.assertNotIn('message', vars(deserialized))
+        self.assertEqual(deserialized.message, 'hello')
+        self.assertEqual(deserialized.decode().message, 'hello')
+        with self.assertRaises(AttributeError):
+            deserialized.nonexistent_field
+
     def test_compressed_packet(self):
         for protocol_version in TEST_VERSIONS:
             logging.debug('protocol_version = %r' % protocol_version)
@@ -133,6 +179,39 @@ class PacketListenerTest(unittest.TestCase):
             listener.call_packet(packet)
             listener.call_packet(uncalled_packet)
 
+            self.assertTrue(listener.listens_to(serverbound.play.ChatPacket))
+            self.assertFalse(listener.listens_to(KeepAlivePacket))
+
+
+class PacketRegistryTest(unittest.TestCase):
+    def test_packet_table(self):
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol_version)
+            table = packet_registry.get_packet_table(
+                clientbound.play.get_packets, context)
+            self.assertEqual(table, {
+                packet.get_id(context): packet
+                for packet in clientbound.play.get_packets(context)})
+            self.assertIs(table, packet_registry.get_packet_table(
+                clientbound.play.get_packets,
+                ConnectionContext(protocol_version=protocol_version)))
+
+    def test_plugin_table(self):
+        for enable_fml in False, True:
+            context = ConnectionContext(
+                protocol_version=TEST_VERSIONS[-1], enable_fml=enable_fml)
+            table = packet_registry.get_packet_table(
+                clientbound.plugins.get_packets, context, key='get_channel')
+            self.assertEqual(table, {
+                packet.get_channel(context): packet
+                for packet in clientbound.plugins.get_packets(context)})
+
+    def test_packet_id(self):
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(protocol_version=protocol_version)
+            packet = serverbound.play.ChatPacket(context)
+            self.assertEqual(packet.id, packet.get_id(context))
+
 
 class PacketEnumTest(unittest.TestCase):
     def test_packet_str(self):
@@ -262,6 +341,52 @@ class TestReadWritePackets(unittest.TestCase):
 
             self._test_read_write_packet(packet, context)
 
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_multi_block_change_packet_numpy(self):
+        Record = clientbound.play.MultiBlockChangePacket.Record
+        for protocol_version in TEST_VERSIONS:
+            context = ConnectionContext(
+                protocol_version=protocol_version, numpy_arrays=True)
+            records = [(1, 2, 3, 909), (15, 15, 0, 0),
+                       (0, 7, 15, 2**40) if context.protocol_later_eq(741)
+                       else (0, 255, 15, 2**30)]
+            packet = clientbound.play.MultiBlockChangePacket(context)
+            if context.protocol_later_eq(741):
+                packet.chunk_section_pos = Vector(167, 17, 33)
+                packet.invert_trust_edges = False
+            else:
+                packet.chunk_x, packet.chunk_z = 167, 17
+            packet.records = [Record(x=x, y=y, z=z, block_state_id=b)
+                              for x, y, z, b in records]
+
+            packet_buffer = PacketBuffer()
+            packet.write(packet_buffer)
+            packet_buffer.reset_cursor()
+            VarInt.read(packet_buffer)
+            VarInt.read(packet_buffer)
+            data = packet_buffer.read()
+
+            # Records are decoded in bulk from a 'PacketView', and one by one
+            # from other file objects.
+            for file_object in PacketView(data), PacketBuffer():
+                if isinstance(file_object, PacketBuffer):
+                    file_object.send(data)
+                    file_object.reset_cursor()
+                decoded = clientbound.play.MultiBlockChangePacket(context)
+                decoded.read(file_object)
+                self.assertTrue(file_object.is_eof())
+                self.assertIsInstance(decoded.records, numpy.ndarray)
+                self.assertEqual(decoded.records.tolist(), records)
+
+            # An array of records is written as a list would be.
+            packet.records = decoded.records
+            packet_buffer = PacketBuffer()
+            packet.write(packet_buffer)
+            packet_buffer.reset_cursor()
+            VarInt.read(packet_buffer)
+            VarInt.read(packet_buffer)
+            self.assertEqual(packet_buffer.read(), data)
+
     def test_spawn_object_packet(self):
         for protocol_version in TEST_VERSIONS:
             logging.debug('protocol_version = %r' % protocol_version)
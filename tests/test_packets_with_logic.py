@@ -121,6 +121,39 @@ class MapPacketTest(unittest.TestCase):
         self.assertIn(b"is", map.pixels)
         self.assertIsNotNone(str(map_set))
 
+    def test_apply_to_map(self):
+        context = ConnectionContext(protocol_version=107)
+        map = MapPacket.Map(1, width=8, height=6)
+        pixels = bytes(range(1, 13))
+        packet = self.make_map_packet(
+            context, width=4, height=3, offset=(3, 2), pixels=pixels)
+        packet.apply_to_map(map)
+
+        expected = bytearray(8 * 6)
+        for row in range(3):
+            expected[8 * (2 + row) + 3:8 * (2 + row) + 7] = \
+                pixels[4 * row:4 * row + 4]
+        self.assertEqual(map.pixels, expected)
+
+        # Rows of a patch extending past the edge of the map continue on the
+        # next row of the map, and its last row may be incomplete.
+        packet = self.make_map_packet(
+            context, width=3, height=2, offset=(6, 4), pixels=b'abcd')
+        packet.apply_to_map(map)
+        expected[38:41] = b'abc'
+        expected[46] = ord('d')
+        self.assertEqual(map.pixels, expected)
+
+        packet.offset = (6, 5)
+        with self.assertRaises(IndexError):
+            packet.apply_to_map(map)
+        self.assertEqual(len(map.pixels), 8 * 6)
+
+        with map.export() as view:
+            self.assertEqual(view.shape, (6, 8))
+            self.assertEqual(view[2, 3], 1)
+            self.assertEqual(view.tobytes(), bytes(map.pixels))
+
 
 fake_uuid = "12345678-1234-5678-1234-567812345678"
 
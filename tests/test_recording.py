@@ -0,0 +1,138 @@
+import io
+import os
+import socket
+import time
+import unittest
+
+from minecraft import SUPPORTED_PROTOCOL_VERSIONS
+from minecraft.networking.connection import Connection
+from minecraft.networking.packets import (
+    PacketBuffer, clientbound, serverbound,
+)
+from minecraft.networking.recording import (
+    PacketRecorder, PacketReplayer, INCOMING, OUTGOING, MAGIC,
+)
+from minecraft.networking.types import String, VarInt
+
+from . import fake_server, test_connection
+
+
+class RecordingTest(fake_server._FakeServerTest):
+    """ Records a session with compression enabled, and checks that it is
+        replayed correctly.
+    """
+    compression_threshold = 8
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+
+    def test_connect(self):
+        self.recording = io.BytesIO()
+        self._test_connect()
+
+        self.recording.seek(0)
+        replayer = PacketReplayer(self.recording)
+        frames = list(replayer.frames())
+        self.assertEqual(
+            [(f.direction, f.state) for f in frames[:2]],
+            [(OUTGOING, 'handshake'), (OUTGOING, 'status')])
+        self.assertEqual(
+            {f.protocol_version for f in frames},
+            {SUPPORTED_PROTOCOL_VERSIONS[-1]})
+        self.assertEqual(sorted(f.time for f in frames),
+                         [f.time for f in frames])
+
+        packets = [(frame.state, type(packet))
+                   for frame, packet in replayer.packets()]
+        self.assertIn(('login', clientbound.login.LoginSuccessPacket),
+                      packets)
+        self.assertEqual(packets[-3:], [
+            ('play', clientbound.play.JoinGamePacket),
+            ('play', clientbound.play.KeepAlivePacket),
+            ('play', clientbound.play.DisconnectPacket)])
+        self.assertIn((OUTGOING, 'play'),
+                      [(f.direction, f.state) for f in frames])
+
+    def _start_client(self, client):
+        recorder = PacketRecorder(self.recording)
+        recorder.attach(client)
+
+        @client.listener(clientbound.play.DisconnectPacket)
+        def handle_disconnect(packet):
+            recorder.close()
+        super(RecordingTest, self)._start_client(client)
+
+
+class ReplaySpeedTest(unittest.TestCase):
+    def test_speed(self):
+        recording = io.BytesIO()
+        recorder = PacketRecorder(recording)
+        connection = Connection('localhost', username='TestUser')
+
+        recorder.record_outgoing(connection, serverbound.status.RequestPacket(
+            connection.context), b'\x00')
+        time.sleep(0.1)
+        recorder.record_incoming(connection, b'\x00\x02{}')
+        recorder.close()
+
+        replayer = PacketReplayer(io.BytesIO(recording.getvalue()))
+        self.assertEqual([f.direction for f in replayer.frames()],
+                         [OUTGOING, INCOMING])
+
+        start = time.monotonic()
+        [(frame, packet)] = replayer.packets(speed=2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(frame.state, 'handshake')
+        self.assertEqual(packet.id, 0)
+
+        with self.assertRaises(ValueError):
+            PacketReplayer(io.BytesIO(b'not a recording'))
+
+
+class RecordOutgoingTest(unittest.TestCase):
+    def test_plugin_message(self):
+        # The channel of a plugin message is written by 'write', rather than
+        # 'write_fields', and must be recorded with the rest of its data.
+        recording = io.BytesIO()
+        recorder = PacketRecorder(recording)
+        connection = Connection('localhost', username='TestUser')
+        connection.context.protocol_version = SUPPORTED_PROTOCOL_VERSIONS[-1]
+        recorder.attach(connection)
+        connection.socket, server = socket.socketpair()
+        self.addCleanup(connection.socket.close)
+        self.addCleanup(server.close)
+        connection.options.compression_enabled = True
+        connection.options.compression_threshold = 0
+
+        packet = serverbound.play.PluginMessagePacket(
+            connection.context, channel='MC|Brand')
+        connection._send_packet(packet)
+        connection._write_packets([packet])
+        recorder.close()
+
+        # Each frame holds the data of the packet as written, before
+        # compression, without its length prefix.
+        packet_buffer = PacketBuffer()
+        packet.write(packet_buffer)
+        packet_buffer.reset_cursor()
+        VarInt.read(packet_buffer)
+        data = packet_buffer.read()
+        frames = list(PacketReplayer(io.BytesIO(recording.getvalue()))
+                      .frames())
+        self.assertEqual([bytes(frame.data) for frame in frames], [data] * 2)
+
+        packet_buffer = PacketBuffer()
+        packet_buffer.send(data)
+        packet_buffer.reset_cursor()
+        self.assertEqual(VarInt.read(packet_buffer), packet.id)
+        self.assertEqual(String.read(packet_buffer), 'MC|Brand')
+
+        # The frames written are unaffected by the recording.
+        frame = packet.serialize(0)
+        connection.socket.close()
+        self.assertEqual(server.makefile('rb').read(), frame * 2)
+
+    def test_pipe(self):
+        read_fd, write_fd = os.pipe()
+        with open(read_fd, 'rb') as reader:
+            with open(write_fd, 'wb') as writer:
+                PacketRecorder(writer).close()
+            self.assertEqual(reader.read(), MAGIC)
@@ -10,7 +10,7 @@ from minecraft.networking.types import (
 from minecraft.networking.packets.clientbound.play import (
     MultiBlockChangePacket
 )
-from minecraft.networking.packets import PacketBuffer
+from minecraft.networking.packets import PacketBuffer, PacketView
 from minecraft.networking.connection import ConnectionContext
 from minecraft import SUPPORTED_PROTOCOL_VERSIONS, RELEASE_PROTOCOL_VERSIONS
 
@@ -119,3 +119,37 @@ class SerializationTest(unittest.TestCase):
         packet_buffer.reset_cursor()
 
         self.assertEqual(VarInt.read(packet_buffer), 50000)
+
+    def test_varint_buffer(self):
+        values = [0, 1, 127, 128, 300, 50000, 2 ** 31 - 1]
+        data = b'X' + b''.join(VarInt.pack(value) for value in values)
+
+        offset = 1
+        for value in values:
+            decoded, offset = VarInt.unpack_from(data, offset)
+            self.assertEqual(decoded, value)
+        self.assertEqual(offset, len(data))
+
+        decoded, offset = VarInt.unpack_many_from(data, len(values), 1)
+        self.assertEqual((decoded, offset), (values, len(data)))
+
+        packet_view = PacketView(data)
+        packet_view.read(1)
+        self.assertEqual(VarInt.read(packet_view), values[0])
+        self.assertEqual(VarInt.read_many(packet_view, len(values) - 1),
+                         values[1:])
+        self.assertTrue(packet_view.is_eof())
+
+        packet_buffer = PacketBuffer()
+        packet_buffer.send(data[1:])
+        packet_buffer.reset_cursor()
+        self.assertEqual(VarInt.read_many(packet_buffer, len(values)), values)
+
+        with self.assertRaises(EOFError):
+            VarInt.unpack_from(data[:-1], len(data) - 5)
+        with self.assertRaises(EOFError):
+            VarInt.unpack_many_from(data, len(values) + 1, 1)
+        with self.assertRaises(ValueError):
+            VarInt.unpack_from(VarInt.pack(2 ** 49))
+        with self.assertRaises(ValueError):
+            VarInt.pack(-1)
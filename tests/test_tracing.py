@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import threading
+import unittest
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_der_private_key
+
+from minecraft.networking.connection import Connection
+from minecraft.networking.packets import clientbound
+from minecraft.networking.tracing import ChromeTraceSampler, Tracer, STAGES
+
+from . import fake_server, test_connection
+
+
+KEY_LOCATION = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                            'encryption')
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = set()
+        self.spans = []
+
+    def begin(self, stage, **args):
+        token = object()
+        with self.lock:
+            self.open.add(token)
+        return stage, args, token
+
+    def end(self, token, **args):
+        stage, begin_args, key = token
+        with self.lock:
+            self.open.remove(key)
+            self.spans.append((stage, dict(begin_args, **args)))
+
+
+class TracingConnectTest(fake_server._FakeServerTest):
+    """ Connects with a tracer, using compression and encryption, and checks
+        that every stage is traced.
+    """
+    compression_threshold = 8
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+
+    def setUp(self):
+        with open(os.path.join(KEY_LOCATION, 'priv_key.bin'), 'rb') as file:
+            self.private_key = load_der_private_key(
+                file.read(), None, default_backend())
+        with open(os.path.join(KEY_LOCATION, 'pub_key.bin'), 'rb') as file:
+            self.public_key_bytes = file.read()
+
+    def test_connect(self):
+        tracer = RecordingTracer()
+
+        def connection_type(*args, **kwds):
+            connection = Connection(*args, tracer=tracer, **kwds)
+            connection.register_packet_listener(
+                lambda packet: None, clientbound.play.JoinGamePacket)
+            return connection
+        self._test_connect(connection_type=connection_type)
+
+        self.assertEqual(tracer.open, set())
+        self.assertEqual({stage for stage, _args in tracer.spans},
+                         set(STAGES))
+        args = {}
+        for stage, span_args in tracer.spans:
+            args.setdefault(stage, []).append(span_args)
+        self.assertIn({'packet': 'JoinGamePacket'}, args['react'])
+        self.assertTrue(any(a['packet'] == 'JoinGamePacket' and
+                            '<lambda>' in a['listener'] and
+                            not a['outgoing'] for a in args['listener']))
+        self.assertTrue(all(a['raw_size'] > 0 for a in args['decompress']))
+        self.assertTrue(all(a['size'] > 0 for a in args['write']))
+
+
+class ChromeTraceSamplerTest(fake_server._FakeServerTest):
+    client_handler_type = test_connection.ConnectTest.client_handler_type
+
+    def test_connect(self):
+        sampler = ChromeTraceSampler()
+
+        def connection_type(*args, **kwds):
+            connection = Connection(*args, **kwds)
+            sampler.attach(connection)
+            return connection
+        self._test_connect(connection_type=connection_type)
+
+        file = io.StringIO()
+        sampler.write(file)
+        trace = json.loads(file.getvalue())
+        events = trace['traceEvents']
+        slices = [e for e in events if e['ph'] == 'X']
+        self.assertIn('react', {e['name'] for e in slices})
+        for event in slices:
+            self.assertEqual(event['args']['connection'], 'TestUser')
+            self.assertGreaterEqual(event['dur'], 0)
+        threads = {e['tid'] for e in events if e['name'] == 'thread_name'}
+        self.assertEqual(threads, {e['tid'] for e in slices})
+
+    def test_sampling(self):
+        sampler = ChromeTraceSampler(period=10, window=0)
+        self.assertFalse(sampler._sampling(sampler._origin + 1))
+        sampler = ChromeTraceSampler(period=10, window=1, max_events=1)
+        self.assertTrue(sampler._sampling(sampler._origin + 20.5))
+        self.assertFalse(sampler._sampling(sampler._origin + 21.5))
+        sampler._record('react', 0, 1, {})
+        self.assertFalse(sampler._sampling(sampler._origin + 20.5))
+
+
+if __name__ == '__main__':
+    unittest.main()